@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Asyncio WooCommerce Product Scraper
+Non-blocking engine sharing selectors, exporters and statistics with WooCommerceScraper
+"""
+
+import asyncio
+import logging
+import time
+from typing import List, Optional, Dict, AsyncIterator, Sequence
+from urllib.parse import urlparse
+
+from rate_limiter import THROTTLE_STATUS_CODES
+from scraper import WooCommerceScraper, Product, ProductTally
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+class AsyncWooCommerceScraper(WooCommerceScraper):
+    """WooCommerce scraper driven by asyncio and a shared aiohttp connection pool
+    
+    scrape_page and scrape_all_pages are coroutines; extraction, exports and
+    statistics are inherited unchanged from WooCommerceScraper.
+    """
+    
+    def __init__(self, base_url: str, *args, max_connections: int = 100, **kwargs):
+        if aiohttp is None:
+            raise ImportError("The async engine requires aiohttp: pip install aiohttp")
+            
+        super().__init__(base_url, *args, **kwargs)
+        self.max_connections = max_connections
+        self._http: Optional["aiohttp.ClientSession"] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        
+    async def __aenter__(self):
+        await self._ensure_session()
+        return self
+        
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        
+    async def _ensure_session(self) -> "aiohttp.ClientSession":
+        """Create the shared aiohttp session on first use"""
+        if self._http is None or self._http.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._http = aiohttp.ClientSession(
+                headers=dict(self.session.headers),
+                connector=connector
+            )
+        return self._http
+        
+    async def close(self):
+        """Close the shared connection pool"""
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
+        
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        """Get the semaphore bounding concurrent requests to the host of url"""
+        host = urlparse(url).netloc
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            self._host_limits[host] = semaphore
+        return semaphore
+        
+    async def _get_page_content_async(self, url: str, timeout: int = 30, max_retries: int = 3) -> Optional[str]:
+        """Get page content with error handling and retries
+        
+        As in _request, client errors other than throttling are not retried.
+        """
+        if self.replay:
+            response = self._replayed_response(url)
+            return response.text if response is not None else None
+            
+        cached = self.cache.get(url) if self.cache else None
+        if cached and self.cache.is_fresh(cached):
+            logger.info(f"Serving from cache: {url}")
+            self.cache.mark_hit(url, revalidated=False)
+            return cached.body
+        request_headers = self.cache.conditional_headers(cached) if cached else None
+        
+        http = await self._ensure_session()
+        proxy = self.session.proxies.get('https' if url.startswith('https') else 'http') or None
+        
+        async with self._host_limit(url):
+            for attempt in range(max_retries):
+                if attempt:
+                    self.metrics.record_retry(url)
+                await self.rate_limiter.acquire_async(url)
+                try:
+                    logger.info(f"Fetching: {url} (attempt {attempt + 1})")
+                    started = time.monotonic()
+                    async with http.get(url, proxy=proxy, headers=request_headers,
+                                        timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                        body = await response.read()
+                        latency = time.monotonic() - started
+                        self.metrics.observe_fetch(url, latency, response.status, len(body))
+                        self.rate_limiter.record_response(url, response.status, latency,
+                                                          response.headers.get('Retry-After'))
+                        if self.archive:
+                            self._archive_response(response, body)
+                        if cached and response.status == 304:
+                            logger.info(f"Not modified, serving from cache: {url}")
+                            self.cache.mark_hit(url, revalidated=True)
+                            return cached.body
+                            
+                        response.raise_for_status()
+                        text = await response.text()
+                        if self.cache:
+                            self.cache.store(url, text, response.headers.get('ETag'),
+                                             response.headers.get('Last-Modified'))
+                        return text
+                        
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if not isinstance(e, aiohttp.ClientResponseError):
+                        self.rate_limiter.record_error(url)
+                        self.metrics.record_failure(url)
+                    logger.warning(f"Attempt {attempt + 1} failed for {url}: {e}")
+                    status = e.status if isinstance(e, aiohttp.ClientResponseError) else None
+                    if status and 400 <= status < 500 and status not in THROTTLE_STATUS_CODES:
+                        logger.warning(f"Not retrying {url}: HTTP {status}")
+                        break
+                    if attempt == max_retries - 1:
+                        logger.error(f"All attempts failed for {url}")
+        return None
+        
+    def _archive_response(self, response: "aiohttp.ClientResponse", body: bytes):
+        """Write a response and the redirects that led to it to the WARC archive"""
+        for hop in response.history:
+            self.archive.write_exchange(str(hop.url), hop.status, hop.reason, hop.headers, b'',
+                                        hop.request_info.headers)
+        self.archive.write_exchange(str(response.url), response.status, response.reason, response.headers, body,
+                                    response.request_info.headers)
+        
+    async def _run_blocking(self, func, *args):
+        """Run CPU-bound parsing off the event loop so requests keep flowing"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+        
+    async def _fetch_product_details_async(self, product_url: str) -> Optional[Dict[str, str]]:
+        """Fetch detailed product information from individual product page"""
+        try:
+            logger.info(f"Fetching detailed info from: {product_url}")
+            page_content = await self._get_page_content_async(product_url)
+            if not page_content:
+                return None
+                
+            return await self._run_blocking(self._parse_product_details, page_content)
+            
+        except Exception as e:
+            logger.error(f"Error fetching product details from {product_url}: {e}")
+            return None
+            
+    async def _fetch_details_concurrently_async(self, products: List[Product]):
+        """Fetch detail pages for all products at once and merge them in place"""
+        targets = self._detail_targets(products)
+        if not targets:
+            return
+            
+        logger.info(f"Fetching detailed info for {len(targets)} products "
+                    f"({self.per_host_limit} per host)...")
+                    
+        # gather() returns results in argument order, so products keep their order
+        results = await asyncio.gather(*(self._fetch_product_details_async(p.link) for p in targets))
+        for product, detailed_info in zip(targets, results):
+            if detailed_info:
+                self._merge_details(product, detailed_info)
+                if self.checkpoint:
+                    self.checkpoint.record_details(product.link, detailed_info)
+                
+    async def _finish_listing(self, products: List[Product], url: str, fetch_detailed: bool = False):
+        """Fetch details for a listing page's products and log what was found"""
+        if fetch_detailed:
+            await self._fetch_details_concurrently_async(products)
+            
+        self._log_products_found(products)
+        logger.info(f"Successfully extracted {len(products)} products from {url}")
+        
+    async def scrape_page(self, url: str, fetch_detailed: bool = False) -> List[Product]:
+        """Scrape products from a single page"""
+        page_content = await self._get_page_content_async(url)
+        if not page_content:
+            return []
+            
+        soup = await self._run_blocking(self._parse_listing_html, page_content)
+        products = await self._run_blocking(self._extract_listing_products, soup)
+        await self._finish_listing(products, url, fetch_detailed=fetch_detailed)
+        return products
+        
+    async def scrape_all_pages(self, start_url: str, max_pages: int = 10,
+                               fetch_detailed: bool = False) -> Sequence[Product]:
+        """Scrape products from multiple pages into self.products"""
+        products = self.keep_products(())
+        async for product in self.aiter_products(start_url, max_pages=max_pages, fetch_detailed=fetch_detailed):
+            products.append(product)
+        return products
+        
+    async def aiter_products(self, start_url: str, max_pages: int = 10,
+                             fetch_detailed: bool = False) -> AsyncIterator[Product]:
+        """Yield products page by page as each listing page completes
+        
+        The next listing page is requested as soon as its link is known, so it
+        downloads while the current page's products and details are processed.
+        """
+        self.tally = ProductTally()
+        current_url, page_num, visited, restored = self._resume_crawl(start_url)
+        for product in restored:
+            self.tally.add(product)
+            yield product
+        next_task = None
+        
+        try:
+            page_content = await self._get_page_content_async(current_url) if current_url else None
+            
+            while current_url and page_num <= max_pages:
+                logger.info(f"Scraping page {page_num}/{max_pages}: {current_url}")
+                visited.add(current_url)
+                
+                if not page_content:
+                    break
+                    
+                soup = await self._run_blocking(self._parse_listing_html, page_content)
+                
+                # Start fetching the next page before extracting this one
+                next_url = self._find_next_page_url(soup)
+                if next_url in visited:
+                    next_url = None
+                if next_url and page_num < max_pages:
+                    next_task = asyncio.ensure_future(self._get_page_content_async(next_url))
+                    
+                page_products = await self._run_blocking(self._extract_listing_products, soup)
+                del soup
+                await self._finish_listing(page_products, current_url, fetch_detailed=fetch_detailed)
+                
+                if not page_products:
+                    logger.info("No products found, stopping pagination")
+                    break
+                    
+                if self.checkpoint:
+                    self.checkpoint.page_done(start_url, current_url, page_num, next_url, page_products)
+                for product in page_products:
+                    self.tally.add(product)
+                    yield product
+                logger.info(f"Page {page_num} completed. Total products so far: {self.tally.total}")
+                
+                if not next_url:
+                    logger.info("No more pages found")
+                    break
+                if next_task is None:
+                    break
+                    
+                current_url = next_url
+                page_num += 1
+                page_content = await next_task
+                next_task = None
+        finally:
+            if next_task is not None:
+                next_task.cancel()
+            if self.checkpoint:
+                self.checkpoint.close()
+                
+        self._log_summary(self.tally, fetch_detailed)
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Batch crawls
+Scrapes many shops in one process under a shared, host-fair limit on concurrent requests
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import zip_longest
+from typing import Any, Deque, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from http_cache import HttpCache
+from scraper import WooCommerceScraper, Product, load_config, create_session
+from sinks import open_sink
+
+logger = logging.getLogger(__name__)
+
+# Per-shop settings a shop list may override
+SHOP_OPTIONS = ('output', 'max_pages', 'detailed', 'delay', 'discovery', 'store_api', 'extractor', 'workers',
+                'parser', 'restrict_parse')
+SUMMARY_FILE = 'batch_summary.json'
+
+@dataclass
+class Shop:
+    """One line of a shop list: the shop URL and the settings it overrides"""
+    url: str
+    options: Dict[str, Any] = field(default_factory=dict)
+    
+    @property
+    def host(self) -> str:
+        return urlparse(self.url).netloc
+
+def _option_value(text: str) -> Any:
+    """Value of a key=value override: JSON if it parses (numbers, true/false), else the string"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def parse_shop_line(line: str) -> Optional[Shop]:
+    """A shop from a list line: a JSON object with "url", or a URL followed by key=value overrides"""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('{'):
+        options = json.loads(line)
+        url = options.pop('url')
+    else:
+        url, *pairs = line.split()
+        options = {}
+        for pair in pairs:
+            key, separator, value = pair.partition('=')
+            if not separator:
+                raise ValueError(f"Expected key=value, got '{pair}'")
+            options[key] = _option_value(value)
+            
+    unknown = set(options) - set(SHOP_OPTIONS)
+    if unknown:
+        logger.warning(f"Ignoring unknown settings for {url}: {', '.join(sorted(unknown))}")
+        options = {key: value for key, value in options.items() if key in SHOP_OPTIONS}
+    return Shop(url, options)
+
+def load_shops(filename: str) -> List[Shop]:
+    """Read a shop list: a JSON array of URLs or objects, or one shop per line"""
+    with open(filename, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        entries = json.loads(text)
+        lines = [entry if isinstance(entry, str) else json.dumps(entry) for entry in entries]
+    else:
+        lines = text.splitlines()
+        
+    shops = []
+    for number, line in enumerate(lines, 1):
+        try:
+            shop = parse_shop_line(line)
+        except (ValueError, KeyError) as e:
+            logger.error(f"{filename}:{number}: invalid shop entry: {e}")
+            continue
+        if shop:
+            shops.append(shop)
+    return shops
+
+def interleave_by_host(shops: Iterable[Shop]) -> List[Shop]:
+    """Order shops round-robin by host, so shops of one host do not start all at once"""
+    by_host: Dict[str, List[Shop]] = OrderedDict()
+    for shop in shops:
+        by_host.setdefault(shop.host, []).append(shop)
+    return [shop for group in zip_longest(*by_host.values()) for shop in group if shop is not None]
+
+class FairScheduler:
+    """Concurrent request slots shared by every shop of a batch
+    
+    At most max_concurrent requests run at once, and at most per_host to
+    any one host. When slots are short, waiting requests are granted
+    round-robin by host rather than first come, first served, so a shop
+    with many queued requests cannot hold back the others, and a slow
+    host only ever ties up its own per_host slots.
+    """
+    
+    def __init__(self, max_concurrent: int = 32, per_host: int = 2):
+        self.max_concurrent = max(1, max_concurrent)
+        self.per_host = max(1, per_host)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._host_active: Dict[str, int] = {}
+        # Hosts with waiting requests, in the order they get their next turn
+        self._waiting: "OrderedDict[str, Deque[threading.Event]]" = OrderedDict()
+        self.max_active = 0
+        self.max_waiting = 0
+        self.time_waited = 0.0
+        
+    @contextmanager
+    def slot(self, url: str):
+        """Hold one request slot for the host of url"""
+        host = urlparse(url).netloc
+        self.acquire(host)
+        try:
+            yield
+        finally:
+            self.release(host)
+            
+    def acquire(self, host: str):
+        turn = threading.Event()
+        started = time.monotonic()
+        with self._lock:
+            self._waiting.setdefault(host, deque()).append(turn)
+            self._dispatch()
+            self.max_waiting = max(self.max_waiting, sum(len(waiters) for waiters in self._waiting.values()))
+        turn.wait()
+        waited = time.monotonic() - started
+        with self._lock:
+            self.time_waited += waited
+            
+    def release(self, host: str):
+        with self._lock:
+            self._active -= 1
+            self._host_active[host] -= 1
+            if not self._host_active[host]:
+                del self._host_active[host]
+            self._dispatch()
+            
+    def _dispatch(self):
+        """Grant free slots to waiting requests, one host at a time in turn"""
+        while self._active < self.max_concurrent:
+            host = next((host for host in self._waiting if self._host_active.get(host, 0) < self.per_host), None)
+            if host is None:
+                return
+            waiters = self._waiting.pop(host)
+            waiters.popleft().set()
+            self._active += 1
+            self._host_active[host] = self._host_active.get(host, 0) + 1
+            self.max_active = max(self.max_active, self._active)
+            if waiters:
+                # Back of the line until every other waiting host has had a turn
+                self._waiting[host] = waiters
+                
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_active": self.max_active,
+                "max_waiting": self.max_waiting,
+                "time_waited": round(self.time_waited, 3)
+            }
+
+class BatchRunner:
+    """Scrapes a list of shops with one configuration, session, cache and scheduler
+    
+    Up to parallel_shops shops are crawled at a time, each by its own
+    scraper (own selector learning, rate control and statistics) whose
+    requests all go through the FairScheduler. Every shop streams its
+    products to its own file in output_dir, and a summary of the run is
+    written to batch_summary.json there.
+    """
+    
+    def __init__(self, output_dir: str = 'batch_output', output_format: str = 'jsonl',
+                 max_concurrent: int = 32, per_host: int = 2, parallel_shops: int = 16,
+                 defaults: Optional[Dict[str, Any]] = None, use_proxy: bool = True,
+                 cache_dir: Optional[str] = None, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else load_config()
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.parallel_shops = max(1, parallel_shops)
+        self.defaults = {'max_pages': 5, 'detailed': False, 'delay': 1.0, 'discovery': 'pagination',
+                         'store_api': False}
+        self.defaults.update(defaults or {})
+        self.use_proxy = use_proxy
+        self.scheduler = FairScheduler(max_concurrent, per_host)
+        self.export_options = self.config.get('export_options', {})
+        
+        # One cache for the whole batch; shop scrapers are built without their own
+        cache_settings = self.config.get('cache', {})
+        self.cache: Optional[HttpCache] = None
+        if cache_dir is not None or cache_settings.get('enabled'):
+            self.cache = HttpCache.from_config(cache_settings, directory=cache_dir or None)
+        self._shop_config = dict(self.config, cache=dict(cache_settings, enabled=False))
+        self.session = None
+        
+    def _output_path(self, shop: Shop, taken: set) -> str:
+        output = shop.options.get('output')
+        if not output:
+            parsed = urlparse(shop.url)
+            slug = re.sub(r'[^A-Za-z0-9]+', '-', parsed.netloc + parsed.path).strip('-') or 'shop'
+            output = f"{slug}.{self.output_format}"
+            suffix = 2
+            while output in taken:
+                output = f"{slug}-{suffix}.{self.output_format}"
+                suffix += 1
+        taken.add(output)
+        return os.path.join(self.output_dir, output)
+        
+    def _build_scraper(self, shop: Shop, options: Dict[str, Any]) -> WooCommerceScraper:
+        scraper = WooCommerceScraper(
+            shop.url,
+            use_proxy=False,
+            delay=options['delay'],
+            max_workers=options.get('workers'),
+            per_host_limit=self.scheduler.per_host,
+            parser=options.get('parser'),
+            restrict_parse=options.get('restrict_parse'),
+            extraction_engine=options.get('extractor'),
+            # A parse pool per shop would start parallel_shops pools at once
+            parse_processes=0,
+            config=self._shop_config,
+            session=self.session
+        )
+        if self.use_proxy and not self.session.proxies:
+            scraper._setup_proxy()
+        scraper.scheduler = self.scheduler
+        scraper.cache = self.cache
+        return scraper
+        
+    def _crawl(self, scraper: WooCommerceScraper, shop: Shop, options: Dict[str, Any]) -> Iterable[Product]:
+        products = None
+        if options['store_api']:
+            products = scraper.scrape_store_api(shop.url, max_pages=options['max_pages'])
+        if products is None and options['discovery'] == 'sitemap':
+            products = scraper.scrape_sitemaps(shop.url)
+        if products is not None:
+            return products
+        return scraper.iter_products(shop.url, max_pages=options['max_pages'], fetch_detailed=options['detailed'])
+        
+    def run_shop(self, shop: Shop, output: str) -> Dict[str, Any]:
+        """Scrape one shop into output; returns its entry for the run summary"""
+        options = dict(self.defaults, **shop.options)
+        result = {'url': shop.url, 'output': output, 'status': 'ok', 'products': 0}
+        started = time.time()
+        logger.info(f"Starting shop {shop.url}")
+        try:
+            scraper = self._build_scraper(shop, options)
+            with open_sink(output, self.export_options, shop.url) as sink:
+                for product in self._crawl(scraper, shop, options):
+                    sink.write(product)
+            result['products'] = scraper.tally.total
+            result['stats'] = scraper.get_statistics()
+            if not scraper.tally.total:
+                result['status'] = 'empty'
+        except Exception as e:
+            logger.error(f"Shop {shop.url} failed: {e}")
+            result['status'] = 'failed'
+            result['error'] = str(e)
+        result['seconds'] = round(time.time() - started, 2)
+        logger.info(f"Finished shop {shop.url}: {result['status']}, {result['products']} products "
+                    f"in {result['seconds']}s")
+        return result
+        
+    def run(self, shops: List[Shop]) -> Dict[str, Any]:
+        """Scrape every shop and write the run summary; returns the summary"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        shops = interleave_by_host(shops)
+        hosts = {shop.host for shop in shops}
+        # Connections are kept for every host, up to the per-host limit each
+        self.session = create_session(self.config, pool_maxsize=self.scheduler.per_host,
+                                      pool_connections=max(10, len(hosts)))
+        logger.info(f"Batch of {len(shops)} shops on {len(hosts)} hosts: {self.parallel_shops} at a time, "
+                    f"{self.scheduler.max_concurrent} concurrent requests, {self.scheduler.per_host} per host")
+                    
+        taken = set()
+        jobs = [(shop, self._output_path(shop, taken)) for shop in shops]
+        started = time.time()
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.parallel_shops) as executor:
+                futures = [executor.submit(self.run_shop, shop, output) for shop, output in jobs]
+                # Shops finish in any order; the summary keeps the list's order
+                for future in futures:
+                    results.append(future.result())
+        finally:
+            summary = self._summary(results, time.time() - started)
+            path = os.path.join(self.output_dir, SUMMARY_FILE)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+            logger.info(f"Batch summary written to {path}")
+        return summary
+        
+    def _summary(self, results: List[Dict[str, Any]], seconds: float) -> Dict[str, Any]:
+        statuses = [result['status'] for result in results]
+        return {
+            'shops': len(results),
+            'ok': statuses.count('ok'),
+            'empty': statuses.count('empty'),
+            'failed': statuses.count('failed'),
+            'products': sum(result['products'] for result in results),
+            'seconds': round(seconds, 2),
+            'scheduler': dict(self.scheduler.stats(), max_concurrent=self.scheduler.max_concurrent,
+                              per_host=self.scheduler.per_host),
+            'results': results
+        }
+
+def run_batch(args) -> Optional[Dict[str, Any]]:
+    """Run scraper.py --batch: the shop list from args.batch, other flags as defaults for every shop"""
+    config = load_config()
+    settings = config.get('batch', {})
+    shops = load_shops(args.batch)
+    if not shops:
+        logger.error(f"No shops in {args.batch}")
+        return None
+        
+    defaults = {
+        'max_pages': args.max_pages,
+        'detailed': args.detailed,
+        'delay': args.delay,
+        'discovery': args.discovery,
+        'store_api': args.store_api or config.get('store_api', {}).get('enabled', False),
+        'extractor': args.extractor,
+        'workers': args.workers,
+        'parser': args.parser,
+        'restrict_parse': args.restrict_parse
+    }
+    runner = BatchRunner(
+        output_dir=args.batch_dir or settings.get('output_dir', 'batch_output'),
+        output_format=args.batch_format or settings.get('format', 'jsonl'),
+        max_concurrent=args.max_concurrent or settings.get('max_concurrent_requests', 32),
+        per_host=args.per_host or settings.get('per_host_limit', 2),
+        parallel_shops=args.parallel_shops or settings.get('parallel_shops', 16),
+        defaults=defaults,
+        use_proxy=not args.no_proxy,
+        cache_dir=args.cache,
+        config=config
+    )
+    summary = runner.run(shops)
+    logger.info(f"Batch completed: {summary['ok']} ok, {summary['empty']} empty, {summary['failed']} failed, "
+                f"{summary['products']} products in {summary['seconds']}s")
+    return summary
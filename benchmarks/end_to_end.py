@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+End-to-end crawl benchmark
+Runs WooCommerceScraper against the local stand-in shop and reports throughput, requests,
+duplicate fetches and time spent waiting on the rate limiter
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper import WooCommerceScraper, Product, load_config, _scrape_async
+from shop_server import StandInShop, add_shop_arguments, shop_from_args
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('listing', 'detailed', 'sitemap', 'store-api')
+
+def build_scraper(shop: StandInShop, args):
+    """A scraper for the stand-in shop with the settings under test and the response cache off"""
+    config = load_config(os.path.join(ROOT, 'config.json'))
+    config['cache'] = dict(config.get('cache', {}), enabled=False)
+    if args.max_rate:
+        config['rate_limit'] = dict(config.get('rate_limit', {}), max_rate=args.max_rate)
+    scraper_class = WooCommerceScraper
+    if args.engine == 'async':
+        from async_scraper import AsyncWooCommerceScraper
+        scraper_class = AsyncWooCommerceScraper
+    return scraper_class(
+        f"{shop.base_url}/shop/",
+        use_proxy=False,
+        delay=args.delay,
+        max_workers=args.workers,
+        per_host_limit=args.per_host,
+        parse_processes=args.parse_processes,
+        config=config
+    )
+
+def crawl(scraper, shop: StandInShop, args) -> List[Product]:
+    url = f"{shop.base_url}/shop/"
+    if args.mode == 'store-api':
+        return scraper.scrape_store_api(url, max_pages=args.max_pages) or []
+    if args.mode == 'sitemap':
+        return scraper.scrape_sitemaps(url) or []
+    fetch_detailed = args.mode == 'detailed'
+    if args.engine == 'async':
+        return asyncio.run(_scrape_async(scraper, url, args.max_pages, fetch_detailed))
+    return list(scraper.iter_products(url, max_pages=args.max_pages, fetch_detailed=fetch_detailed))
+
+def expected_products(shop: StandInShop, args) -> int:
+    if args.mode in ('listing', 'detailed'):
+        return min(shop.pages, args.max_pages) * shop.products_per_page
+    return shop.product_count
+
+def run(args) -> Dict[str, Any]:
+    with shop_from_args(args) as shop:
+        scraper = build_scraper(shop, args)
+        started = time.perf_counter()
+        products = crawl(scraper, shop, args)
+        elapsed = time.perf_counter() - started
+        server = shop.stats()
+        
+    buckets = scraper.rate_limiter.stats().values()
+    incomplete = sum(1 for p in products if "N/A" in (p.title, p.price, p.link))
+    expected = expected_products(shop, args)
+    errors = []
+    if len(products) < expected:
+        errors.append(f"{len(products)} products, expected {expected}")
+    if incomplete:
+        errors.append(f"{incomplete} products missing title, price or link")
+    if args.mode in ('detailed', 'sitemap'):
+        without_sku = sum(1 for p in products if not p.sku)
+        if without_sku:
+            errors.append(f"{without_sku} products without SKU from their product page")
+    return {
+        'mode': args.mode,
+        'engine': args.engine,
+        'seconds': round(elapsed, 3),
+        'products': len(products),
+        'products_per_s': round(len(products) / elapsed, 1) if elapsed else 0.0,
+        'requests': server['requests'],
+        'requests_per_s': round(server['requests'] / elapsed, 1) if elapsed else 0.0,
+        'statuses': server['statuses'],
+        'duplicate_fetches': server['duplicate_fetches'],
+        'duplicate_urls': server['duplicate_urls'],
+        'megabytes': round(server['bytes_sent'] / 2 ** 20, 1),
+        # Seconds request threads spent waiting for the token bucket, including Retry-After pauses
+        'seconds_waiting': round(sum(b['time_waited'] for b in buckets), 3),
+        'throttle_events': sum(b['throttle_events'] for b in buckets),
+        'final_rate': [b['rate'] for b in buckets],
+        'errors': errors
+    }
+
+def print_results(results: Dict[str, Any]):
+    print(f"Mode: {results['mode']} ({results['engine']} engine)")
+    print(f"Products: {results['products']} in {results['seconds']}s ({results['products_per_s']}/s)")
+    print(f"Requests: {results['requests']} ({results['requests_per_s']}/s, {results['megabytes']} MB), "
+          f"statuses {results['statuses']}")
+    print(f"Duplicate fetches: {results['duplicate_fetches']}")
+    for url, count in list(results['duplicate_urls'].items())[:5]:
+        print(f"  {count}x {url}")
+    print(f"Waiting on the rate limiter: {results['seconds_waiting']}s, "
+          f"{results['throttle_events']} throttle events, final rate {results['final_rate']} req/s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl a local stand-in WooCommerce shop end to end')
+    parser.add_argument('--mode', choices=MODES, default='listing',
+                        help='Listing pages only, listing plus product pages, sitemaps or Store API (default: listing)')
+    parser.add_argument('--engine', choices=['sync', 'async'], default='sync', help='Scraping engine (default: sync)')
+    parser.add_argument('--max-pages', type=int, default=1000, help='Listing or Store API pages to crawl (default: all)')
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='Initial delay between requests; 0 starts at max_rate (default: 0)')
+    parser.add_argument('--max-rate', type=float, help='Override rate_limit.max_rate from config.json (req/s)')
+    parser.add_argument('--workers', type=int, help='Concurrent product page fetches')
+    parser.add_argument('--per-host', type=int, help='Concurrent requests per host')
+    parser.add_argument('--parse-processes', type=int, default=0, help='Worker processes for parsing (default: 0)')
+    parser.add_argument('--save', metavar='FILE', help='Write the results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Show the scraper log')
+    add_shop_arguments(parser)
+    args = parser.parse_args()
+    
+    if not args.verbose:
+        # Retry warnings would flood the console under fault injection
+        logging.disable(logging.WARNING)
+        
+    results = run(args)
+    print_results(results)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.save}")
+    for error in results['errors']:
+        print(f"CRAWL ERROR: {error}", file=sys.stderr)
+    sys.exit(1 if results['errors'] else 0)
+
+if __name__ == "__main__":
+    main()
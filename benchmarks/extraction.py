@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Extraction benchmark
+Times listing extraction (scrape_page) and product page parsing (_fetch_product_details) offline,
+over synthetic theme pages or a directory of recorded HTML, and checks the results against a baseline
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then not reported
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper import WooCommerceScraper, EXTRACTION_ENGINES
+from selector_plan import SelectorPlan
+from themes import THEMES, build_site
+
+# Throughput figures compared with the baseline; lower is a regression
+RATE_METRICS = ('listing_pages_per_s', 'products_per_s', 'detail_pages_per_s')
+BASE_URL = 'https://shop.example.com'
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+def time_fields(plan: SelectorPlan, prefix: str, costs: Dict[str, float]):
+    """Accumulate the time spent in each field's selector cascade into costs
+    
+    The cascade engine queries fields one by one through FieldPlan.match,
+    which is wrapped here. The single-pass engine matches all fields in one
+    walk, so only its container and next-page lookups are timed.
+    """
+    for name, field in plan.fields.items():
+        match = field.match
+        
+        def timed(element, parse=None, many=False, _match=match, _key=f"{prefix}.{name}"):
+            started = time.perf_counter()
+            try:
+                return _match(element, parse, many)
+            finally:
+                costs[_key] += time.perf_counter() - started
+                
+        field.match = timed
+
+def offline_scraper(pages: Dict[str, str], args) -> WooCommerceScraper:
+    """A scraper whose page downloads are served from pages"""
+    scraper = WooCommerceScraper(BASE_URL, use_proxy=False, parser=args.parser, restrict_parse=args.restrict_parse,
+                                 extraction_engine=args.extractor, parse_processes=0)
+    if args.no_structured_data:
+        scraper.structured_data = False
+    scraper.cache = None
+    scraper._get_page_content = lambda url, timeout=30, max_retries=3: pages.get(url)
+    return scraper
+
+def run_corpus(name: str, listing: Dict[str, str], products: Dict[str, str], args,
+               expected_per_page: Optional[int] = None) -> Dict[str, Any]:
+    """Time extraction over one set of pages; the best of args.repeat rounds is kept
+    
+    With expected_per_page (generated pages, whose content is known), the
+    extracted products and details are also checked, so a selector change
+    that breaks extraction fails instead of looking faster.
+    """
+    scraper = offline_scraper({**listing, **products}, args)
+    costs: Dict[str, float] = defaultdict(float)
+    time_fields(scraper.selector_plan, 'listing', costs)
+    time_fields(scraper.detail_plan, 'detail', costs)
+    
+    errors = []
+    listing_best = detail_best = float('inf')
+    product_count = 0
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        product_count = 0
+        for url in listing:
+            page_products = scraper.scrape_page(url)
+            product_count += len(page_products)
+            if expected_per_page is None:
+                continue
+            if len(page_products) != expected_per_page:
+                errors.append(f"{url}: {len(page_products)} products, expected {expected_per_page}")
+            incomplete = [p for p in page_products if "N/A" in (p.title, p.price, p.link)]
+            if incomplete:
+                errors.append(f"{url}: {len(incomplete)} products missing title, price or link")
+        listing_best = min(listing_best, time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        for url in products:
+            details = scraper._fetch_product_details(url)
+            if expected_per_page is not None and not (details and details.get('sku')):
+                errors.append(f"{url}: no SKU in product details")
+        detail_best = min(detail_best, time.perf_counter() - started)
+        
+    fields = {
+        key: round(seconds / args.repeat / max(1, len(listing if key.startswith('listing.') else products)) * 1e6, 1)
+        for key, seconds in costs.items()
+    }
+    fields = dict(sorted(fields.items(), key=lambda item: -item[1]))
+    return {
+        'listing_pages': len(listing),
+        'detail_pages': len(products),
+        'products': product_count,
+        'listing_kb_per_page': round(sum(map(len, listing.values())) / max(1, len(listing)) / 1024, 1),
+        'detail_kb_per_page': round(sum(map(len, products.values())) / max(1, len(products)) / 1024, 1),
+        'listing_pages_per_s': round(len(listing) / listing_best, 2) if listing else 0.0,
+        'products_per_s': round(product_count / listing_best, 1) if listing else 0.0,
+        'detail_pages_per_s': round(len(products) / detail_best, 2) if products else 0.0,
+        # Microseconds per page spent in each field's selector cascade
+        'field_us_per_page': fields,
+        # The same error recurs every round; report each once
+        'errors': sorted(set(errors))[:20]
+    }
+
+def load_recorded(directory: str) -> Optional[tuple]:
+    """Recorded pages from directory/listing/*.html and directory/product/*.html"""
+    def read(kind: str) -> Dict[str, str]:
+        pages = {}
+        for path in sorted(glob.glob(os.path.join(directory, kind, '*.html'))):
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                pages[f"{BASE_URL}/{kind}/{os.path.basename(path)}"] = f.read()
+        return pages
+    listing, products = read('listing'), read('product')
+    if not listing and not products:
+        return None
+    return listing, products
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Regressions of more than threshold (a fraction) against the baseline"""
+    regressions = []
+    for name, current in results['corpora'].items():
+        previous = baseline.get('corpora', {}).get(name)
+        if not previous:
+            continue
+        for metric in RATE_METRICS:
+            before, now = previous.get(metric), current.get(metric)
+            if before and now is not None and now < before * (1 - threshold):
+                regressions.append(f"{name} {metric}: {now} vs {round(before, 2)} ({(now / before - 1) * 100:+.1f}%)")
+    before, now = baseline.get('peak_rss_mb'), results.get('peak_rss_mb')
+    if before and now and now > before * (1 + threshold):
+        regressions.append(f"peak_rss_mb: {now} vs {before} ({(now / before - 1) * 100:+.1f}%)")
+    return regressions
+
+def print_results(results: Dict[str, Any], top_fields: int):
+    print(f"{'corpus':<12} {'pages/s':>9} {'products/s':>11} {'detail/s':>9} {'KB/page':>8}")
+    for name, r in results['corpora'].items():
+        print(f"{name:<12} {r['listing_pages_per_s']:>9} {r['products_per_s']:>11} {r['detail_pages_per_s']:>9} "
+              f"{r['listing_kb_per_page']:>8}")
+    for name, r in results['corpora'].items():
+        print(f"\n{name}: costliest selector cascades (us per page)")
+        for key, cost in list(r['field_us_per_page'].items())[:top_fields]:
+            print(f"  {key:<28} {cost:>10}")
+    if results['peak_rss_mb'] is not None:
+        print(f"\nPeak RSS: {results['peak_rss_mb']} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark product extraction offline')
+    parser.add_argument('--themes', nargs='+', choices=THEMES, default=list(THEMES),
+                        help='Synthetic theme styles to generate (default: all)')
+    parser.add_argument('--pages', type=int, default=10, help='Listing pages per theme (default: 10)')
+    parser.add_argument('--products-per-page', type=int, default=24, help='Products per listing page (default: 24)')
+    parser.add_argument('--detail-pages', type=int, default=50,
+                        help='Product pages parsed per theme (default: 50)')
+    parser.add_argument('--padding-kb', type=int, default=40,
+                        help='Header/footer markup added to every page, in KB (default: 40)')
+    parser.add_argument('--corpus', metavar='DIR',
+                        help='Also run recorded pages from DIR/listing/*.html and DIR/product/*.html')
+    parser.add_argument('--repeat', type=int, default=3, help='Rounds per corpus; the fastest counts (default: 3)')
+    parser.add_argument('--parser', help='BeautifulSoup parser backend (default from config.json)')
+    parser.add_argument('--restrict-parse', action='store_true', default=None, help='Parse only product regions')
+    parser.add_argument('--extractor', choices=EXTRACTION_ENGINES, help='Product card extraction engine')
+    parser.add_argument('--no-structured-data', action='store_true',
+                        help='Parse product pages with CSS selectors only')
+    parser.add_argument('--baseline', metavar='FILE', help='Fail if slower than the results saved in FILE')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Allowed slowdown (and RSS growth) against the baseline, as a fraction (default: 0.15)')
+    parser.add_argument('--save', metavar='FILE', help='Write the results as JSON, e.g. to use as a baseline')
+    parser.add_argument('--top-fields', type=int, default=8, help='Selector cascades listed per corpus (default: 8)')
+    args = parser.parse_args()
+    args.repeat = max(1, args.repeat)
+    
+    # Log records are built but not written, so I/O does not blur the timings
+    logging.disable(logging.INFO)
+    
+    results = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'settings': {key: getattr(args, key) for key in ('pages', 'products_per_page', 'detail_pages', 'padding_kb',
+                                                         'parser', 'restrict_parse', 'extractor',
+                                                         'no_structured_data')},
+        'corpora': {}
+    }
+    for theme in args.themes:
+        listing, products, _ = build_site(theme, args.pages, args.products_per_page, BASE_URL, args.padding_kb)
+        products = dict(list(products.items())[:args.detail_pages])
+        results['corpora'][theme] = run_corpus(theme, listing, products, args, args.products_per_page)
+    if args.corpus:
+        recorded = load_recorded(args.corpus)
+        if recorded is None:
+            print(f"No listing/*.html or product/*.html under {args.corpus}", file=sys.stderr)
+            sys.exit(2)
+        results['corpora']['recorded'] = run_corpus('recorded', *recorded, args)
+    results['peak_rss_mb'] = peak_rss_mb()
+    
+    print_results(results, args.top_fields)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.save}")
+        
+    failed = False
+    for name, r in results['corpora'].items():
+        for error in r['errors']:
+            print(f"EXTRACTION ERROR {name}: {error}", file=sys.stderr)
+            failed = True
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != results['settings']:
+            print("Warning: baseline was recorded with different settings", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        failed = failed or bool(regressions)
+        if not regressions:
+            print(f"No regression beyond {args.threshold * 100:.0f}% against {args.baseline}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
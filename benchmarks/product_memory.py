@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Product memory benchmark
+Measures bytes per product for a plain dataclass, the slotted Product and ProductBatch
+"""
+
+import argparse
+import gc
+import hashlib
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper import Product
+from product_batch import ProductBatch
+
+DESCRIPTION = ("Soft, breathable cotton blend with a relaxed fit and reinforced seams. "
+               "Machine washable, pre-shrunk and available in several colours. ") * 4
+STOCK_STATUSES = ['In Stock', 'In Stock', 'In Stock', 'Out of Stock', 'On Backorder']
+
+@dataclass
+class PlainProduct:
+    """Product as it was before slots and interning: one __dict__ per instance"""
+    title: str
+    price: str
+    link: str
+    image_url: str
+    description: Optional[str] = None
+    sku: Optional[str] = None
+    stock_status: Optional[str] = None
+    category: Optional[str] = None
+    fingerprint: Optional[str] = None
+
+def product_values(count: int) -> Iterator[tuple]:
+    """Field values shaped like a real catalog, each string a fresh object as parsing produces"""
+    for i in range(count):
+        yield (
+            f"Product {i} Classic Crew Neck T-Shirt",
+            f"${(i % 400) / 4 + 9.99:.2f}",
+            f"https://shop.example.com/product/classic-crew-neck-t-shirt-{i}/",
+            f"https://shop.example.com/wp-content/uploads/2024/05/tshirt-{i}-300x300.jpg",
+            DESCRIPTION[:200 + i % 300] + str(i),
+            f"TSH-{i:07d}",
+            ''.join(STOCK_STATUSES[i % len(STOCK_STATUSES)]),
+            f"Category {i % 60}",
+            hashlib.sha1(str(i).encode()).hexdigest()
+        )
+
+def measure(build: Callable[[int], object], count: int):
+    """Bytes allocated by build(count) that stay alive, and the time it took"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build(count)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the memory footprint of product representations')
+    parser.add_argument('--count', type=int, default=1_000_000, help='Number of products (default: 1000000)')
+    args = parser.parse_args()
+    
+    candidates = [
+        ('dataclass (__dict__)', lambda n: [PlainProduct(*values) for values in product_values(n)]),
+        ('Product (slots, interned)', lambda n: [Product(*values) for values in product_values(n)]),
+        ('ProductBatch (columns)', lambda n: ProductBatch(Product(*values) for values in product_values(n)))
+    ]
+    
+    print(f"{args.count:,} products on Python {sys.version.split()[0]}")
+    baseline = None
+    for name, build in candidates:
+        size, elapsed = measure(build, args.count)
+        baseline = baseline or size
+        print(f"{name:<28} {size / args.count:8.1f} bytes/product  {size / 2 ** 20:8.1f} MiB  "
+              f"{size / baseline * 100:5.1f}%  built in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    main()
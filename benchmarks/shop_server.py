@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Stand-in WooCommerce shop
+A local HTTP server serving a synthetic shop (listing pages, product pages, Store API, sitemaps)
+with configurable latency, jitter and throttling, for end-to-end and load tests of the scraper
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from themes import THEMES, CatalogItem, catalog, listing_page, product_page, product_url
+
+STORE_API_PATH = '/wp-json/wc/store/v1/products'
+# Yoast splits product sitemaps every 1000 URLs
+SITEMAP_SIZE = 1000
+LAST_MODIFIED = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+class StandInShop:
+    """A synthetic WooCommerce shop served over HTTP on a background thread
+    
+    Pages come from benchmarks/themes.py, rendered on first request and
+    kept. Every response can be delayed by latency plus up to jitter
+    seconds, and answered instead with 429 or 503 at the given rates, or
+    with 429 once clients exceed rate_limit requests per second; those
+    carry Retry-After when retry_after is set. Responses have an ETag, so
+    conditional requests get 304. Requests are counted per URL, which
+    shows pages the scraper fetched more than once.
+    """
+    
+    def __init__(self, theme: str = 'classic', pages: int = 10, products_per_page: int = 24, padding_kb: int = 40,
+                 seed: int = 0, latency: float = 0.0, jitter: float = 0.0, throttle_rate: float = 0.0,
+                 error_rate: float = 0.0, rate_limit: Optional[float] = None, retry_after: Optional[int] = 1,
+                 store_api: bool = True, sitemaps: bool = True, host: str = '127.0.0.1', port: int = 0):
+        if theme not in THEMES:
+            raise ValueError(f"Unknown theme '{theme}'")
+        self.theme = theme
+        self.pages = max(1, pages)
+        self.products_per_page = max(1, products_per_page)
+        self.padding_kb = padding_kb
+        self.seed = seed
+        self.latency = max(0.0, latency)
+        self.jitter = max(0.0, jitter)
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.store_api = store_api
+        self.sitemaps = sitemaps
+        self.items = catalog(self.pages * self.products_per_page, seed)
+        self._by_slug = {item.slug: item for item in self.items}
+        
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._rendered: Dict[str, bytes] = {}
+        # Token bucket for rate_limit, one second of burst
+        self._tokens = float(rate_limit or 0)
+        self._refilled = time.monotonic()
+        self.reset_stats()
+        
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.shop = self
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+        
+    @property
+    def product_count(self) -> int:
+        return len(self.items)
+        
+    def start(self) -> str:
+        """Serve on a background thread; returns the shop's base URL"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+        
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            
+    def __enter__(self) -> "StandInShop":
+        self.start()
+        return self
+        
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        
+    def reset_stats(self):
+        with self._lock:
+            self._requests: Counter = Counter()
+            self._served: Counter = Counter()
+            self._statuses: Counter = Counter()
+            self._bytes_sent = 0
+            
+    def stats(self) -> Dict[str, Any]:
+        """Request counts by status, and URLs whose content was sent more than once"""
+        with self._lock:
+            served = dict(self._served)
+            repeated = {url: count for url, count in served.items() if count > 1}
+            return {
+                'requests': sum(self._requests.values()),
+                'urls': len(self._requests),
+                'statuses': dict(sorted(self._statuses.items())),
+                'bytes_sent': self._bytes_sent,
+                # Full responses beyond the first for the same URL; retries after 429/503 are not counted
+                'duplicate_fetches': sum(count - 1 for count in repeated.values()),
+                'duplicate_urls': dict(sorted(repeated.items(), key=lambda item: -item[1])[:20])
+            }
+            
+    def _record(self, url: str, status: int, size: int):
+        with self._lock:
+            self._requests[url] += 1
+            self._statuses[status] += 1
+            self._bytes_sent += size
+            if status == 200:
+                self._served[url] += 1
+                
+    def _delay(self) -> float:
+        with self._lock:
+            return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            
+    def _fault(self) -> Optional[int]:
+        """Status to answer with instead of the page, if any"""
+        with self._lock:
+            if self.rate_limit:
+                now = time.monotonic()
+                self._tokens = min(float(self.rate_limit), self._tokens + (now - self._refilled) * self.rate_limit)
+                self._refilled = now
+                if self._tokens < 1:
+                    return 429
+                self._tokens -= 1
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 503
+        return None
+        
+    def _render(self, key: str, build) -> bytes:
+        with self._lock:
+            body = self._rendered.get(key)
+        if body is None:
+            body = build().encode('utf-8')
+            with self._lock:
+                self._rendered[key] = body
+        return body
+        
+    def route(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, str, bytes, Dict[str, str]]:
+        """(status, content type, body, extra headers) for a GET of path"""
+        html_type = 'text/html; charset=UTF-8'
+        parts = [part for part in path.split('/') if part]
+        
+        if parts == ['shop'] or (len(parts) == 3 and parts[:2] == ['shop', 'page'] and parts[2].isdigit()):
+            page = int(parts[2]) if len(parts) == 3 else 1
+            if 1 <= page <= self.pages:
+                return 200, html_type, self._render(path, lambda: self._listing(page)), {}
+        elif len(parts) == 2 and parts[0] == 'product' and parts[1] in self._by_slug:
+            item = self._by_slug[parts[1]]
+            return 200, html_type, self._render(path, lambda: self._product(item)), {}
+        elif path == STORE_API_PATH and self.store_api:
+            return self._store_api(query)
+        elif path == '/robots.txt':
+            lines = ['User-agent: *', 'Disallow: /wp-admin/']
+            if self.sitemaps:
+                lines.append(f"Sitemap: {self.base_url}/sitemap_index.xml")
+            return 200, 'text/plain; charset=UTF-8', ('\n'.join(lines) + '\n').encode('utf-8'), {}
+        elif path == '/sitemap_index.xml' and self.sitemaps:
+            return 200, 'application/xml; charset=UTF-8', self._render(path, self._sitemap_index), {}
+        elif self.sitemaps and path.startswith('/product-sitemap') and path.endswith('.xml'):
+            number = path[len('/product-sitemap'):-len('.xml')]
+            if number == '' or (number.isdigit() and int(number) > 1):
+                chunk = int(number or 1) - 1
+                if chunk * SITEMAP_SIZE < len(self.items):
+                    return 200, 'application/xml; charset=UTF-8', \
+                        self._render(path, lambda: self._product_sitemap(chunk)), {}
+        return 404, html_type, b'<!DOCTYPE html><html><body><h1>Page not found</h1></body></html>', {}
+        
+    def _listing(self, page: int) -> str:
+        items = self.items[(page - 1) * self.products_per_page:page * self.products_per_page]
+        return listing_page(self.theme, items, page, self.pages, self.base_url, self.padding_kb, self.seed)
+        
+    def _product(self, item: CatalogItem) -> str:
+        related = [self.items[(item.index + offset) % len(self.items)] for offset in range(1, 5)]
+        return product_page(self.theme, item, self.base_url, related, self.padding_kb, self.seed)
+        
+    def _store_item(self, item: CatalogItem) -> Dict[str, Any]:
+        def minor(value: Optional[str]) -> Optional[str]:
+            return str(round(float(value) * 100)) if value else None
+        image = f"{self.base_url}/wp-content/uploads/2024/05/{item.slug}"
+        return {
+            'id': item.index,
+            'name': item.title,
+            'slug': item.slug,
+            'permalink': product_url(self.base_url, item),
+            'sku': item.sku,
+            'short_description': f"<p>{item.description}</p>",
+            'description': f"<p>{item.description}</p>",
+            'on_sale': item.regular_price is not None,
+            'prices': {
+                'price': minor(item.price),
+                'regular_price': minor(item.regular_price or item.price),
+                'sale_price': minor(item.price),
+                'currency_code': 'USD',
+                'currency_symbol': '$',
+                'currency_minor_unit': 2,
+                'currency_decimal_separator': '.',
+                'currency_thousand_separator': ',',
+                'currency_prefix': '$',
+                'currency_suffix': ''
+            },
+            'images': [{'id': item.index, 'src': f"{image}.jpg", 'thumbnail': f"{image}-300x300.jpg"}],
+            'categories': [{'id': 1, 'name': item.category, 'slug': item.category_slug}],
+            'is_in_stock': item.stock != 'outofstock',
+            'is_on_backorder': item.stock == 'onbackorder'
+        }
+        
+    def _store_api(self, query: Dict[str, List[str]]) -> Tuple[int, str, bytes, Dict[str, str]]:
+        def number(name: str, default: int) -> int:
+            value = (query.get(name) or [''])[0]
+            return int(value) if value.isdigit() else default
+        per_page = min(100, max(1, number('per_page', 10)))
+        page = max(1, number('page', 1))
+        total_pages = (len(self.items) + per_page - 1) // per_page
+        items = self.items[(page - 1) * per_page:page * per_page]
+        body = json.dumps([self._store_item(item) for item in items]).encode('utf-8')
+        headers = {'X-WP-Total': str(len(self.items)), 'X-WP-TotalPages': str(total_pages)}
+        return 200, 'application/json; charset=UTF-8', body, headers
+        
+    def _sitemap_index(self) -> str:
+        lastmod = LAST_MODIFIED.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+        entries = ''.join(
+            f"<sitemap><loc>{self.base_url}/product-sitemap{chunk + 1 if chunk else ''}.xml</loc>"
+            f"<lastmod>{lastmod}</lastmod></sitemap>"
+            for chunk in range((len(self.items) + SITEMAP_SIZE - 1) // SITEMAP_SIZE)
+        )
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</sitemapindex>')
+                
+    def _product_sitemap(self, chunk: int) -> str:
+        lastmod = LAST_MODIFIED.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+        entries = ''.join(
+            f"<url><loc>{product_url(self.base_url, item)}</loc><lastmod>{lastmod}</lastmod></url>"
+            for item in self.items[chunk * SITEMAP_SIZE:(chunk + 1) * SITEMAP_SIZE]
+        )
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>')
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, as a real shop behind nginx would allow
+    protocol_version = 'HTTP/1.1'
+    server_version = 'nginx'
+    sys_version = ''
+    
+    def do_GET(self):
+        shop: StandInShop = self.server.shop
+        parsed = urlparse(self.path)
+        delay = shop._delay()
+        if delay:
+            time.sleep(delay)
+            
+        fault = shop._fault()
+        if fault is not None:
+            headers = {'Retry-After': str(shop.retry_after)} if shop.retry_after is not None else {}
+            self._send(fault, 'text/html; charset=UTF-8', b'<html><body>Too busy</body></html>', headers)
+            shop._record(self.path, fault, 0)
+            return
+            
+        status, content_type, body, headers = shop.route(parsed.path, parse_qs(parsed.query))
+        if status == 200:
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            headers = dict(headers)
+            headers['ETag'] = etag
+            headers['Last-Modified'] = formatdate(LAST_MODIFIED.timestamp(), usegmt=True)
+            if self.headers.get('If-None-Match') == etag:
+                status, body = 304, b''
+        self._send(status, content_type, body, headers)
+        shop._record(self.path, status, len(body))
+        
+    def _send(self, status: int, content_type: str, body: bytes, headers: Dict[str, str]):
+        self.send_response(status)
+        if status != 304:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        
+    def log_message(self, format, *args):
+        # Request logging would dominate the cost of serving under load
+        pass
+
+def add_shop_arguments(parser: argparse.ArgumentParser):
+    """Command line options shared by the server and the end-to-end harness"""
+    group = parser.add_argument_group('stand-in shop')
+    group.add_argument('--theme', choices=THEMES, default='classic', help='Markup style of the pages (default: classic)')
+    group.add_argument('--pages', type=int, default=10, help='Listing pages (default: 10)')
+    group.add_argument('--products-per-page', type=int, default=24, help='Products per listing page (default: 24)')
+    group.add_argument('--padding-kb', type=int, default=40,
+                       help='Header/footer markup added to every page, in KB (default: 40)')
+    group.add_argument('--seed', type=int, default=0, help='Seed of the catalog and of fault injection')
+    group.add_argument('--latency', type=float, default=0.05, help='Seconds added to every response (default: 0.05)')
+    group.add_argument('--jitter', type=float, default=0.0, help='Up to this many more seconds, at random')
+    group.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+    group.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    group.add_argument('--rate-limit', type=float, help='Answer 429 once clients exceed this many requests per second')
+    group.add_argument('--retry-after', type=int, default=1,
+                       help='Retry-After seconds sent with 429/503; negative to omit the header (default: 1)')
+    group.add_argument('--no-store-api', action='store_true', help='Answer 404 on the Store API')
+    group.add_argument('--no-sitemaps', action='store_true', help='Serve no sitemaps')
+
+def shop_from_args(args, host: str = '127.0.0.1', port: int = 0) -> StandInShop:
+    return StandInShop(
+        theme=args.theme,
+        pages=args.pages,
+        products_per_page=args.products_per_page,
+        padding_kb=args.padding_kb,
+        seed=args.seed,
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        retry_after=args.retry_after if args.retry_after >= 0 else None,
+        store_api=not args.no_store_api,
+        sitemaps=not args.no_sitemaps,
+        host=host,
+        port=port
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a stand-in WooCommerce shop for local testing')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on; 0 picks a free one (default: 8080)')
+    add_shop_arguments(parser)
+    args = parser.parse_args()
+    
+    shop = shop_from_args(args, args.host, args.port)
+    print(f"Serving {shop.product_count} products ({args.theme} theme) at {shop.base_url}/shop/")
+    try:
+        shop.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shop.httpd.server_close()
+        print(json.dumps(shop.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
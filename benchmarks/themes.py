@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Synthetic WooCommerce pages
+Listing and product pages in the markup of common theme styles, generated from a seeded fake catalog
+"""
+
+import html
+import json
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+THEMES = ('classic', 'block', 'flatsome')
+
+CATEGORIES = ['T-Shirts', 'Hoodies', 'Accessories', 'Shoes', 'Bags', 'Posters', 'Mugs', 'Caps']
+ADJECTIVES = ['Classic', 'Vintage', 'Organic', 'Premium', 'Everyday', 'Limited', 'Urban', 'Heritage']
+NOUNS = ['Crew Neck Tee', 'Zip Hoodie', 'Canvas Tote', 'Runner Sneaker', 'Wool Beanie', 'Art Print', 'Travel Mug']
+STOCK = ['instock'] * 7 + ['outofstock', 'onbackorder']
+STOCK_TEXT = {'instock': 'In stock', 'outofstock': 'Out of stock', 'onbackorder': 'Available on backorder'}
+SCHEMA_AVAILABILITY = {'instock': 'InStock', 'outofstock': 'OutOfStock', 'onbackorder': 'BackOrder'}
+
+@dataclass
+class CatalogItem:
+    """One fake product, the source of every page that shows it"""
+    index: int
+    title: str
+    slug: str
+    price: str
+    regular_price: Optional[str]
+    sku: str
+    category: str
+    stock: str
+    description: str
+    
+    @property
+    def category_slug(self) -> str:
+        return self.category.lower().replace(' ', '-')
+
+def catalog(count: int, seed: int = 0) -> List[CatalogItem]:
+    """A deterministic catalog of count products"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        title = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i + 1}"
+        price = rng.randint(500, 15000) / 100
+        on_sale = rng.random() < 0.2
+        items.append(CatalogItem(
+            index=i + 1,
+            title=title,
+            slug=title.lower().replace(' ', '-'),
+            price=f"{price * 0.8 if on_sale else price:.2f}",
+            regular_price=f"{price:.2f}" if on_sale else None,
+            sku=f"WC-{rng.randint(100000, 999999)}",
+            category=rng.choice(CATEGORIES),
+            stock=rng.choice(STOCK),
+            description=' '.join(rng.choice(['Soft', 'durable', 'breathable', 'fabric', 'with', 'a', 'relaxed',
+                                             'fit', 'and', 'reinforced', 'seams', 'made', 'to', 'last'])
+                                 for _ in range(rng.randint(20, 60))) + '.'
+        ))
+    return items
+
+def listing_url(base_url: str, page: int) -> str:
+    return f"{base_url}/shop/" if page == 1 else f"{base_url}/shop/page/{page}/"
+
+def product_url(base_url: str, item: CatalogItem) -> str:
+    return f"{base_url}/product/{item.slug}/"
+
+def _amount(value: str) -> str:
+    return (f'<span class="woocommerce-Price-amount amount"><bdi>'
+            f'<span class="woocommerce-Price-currencySymbol">&#36;</span>{value}</bdi></span>')
+
+def _price_html(item: CatalogItem) -> str:
+    if item.regular_price:
+        return (f'<del aria-hidden="true">{_amount(item.regular_price)}</del> '
+                f'<ins aria-hidden="true">{_amount(item.price)}</ins>')
+    return _amount(item.price)
+
+def _image(base_url: str, item: CatalogItem, size: str = '300x300') -> str:
+    return f"{base_url}/wp-content/uploads/2024/05/{item.slug}-{size}.jpg"
+
+def _chrome(rng: random.Random, base_url: str, kilobytes: int) -> Tuple[str, str]:
+    """Header and footer markup (menus, widgets, inline scripts) adding up to about kilobytes"""
+    parts = []
+    size = 0
+    while size < kilobytes * 1024:
+        menu = ''.join(f'<li class="menu-item menu-item-type-taxonomy menu-item-{rng.randint(100, 999)}">'
+                       f'<a href="{base_url}/product-category/{c.lower()}/{rng.randint(1, 99)}/">{c}</a></li>'
+                       for c in rng.sample(CATEGORIES, len(CATEGORIES)))
+        script = ('<script>var wc_params = ' +
+                  json.dumps({f"key_{i}": rng.random() for i in range(20)}) + ';</script>')
+        parts.append(f'<ul class="sub-menu">{menu}</ul>{script}')
+        size += len(parts[-1])
+    half = len(parts) // 2
+    header = (f'<header id="masthead" class="site-header"><nav class="main-navigation"><ul class="menu">'
+              f'{"".join(parts[:half])}</ul></nav></header>')
+    footer = (f'<footer id="colophon" class="site-footer"><div class="widget-area">'
+              f'{"".join(parts[half:])}</div></footer>')
+    return header, footer
+
+def _document(title: str, head: str, header: str, body: str, footer: str, body_class: str) -> str:
+    return (f'<!DOCTYPE html><html lang="en-US"><head><meta charset="UTF-8"><title>{html.escape(title)}</title>'
+            f'{head}</head><body class="{body_class}">{header}<main id="main" class="site-main">{body}</main>'
+            f'{footer}</body></html>')
+
+def _pagination(base_url: str, page: int, pages: int, link_class: str = 'page-numbers') -> str:
+    links = []
+    if page > 1:
+        links.append(f'<li><a class="prev {link_class}" href="{listing_url(base_url, page - 1)}">&larr;</a></li>')
+    for number in range(max(1, page - 2), min(pages, page + 2) + 1):
+        if number == page:
+            links.append(f'<li><span aria-current="page" class="{link_class} current">{number}</span></li>')
+        else:
+            links.append(f'<li><a class="{link_class}" href="{listing_url(base_url, number)}">{number}</a></li>')
+    if page < pages:
+        links.append(f'<li><a class="next {link_class}" href="{listing_url(base_url, page + 1)}">&rarr;</a></li>')
+    return f'<nav class="woocommerce-pagination"><ul class="page-numbers">{"".join(links)}</ul></nav>'
+
+def _classic_card(base_url: str, item: CatalogItem) -> str:
+    link = product_url(base_url, item)
+    return (f'<li class="product type-product post-{item.index} status-publish {item.stock} '
+            f'product_cat-{item.category_slug} has-post-thumbnail shipping-taxable purchasable product-type-simple">'
+            f'<a href="{link}" class="woocommerce-LoopProduct-link woocommerce-loop-product__link">'
+            f'<img width="300" height="300" src="{_image(base_url, item)}" '
+            f'class="attachment-woocommerce_thumbnail size-woocommerce_thumbnail" alt="" decoding="async">'
+            f'<h2 class="woocommerce-loop-product__title">{html.escape(item.title)}</h2>'
+            f'<span class="price">{_price_html(item)}</span></a>'
+            f'<a href="?add-to-cart={item.index}" data-quantity="1" '
+            f'class="button product_type_simple add_to_cart_button ajax_add_to_cart" '
+            f'data-product_id="{item.index}" data-product_sku="{item.sku}" rel="nofollow">Add to cart</a></li>')
+
+def _block_card(base_url: str, item: CatalogItem) -> str:
+    link = product_url(base_url, item)
+    return (f'<li class="wc-block-grid__product"><a href="{link}" class="wc-block-grid__product-link">'
+            f'<div class="wc-block-grid__product-image"><img loading="lazy" src="{_image(base_url, item)}" '
+            f'alt="{html.escape(item.title)}"></div>'
+            f'<div class="wc-block-grid__product-title">{html.escape(item.title)}</div></a>'
+            f'<div class="wc-block-grid__product-price price">{_price_html(item)}</div>'
+            f'<div class="wp-block-button wc-block-grid__product-add-to-cart">'
+            f'<a href="?add-to-cart={item.index}" data-product_id="{item.index}" '
+            f'class="wp-block-button__link add_to_cart_button ajax_add_to_cart">Add to cart</a></div></li>')
+
+def _flatsome_card(base_url: str, item: CatalogItem) -> str:
+    link = product_url(base_url, item)
+    return (f'<div class="product-small col has-hover product type-product post-{item.index} status-publish '
+            f'{item.stock} product_cat-{item.category_slug} has-post-thumbnail">'
+            f'<div class="col-inner"><div class="badge-container absolute left top z-1"></div>'
+            f'<div class="product-small box"><div class="box-image"><div class="image-fade_in_back">'
+            f'<a href="{link}" aria-label="{html.escape(item.title)}">'
+            f'<img width="300" height="300" src="data:image/svg+xml,%3Csvg%3E%3C/svg%3E" '
+            f'data-src="{_image(base_url, item)}" class="lazy-load attachment-woocommerce_thumbnail"></a>'
+            f'</div></div><div class="box-text box-text-products"><div class="title-wrapper">'
+            f'<p class="category uppercase is-smaller no-text-overflow product-cat op-7">{item.category}</p>'
+            f'<p class="name product-title woocommerce-loop-product__title">'
+            f'<a href="{link}" class="woocommerce-LoopProduct-link">{html.escape(item.title)}</a></p></div>'
+            f'<div class="price-wrapper"><span class="price">{_price_html(item)}</span></div>'
+            f'</div></div></div></div>')
+
+def listing_page(theme: str, items: List[CatalogItem], page: int, pages: int, base_url: str,
+                 padding_kb: int = 40, seed: int = 0) -> str:
+    """One page of the shop listing showing items"""
+    rng = random.Random(seed * 100003 + page)
+    header, footer = _chrome(rng, base_url, padding_kb)
+    if theme == 'classic':
+        grid = f'<ul class="products columns-4">{"".join(_classic_card(base_url, i) for i in items)}</ul>'
+        grid += _pagination(base_url, page, pages)
+        body_class = 'archive post-type-archive-product woocommerce-shop woocommerce'
+    elif theme == 'block':
+        grid = (f'<div class="wp-block-woocommerce-product-collection wc-block-grid has-4-columns">'
+                f'<ul class="wc-block-grid__products">{"".join(_block_card(base_url, i) for i in items)}</ul>'
+                f'</div>{_pagination(base_url, page, pages)}')
+        body_class = 'archive wp-embed-responsive woocommerce-shop theme-twentytwentyfour'
+    elif theme == 'flatsome':
+        grid = (f'<div class="products row row-small large-columns-4 medium-columns-3 small-columns-2">'
+                f'{"".join(_flatsome_card(base_url, i) for i in items)}</div>'
+                f'<div class="container">{_pagination(base_url, page, pages, "page-number")}</div>')
+        body_class = 'archive woocommerce flatsome-theme lightbox nav-dropdown-has-arrow'
+    else:
+        raise ValueError(f"Unknown theme '{theme}'")
+    return _document(f"Shop - Page {page}", '', header, grid, footer, body_class)
+
+def _json_ld(base_url: str, item: CatalogItem) -> str:
+    data = {
+        "@context": "https://schema.org/",
+        "@graph": [
+            {"@type": "BreadcrumbList", "itemListElement": [
+                {"@type": "ListItem", "position": 1, "item": {"name": "Home", "@id": base_url + "/"}},
+                {"@type": "ListItem", "position": 2,
+                 "item": {"name": item.category, "@id": f"{base_url}/product-category/{item.category_slug}/"}}
+            ]},
+            {"@type": "Product", "@id": product_url(base_url, item) + "#product", "name": item.title,
+             "url": product_url(base_url, item), "description": item.description,
+             "image": _image(base_url, item, '1024x1024'), "sku": item.sku,
+             "offers": [{"@type": "Offer", "price": item.price, "priceCurrency": "USD",
+                         "availability": f"http://schema.org/{SCHEMA_AVAILABILITY[item.stock]}",
+                         "url": product_url(base_url, item)}]}
+        ]
+    }
+    return f'<script type="application/ld+json">{json.dumps(data)}</script>'
+
+def _breadcrumb(base_url: str, item: CatalogItem, extra_class: str = '') -> str:
+    return (f'<nav class="woocommerce-breadcrumb {extra_class}" aria-label="Breadcrumb">'
+            f'<a href="{base_url}/">Home</a>&nbsp;&#47;&nbsp;'
+            f'<a href="{base_url}/product-category/{item.category_slug}/">{item.category}</a>'
+            f'&nbsp;&#47;&nbsp;{html.escape(item.title)}</nav>')
+
+def _product_meta(item: CatalogItem) -> str:
+    return (f'<div class="product_meta"><span class="sku_wrapper">SKU: <span class="sku">{item.sku}</span></span>'
+            f'<span class="posted_in">Category: <a href="/product-category/{item.category_slug}/" rel="tag">'
+            f'{item.category}</a></span></div>')
+
+def _stock(item: CatalogItem) -> str:
+    css = {'instock': 'in-stock', 'outofstock': 'out-of-stock', 'onbackorder': 'available-on-backorder'}
+    return f'<p class="stock {css[item.stock]}">{STOCK_TEXT[item.stock]}</p>'
+
+def product_page(theme: str, item: CatalogItem, base_url: str, related: List[CatalogItem] = (),
+                 padding_kb: int = 40, seed: int = 0) -> str:
+    """The product page of item, with related products below the summary
+    
+    Classic and block pages carry WooCommerce's JSON-LD; Flatsome pages
+    have none, so their fields come from the detail selectors.
+    """
+    rng = random.Random(seed * 100003 + 50000 + item.index)
+    header, footer = _chrome(rng, base_url, padding_kb)
+    gallery = (f'<div class="woocommerce-product-gallery woocommerce-product-gallery--with-images images">'
+               f'<div class="woocommerce-product-gallery__image"><a href="{_image(base_url, item, "1024x1024")}">'
+               f'<img width="600" height="600" src="{_image(base_url, item, "600x600")}" class="wp-post-image">'
+               f'</a></div></div>')
+    tabs = (f'<div class="woocommerce-tabs wc-tabs-wrapper"><ul class="tabs wc-tabs">'
+            f'<li class="description_tab"><a href="#tab-description">Description</a></li>'
+            f'<li class="reviews_tab"><a href="#tab-reviews">Reviews (0)</a></li></ul>'
+            f'<div class="woocommerce-Tabs-panel woocommerce-Tabs-panel--description panel entry-content">'
+            f'<h2>Description</h2>{"".join(f"<p>{item.description}</p>" for _ in range(3))}</div></div>')
+    cart = (f'<form class="cart" method="post"><div class="quantity"><input type="number" class="input-text qty" '
+            f'name="quantity" value="1"></div><button type="submit" name="add-to-cart" value="{item.index}" '
+            f'class="single_add_to_cart_button button alt">Add to cart</button></form>')
+            
+    if theme == 'classic':
+        related_html = ''.join(_classic_card(base_url, r) for r in related)
+        body = (f'{_breadcrumb(base_url, item)}<div id="product-{item.index}" class="product type-product '
+                f'{item.stock}">{gallery}<div class="summary entry-summary">'
+                f'<h1 class="product_title entry-title">{html.escape(item.title)}</h1>'
+                f'<p class="price">{_price_html(item)}</p>'
+                f'<div class="woocommerce-product-details__short-description"><p>{item.description}</p></div>'
+                f'{_stock(item)}{cart}{_product_meta(item)}</div>{tabs}'
+                f'<section class="related products"><h2>Related products</h2>'
+                f'<ul class="products columns-4">{related_html}</ul></section></div>')
+        head = _json_ld(base_url, item)
+    elif theme == 'block':
+        related_html = ''.join(_block_card(base_url, r) for r in related)
+        body = (f'{_breadcrumb(base_url, item, "wp-block-woocommerce-breadcrumbs")}'
+                f'<div class="wp-block-columns"><div class="wp-block-column">'
+                f'<div class="wp-block-woocommerce-product-image-gallery">{gallery}</div></div>'
+                f'<div class="wp-block-column"><h1 class="wp-block-post-title">{html.escape(item.title)}</h1>'
+                f'<div class="wp-block-woocommerce-product-price"><div class="wc-block-components-product-price">'
+                f'{_price_html(item)}</div></div><div class="wp-block-post-excerpt">'
+                f'<p class="wp-block-post-excerpt__excerpt">{item.description}</p></div>{_stock(item)}{cart}'
+                f'<div class="wp-block-woocommerce-product-meta"><div class="wc-block-components-product-sku">'
+                f'SKU: <strong class="sku">{item.sku}</strong></div><div class="taxonomy-product_cat '
+                f'wp-block-post-terms"><a href="/product-category/{item.category_slug}/" rel="tag">'
+                f'{item.category}</a></div></div></div></div>{tabs}'
+                f'<div class="wp-block-woocommerce-related-products"><ul class="wc-block-grid__products">'
+                f'{related_html}</ul></div>')
+        head = _json_ld(base_url, item)
+    elif theme == 'flatsome':
+        related_html = ''.join(_flatsome_card(base_url, r) for r in related)
+        body = (f'<div class="product-container"><div class="product-main"><div class="row content-row mb-0">'
+                f'<div class="product-gallery large-6 col">{gallery}</div>'
+                f'<div class="product-info summary col-fit col entry-summary product-summary">'
+                f'{_breadcrumb(base_url, item, "breadcrumbs uppercase")}'
+                f'<h1 class="product-title product_title entry-title">{html.escape(item.title)}</h1>'
+                f'<div class="is-divider small"></div><div class="price-wrapper">'
+                f'<p class="price product-page-price">{_price_html(item)}</p></div>'
+                f'<div class="product-short-description"><p>{item.description}</p></div>'
+                f'{_stock(item)}{cart}{_product_meta(item)}</div></div></div>'
+                f'<div class="product-footer"><div class="container">{tabs}'
+                f'<div class="related related-products-wrapper product-section"><div class="row large-columns-4">'
+                f'{related_html}</div></div></div></div></div>')
+        head = ''
+    else:
+        raise ValueError(f"Unknown theme '{theme}'")
+    return _document(item.title, head, header, body, footer, f'product-template-default single single-product')
+
+def build_site(theme: str, pages: int, products_per_page: int, base_url: str = 'https://shop.example.com',
+               padding_kb: int = 40, seed: int = 0) -> Tuple[Dict[str, str], Dict[str, str], List[CatalogItem]]:
+    """Every listing and product page of a synthetic shop: (listing pages, product pages, catalog) by URL"""
+    items = catalog(pages * products_per_page, seed)
+    listing = {}
+    for page in range(1, pages + 1):
+        page_items = items[(page - 1) * products_per_page:page * products_per_page]
+        listing[listing_url(base_url, page)] = listing_page(theme, page_items, page, pages, base_url,
+                                                            padding_kb, seed)
+    products = {}
+    for item in items:
+        related = [items[(item.index + offset) % len(items)] for offset in range(1, 5)]
+        products[product_url(base_url, item)] = product_page(theme, item, base_url, related, padding_kb, seed)
+    return listing, products, items
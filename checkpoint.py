@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Crawl checkpoints
+Saves pagination progress, extracted products and fetched product details so an interrupted crawl can resume
+"""
+
+import json
+import logging
+import os
+import time
+from dataclasses import asdict
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class CrawlCheckpoint:
+    """Progress of one paginated crawl, kept in a directory
+    
+    state.json      where pagination stands: next page URL and number,
+                    completed pages, and how much of products.jsonl is valid
+    products.jsonl  products of every completed page, appended page by page
+    details.jsonl   product page details, appended as each fetch succeeds
+    
+    state.json is replaced atomically after the page's products are
+    appended, so a crash at any point leaves the last completed page as
+    the resume point; products appended after it are cut off on load.
+    Nothing is rewritten except the small state file, which keeps a
+    checkpoint after every page cheap.
+    """
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.state: Dict[str, Any] = {}
+        self.details: Dict[str, Dict[str, str]] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._state_path = os.path.join(directory, 'state.json')
+        self._products_path = os.path.join(directory, 'products.jsonl')
+        self._details_path = os.path.join(directory, 'details.jsonl')
+        self._products_file = None
+        self._details_file = None
+        
+    def reset(self):
+        """Discard any previous checkpoint and start a new one"""
+        self.close()
+        for path in (self._state_path, self._products_path, self._details_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.state = {}
+        self.details = {}
+        
+    def load(self) -> bool:
+        """Read the saved checkpoint; False if there is none"""
+        if not os.path.exists(self._state_path):
+            return False
+        try:
+            with open(self._state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Unreadable checkpoint {self._state_path}: {e}")
+            self.state = {}
+            return False
+            
+        # Drop products appended after the last state write
+        if os.path.exists(self._products_path):
+            with open(self._products_path, 'r+b') as f:
+                f.truncate(self.state.get('products_offset', 0))
+                
+        if os.path.exists(self._details_path):
+            with open(self._details_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by the crash
+                        continue
+                    self.details[record['link']] = record['details']
+        return True
+        
+    def resume_point(self, start_url: str) -> Optional[Dict[str, Any]]:
+        """The saved state if it belongs to a crawl of start_url"""
+        if not self.state:
+            return None
+        if self.state.get('start_url') != start_url:
+            logger.warning(f"Checkpoint in {self.directory} is for {self.state.get('start_url')}, not {start_url}; "
+                           f"starting over")
+            self.reset()
+            return None
+        return self.state
+        
+    def products(self) -> Iterator[Dict[str, Any]]:
+        """Product rows saved for the completed pages"""
+        if not os.path.exists(self._products_path):
+            return
+        with open(self._products_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+                
+    def record_details(self, link: str, details: Dict[str, str]):
+        """Remember a successful product page fetch"""
+        if self._details_file is None:
+            self._details_file = open(self._details_path, 'a', encoding='utf-8')
+        self.details[link] = details
+        self._details_file.write(json.dumps({'link': link, 'details': details}, ensure_ascii=False) + '\n')
+        self._details_file.flush()
+        
+    def page_done(self, start_url: str, page_url: str, page_num: int, next_url: Optional[str], products: List):
+        """Record a completed listing page and where pagination continues"""
+        if self._products_file is None:
+            self._products_file = open(self._products_path, 'a', encoding='utf-8')
+        self._products_file.write(''.join(json.dumps(asdict(product), ensure_ascii=False) + '\n'
+                                          for product in products))
+        self._products_file.flush()
+        
+        pages = self.state.get('pages_completed', [])
+        pages.append(page_url)
+        self.state = {
+            'start_url': start_url,
+            'next_url': next_url,
+            'next_page_num': page_num + 1,
+            'pages_completed': pages,
+            'product_count': self.state.get('product_count', 0) + len(products),
+            'products_offset': self._products_file.tell(),
+            'updated_at': time.time()
+        }
+        
+        tmp_path = self._state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self._state_path)
+        
+    def close(self):
+        for f in (self._products_file, self._details_file):
+            if f is not None:
+                f.close()
+        self._products_file = None
+        self._details_file = None
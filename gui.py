@@ -16,6 +16,8 @@ import sys
 # Import scraper từ file scraper.py
 try:
     from scraper import WooCommerceScraper, Product
+    from sinks import CsvSink, JsonArraySink
+    from profiling import CrawlProfiler, format_summary
 except ImportError:
     messagebox.showerror("Lỗi", "Không thể import scraper.py. Vui lòng đảm bảo file scraper.py tồn tại!")
     sys.exit(1)
@@ -39,6 +41,7 @@ class ScraperGUI:
         self.fetch_detailed_var = tk.BooleanVar(value=False)
         self.export_json_var = tk.BooleanVar(value=True)
         self.export_csv_var = tk.BooleanVar(value=False)
+        self.profile_var = tk.BooleanVar(value=False)
         self.output_dir_var = tk.StringVar(value=os.getcwd())
         
         # Queue for thread communication
@@ -46,6 +49,7 @@ class ScraperGUI:
         self.scraper = None
         self.scraping_thread = None
         self.is_scraping = False
+        self.stop_event = threading.Event()
         
         self.create_widgets()
         self.start_message_processor()
@@ -112,6 +116,11 @@ class ScraperGUI:
                                         variable=self.fetch_detailed_var)
         detailed_check.grid(row=1, column=2, columnspan=2, sticky=tk.W, pady=(15, 0))
         
+        # Row 3: Profiling
+        profile_check = ttk.Checkbutton(options_frame, text="🔬 Profile (flame graph, thời gian từng bước và selector ít khớp)", 
+                                       variable=self.profile_var)
+        profile_check.grid(row=2, column=0, columnspan=4, sticky=tk.W, pady=(10, 0))
+        
         # Export Section  
         export_frame = ttk.LabelFrame(main_frame, text="💾 Xuất dữ liệu", padding="15")
         export_frame.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 15))
@@ -265,14 +274,17 @@ class ScraperGUI:
         self.log_message(f"⏱️ Delay: {self.delay_var.get()}s")
         self.log_message(f"🔒 Proxy: {'Có' if self.use_proxy_var.get() else 'Không'}")
         self.log_message(f"📋 Scrape chi tiết: {'Có' if self.fetch_detailed_var.get() else 'Không'}")
+        self.log_message(f"🔬 Profile: {'Có' if self.profile_var.get() else 'Không'}")
         
         # Start scraping thread
+        self.stop_event.clear()
         self.scraping_thread = threading.Thread(target=self.scraping_worker, daemon=True)
         self.scraping_thread.start()
     
     def stop_scraping(self):
         """Dừng scraping"""
         if self.scraping_thread and self.scraping_thread.is_alive():
+            self.stop_event.set()
             self.log_message("⏹️ Đang cố gắng dừng scraping...")
             messagebox.showinfo("Thông báo", "Scraping sẽ dừng sau request hiện tại")
         self.reset_ui()
@@ -310,33 +322,58 @@ class ScraperGUI:
             else:
                 self.message_queue.put(("log", f"🔍 Bắt đầu scraping tối đa {max_pages} trang..."))
             
-            products = scraper.scrape_all_pages(url, max_pages=max_pages, fetch_detailed=fetch_detailed)
-            
-            if not products:
-                self.message_queue.put(("log", "❌ Không tìm thấy sản phẩm nào!"))
-                self.message_queue.put(("error", "Không tìm thấy sản phẩm nào! Có thể website sử dụng cấu trúc HTML khác hoặc có biện pháp chống scraping."))
-                return
-            
-            self.message_queue.put(("log", f"✅ Tìm thấy {len(products)} sản phẩm"))
-            
-            # Export data
+            # Products are written to the export files as they are found
             output_dir = self.output_dir_var.get()
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             
-            exported_files = []
-            
+            sinks = []
             if self.export_json_var.get():
-                json_file = os.path.join(output_dir, f"products_{timestamp}.json")
-                scraper.export_to_json(json_file)
-                exported_files.append(json_file)
-                self.message_queue.put(("log", f"💾 Đã xuất JSON: {json_file}"))
-            
+                sinks.append(JsonArraySink(os.path.join(output_dir, f"products_{timestamp}.json")))
             if self.export_csv_var.get():
-                csv_file = os.path.join(output_dir, f"products_{timestamp}.csv")
-                scraper.export_to_csv(csv_file)
-                exported_files.append(csv_file)
-                self.message_queue.put(("log", f"💾 Đã xuất CSV: {csv_file}"))
+                sinks.append(CsvSink(os.path.join(output_dir, f"products_{timestamp}.csv")))
+                
+            # Profile of the crawl and exports, written next to the export files
+            profiler = None
+            if self.profile_var.get():
+                profiling = scraper.config.get('profiling', {})
+                profiler = CrawlProfiler(os.path.join(output_dir, f"profile_{timestamp}"),
+                                         profiling.get('mode', 'sample'), profiling.get('interval_ms', 5) / 1000)
+                profiler.start()
+                
+            samples = []
+            stopped = False
+            try:
+                for product in scraper.iter_products(url, max_pages=max_pages, fetch_detailed=fetch_detailed):
+                    for sink in sinks:
+                        sink.write(product)
+                    if len(samples) < 3:
+                        samples.append(product)
+                    if self.stop_event.is_set():
+                        stopped = True
+                        break
+            finally:
+                for sink in sinks:
+                    sink.close()
+                if profiler:
+                    for line in format_summary(profiler.write(scraper)):
+                        self.message_queue.put(("log", f"🔬 {line}"))
+                    
+            total = scraper.tally.total
+            if stopped:
+                self.message_queue.put(("log", f"⏹️ Đã dừng scraping sau {total} sản phẩm"))
+                
+            if not total:
+                self.message_queue.put(("log", "❌ Không tìm thấy sản phẩm nào!"))
+                self.message_queue.put(("error", "Không tìm thấy sản phẩm nào! Có thể website sử dụng cấu trúc HTML khác hoặc có biện pháp chống scraping."))
+                return
+                
+            self.message_queue.put(("log", f"✅ Tìm thấy {total} sản phẩm"))
             
+            exported_files = [sink.filename for sink in sinks]
+            for sink in sinks:
+                kind = 'JSON' if isinstance(sink, JsonArraySink) else 'CSV'
+                self.message_queue.put(("log", f"💾 Đã xuất {kind}: {sink.filename}"))
+                
             # Get statistics
             stats = scraper.get_statistics()
             if stats:
@@ -346,13 +383,13 @@ class ScraperGUI:
             
             # Show sample products
             self.message_queue.put(("log", "🔍 === MẪU SẢN PHẨM ==="))
-            for i, product in enumerate(products[:3], 1):  # Show first 3 products
+            for i, product in enumerate(samples, 1):  # Show first 3 products
                 self.message_queue.put(("log", f"   {i}. {product.title} - {product.price}"))
             
-            if len(products) > 3:
-                self.message_queue.put(("log", f"   ... và {len(products) - 3} sản phẩm khác"))
+            if total > 3:
+                self.message_queue.put(("log", f"   ... và {total - 3} sản phẩm khác"))
             
-            success_msg = f"🎉 Scraping hoàn thành thành công!\n\n📊 Tìm thấy: {len(products)} sản phẩm\n💾 Đã lưu: {len(exported_files)} file\n📁 Thư mục: {output_dir}"
+            success_msg = f"🎉 Scraping hoàn thành thành công!\n\n📊 Tìm thấy: {total} sản phẩm\n💾 Đã lưu: {len(exported_files)} file\n📁 Thư mục: {output_dir}"
             self.message_queue.put(("success", success_msg))
             
         except Exception as e:
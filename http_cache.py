@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+On-disk HTTP response cache
+Stores page bodies with their validators so unchanged pages are served from disk after a 304
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so equivalent spellings share one cache entry"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    path = parts.path or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+@dataclass
+class CacheEntry:
+    """A cached response body and the validators needed to revalidate it"""
+    url: str
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+class HttpCache:
+    """Persistent response cache with conditional revalidation, TTL and LRU eviction"""
+    
+    def __init__(self, directory: str = '.http_cache', max_size_mb: float = 500,
+                 ttl_hours: float = 24, fresh_seconds: float = 0):
+        self.directory = directory
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.ttl = ttl_hours * 3600
+        self.fresh_seconds = fresh_seconds
+        os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+        self._db.commit()
+        self._total_size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        
+        self.stats = {"fresh_hits": 0, "revalidated": 0, "misses": 0, "stored": 0, "evicted": 0}
+        
+    @classmethod
+    def from_config(cls, settings: Dict, directory: Optional[str] = None) -> "HttpCache":
+        """Build a cache from the "cache" section of config.json"""
+        return cls(
+            directory=directory or settings.get('directory', '.http_cache'),
+            max_size_mb=settings.get('max_size_mb', 500),
+            ttl_hours=settings.get('ttl_hours', 24),
+            fresh_seconds=settings.get('fresh_seconds', 0)
+        )
+        
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+        
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.directory, 'bodies', key[:2], key + '.z')
+        
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """Look up a cached response, dropping it if it outlived the TTL"""
+        key = self._key(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, etag, last_modified, stored_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            if time.time() - row[3] > self.ttl:
+                self._delete(key)
+                self._db.commit()
+                self.stats["misses"] += 1
+                return None
+                
+        try:
+            with open(self._body_path(key), 'rb') as f:
+                body = zlib.decompress(f.read()).decode('utf-8')
+        except (OSError, zlib.error) as e:
+            logger.warning(f"Dropping unreadable cache entry for {url}: {e}")
+            with self._lock:
+                self._delete(key)
+                self._db.commit()
+            return None
+        return CacheEntry(url=row[0], body=body, etag=row[1], last_modified=row[2], stored_at=row[3])
+        
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """Whether an entry may be served without contacting the server at all"""
+        return self.fresh_seconds > 0 and time.time() - entry.stored_at < self.fresh_seconds
+        
+    def conditional_headers(self, entry: CacheEntry) -> Dict[str, str]:
+        """Headers turning a GET into a conditional request for entry"""
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+        
+    def mark_hit(self, url: str, revalidated: bool):
+        """Record that an entry was served, restarting its TTL after a 304"""
+        now = time.time()
+        with self._lock:
+            if revalidated:
+                self._db.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                                 (now, now, self._key(url)))
+                self.stats["revalidated"] += 1
+            else:
+                self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, self._key(url)))
+                self.stats["fresh_hits"] += 1
+            self._db.commit()
+            
+    def store(self, url: str, body: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Save a response body; bodies without validators are kept only if fresh_seconds allows serving them"""
+        if not etag and not last_modified and self.fresh_seconds <= 0:
+            return
+            
+        key = self._key(url)
+        data = zlib.compress(body.encode('utf-8'), 6)
+        path = self._body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if old:
+                self._total_size -= old[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, url, etag, last_modified, stored_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize_url(url), etag, last_modified, now, now, len(data))
+            )
+            self._total_size += len(data)
+            self.stats["stored"] += 1
+            if self._total_size > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+            self._db.commit()
+            
+    def _evict(self, target_size: int):
+        """Remove least recently used entries until the cache fits target_size"""
+        rows = self._db.execute("SELECT key FROM entries ORDER BY accessed_at").fetchall()
+        for (key,) in rows:
+            if self._total_size <= target_size:
+                break
+            self._delete(key)
+            self.stats["evicted"] += 1
+            
+    def _delete(self, key: str):
+        row = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._total_size -= row[0]
+        try:
+            os.remove(self._body_path(key))
+        except OSError:
+            pass
+            
+    def close(self):
+        with self._lock:
+            self._db.close()
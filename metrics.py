@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Crawl metrics
+Fetch latency histograms, byte and retry counters and per-stage timers, reported as JSON log lines
+or in Prometheus text format on a local HTTP endpoint
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the fetch latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_PREFIX = 'woocommerce_scraper'
+
+class Histogram:
+    """Counts of observations per bucket, with their sum"""
+    
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        # One more bucket for observations above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Cumulative counts keyed by upper bound, the way Prometheus reports buckets"""
+        buckets = {}
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            buckets[f"{bound:g}"] = total
+        buckets['+Inf'] = self.count
+        return {"buckets": buckets, "sum": round(self.sum, 6), "count": self.count}
+
+class HostMetrics:
+    """Fetch counters of one host"""
+    
+    def __init__(self):
+        self.latency = Histogram()
+        self.bytes = 0
+        self.retries = 0
+        self.failures = 0
+        self.responses: Dict[int, int] = {}
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.latency.count,
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "failures": self.failures,
+            "responses": {str(status): count for status, count in sorted(self.responses.items())},
+            "latency": self.latency.snapshot()
+        }
+
+class CrawlMetrics:
+    """Runtime measurements of one crawl, safe to update from many threads
+    
+    Fetches are recorded per host; stages (parse, extract, export, ...)
+    accumulate wall time and call counts. Work done in worker processes
+    (--processes, --parse-processes) is not included.
+    """
+    
+    def __init__(self):
+        self.started = time.monotonic()
+        self._hosts: Dict[str, HostMetrics] = {}
+        self._stages: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+    
+    def _host(self, url: str) -> HostMetrics:
+        host = urlparse(url).netloc
+        metrics = self._hosts.get(host)
+        if metrics is None:
+            metrics = self._hosts[host] = HostMetrics()
+        return metrics
+    
+    def observe_fetch(self, url: str, seconds: float, status: int, size: int):
+        """Record a response: its latency, status code and body size"""
+        with self._lock:
+            host = self._host(url)
+            host.latency.observe(seconds)
+            host.bytes += size
+            host.responses[status] = host.responses.get(status, 0) + 1
+    
+    def record_failure(self, url: str):
+        """Record a request that got no response (connection error or timeout)"""
+        with self._lock:
+            self._host(url).failures += 1
+    
+    def record_retry(self, url: str):
+        with self._lock:
+            self._host(url).retries += 1
+    
+    def add_time(self, stage: str, seconds: float, calls: int = 1):
+        with self._lock:
+            totals = self._stages.get(stage)
+            if totals is None:
+                totals = self._stages[stage] = [0.0, 0]
+            totals[0] += seconds
+            totals[1] += calls
+    
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as part of stage name"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "uptime": round(time.monotonic() - self.started, 3),
+                "hosts": {host: metrics.snapshot() for host, metrics in self._hosts.items()},
+                "stages": {name: {"seconds": round(seconds, 6), "calls": calls}
+                           for name, (seconds, calls) in self._stages.items()}
+            }
+
+def _label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{_label(value)}"' for name, value in labels.items()) + '}'
+
+def render_prometheus(snapshot: Dict[str, Any]) -> str:
+    """Render a metrics snapshot (see WooCommerceScraper.runtime_metrics) in Prometheus text format"""
+    lines = []
+    
+    def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, Any]]):
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+        for suffix, value in samples:
+            lines.append(f"{METRIC_PREFIX}_{name}{suffix} {value}")
+    
+    hosts = snapshot.get('hosts', {})
+    metric('uptime_seconds', 'gauge', 'Seconds since the crawl started', [('', snapshot.get('uptime', 0))])
+    metric('products_total', 'counter', 'Products extracted', [('', snapshot.get('products', 0))])
+    
+    samples = []
+    for host, values in hosts.items():
+        latency = values.get('latency')
+        if not latency:
+            continue
+        for bound, count in latency['buckets'].items():
+            samples.append((f"_bucket{_labels(host=host, le=bound)}", count))
+        samples.append((f"_sum{_labels(host=host)}", latency['sum']))
+        samples.append((f"_count{_labels(host=host)}", latency['count']))
+    metric('fetch_seconds', 'histogram', 'Latency of HTTP fetches', samples)
+    
+    metric('responses_total', 'counter', 'HTTP responses by status code',
+           [(_labels(host=host, status=status), count)
+            for host, values in hosts.items() for status, count in values.get('responses', {}).items()])
+    for key, name, help_text in (('bytes', 'downloaded_bytes_total', 'Response body bytes downloaded'),
+                                 ('retries', 'retries_total', 'Requests retried after a failed attempt'),
+                                 ('failures', 'failures_total', 'Requests that got no response'),
+                                 ('time_waited', 'rate_limit_wait_seconds_total',
+                                  'Seconds requests waited for the rate limiter, summed over concurrent requests'),
+                                 ('time_throttled', 'rate_limited_seconds_total',
+                                  'Wall-clock seconds during which requests waited for the rate limiter')):
+        metric(name, 'counter', help_text, [(_labels(host=host), values.get(key, 0)) for host, values in hosts.items()])
+    
+    stages = snapshot.get('stages', {})
+    metric('stage_seconds_total', 'counter', 'Seconds spent per crawl stage',
+           [(_labels(stage=name), values['seconds']) for name, values in stages.items()])
+    metric('stage_calls_total', 'counter', 'Calls per crawl stage',
+           [(_labels(stage=name), values['calls']) for name, values in stages.items()])
+    
+    field_seconds, tries, hits = [], [], []
+    for plan, fields in snapshot.get('selectors', {}).items():
+        for field, values in fields.items():
+            field_seconds.append((_labels(plan=plan, field=field), values['seconds']))
+            for selector in values['selectors']:
+                labels = _labels(plan=plan, field=field, selector=selector['selector'])
+                tries.append((labels, selector['tries']))
+                hits.append((labels, selector['hits']))
+    metric('field_seconds_total', 'counter', 'Seconds spent in each field\'s selector cascade', field_seconds)
+    metric('selector_tries_total', 'counter', 'Times each CSS selector was evaluated', tries)
+    metric('selector_hits_total', 'counter', 'Times each CSS selector produced the field value', hits)
+    return '\n'.join(lines) + '\n'
+
+class MetricsReporter:
+    """Logs a metrics snapshot as one JSON line every interval seconds until stopped
+    
+    Selector counters are left out of the log lines to keep them short;
+    they are available from the snapshot and the metrics endpoint.
+    """
+    
+    def __init__(self, snapshot: Callable[[], Dict[str, Any]], interval: float):
+        self.snapshot = snapshot
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-reporter', daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.report()
+    
+    def report(self):
+        try:
+            values = {key: value for key, value in self.snapshot().items() if key != 'selectors'}
+            logger.info(f"metrics {json.dumps(values, separators=(',', ':'))}")
+        except Exception as e:
+            logger.warning(f"Cannot report metrics: {e}")
+    
+    def stop(self):
+        """Stop reporting, logging one last line with the final values"""
+        self._stopped.set()
+        self._thread.join()
+        self.report()
+
+class MetricsServer:
+    """Serves /metrics (Prometheus text) and /metrics.json on a background thread"""
+    
+    def __init__(self, snapshot: Callable[[], Dict[str, Any]], port: int, host: str = '127.0.0.1'):
+        self.httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.snapshot = snapshot
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/metrics"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics at {self.url}")
+    
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/metrics':
+            body = render_prometheus(self.server.snapshot()).encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif path == '/metrics.json':
+            body = json.dumps(self.server.snapshot()).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the crawl log
+        pass
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Parallel page parsing
+A process pool that parses fetched HTML and extracts products while the crawl keeps downloading
+"""
+
+import logging
+import multiprocessing
+import queue
+import re
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin
+
+from scraper import WooCommerceScraper, Product
+
+logger = logging.getLogger(__name__)
+
+FIELD_NAMES = [field.name for field in fields(Product)]
+
+_HEAD_END = re.compile(r'</head\s*>', re.I)
+_LINK_TAG = re.compile(r'<link\b[^>]*>', re.I)
+_ANCHOR_TAG = re.compile(r'<a\b[^>]*>', re.I)
+_REL_NEXT = re.compile(r'\brel\s*=\s*["\']?next\b', re.I)
+_CLASS_ATTR = re.compile(r'\bclass\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.I)
+_HREF_ATTR = re.compile(r'\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.I)
+
+# Parse-only scraper of each pool process, built by _init_worker
+_worker: Optional[WooCommerceScraper] = None
+
+def _attribute(pattern: re.Pattern, tag: str) -> Optional[str]:
+    match = pattern.search(tag)
+    if not match:
+        return None
+    return next((group for group in match.groups() if group is not None), None)
+
+def quick_next_page_url(page_content: str, base_url: str) -> Optional[str]:
+    """Next listing page link found with regular expressions, without parsing the page
+    
+    Looks for <link rel="next"> in the head, then for the first link whose
+    class includes "next" (WooCommerce's "next page-numbers"). This is only
+    a guess that lets the next download start early; the parsed page has
+    the final say.
+    """
+    head_end = _HEAD_END.search(page_content)
+    if head_end:
+        for tag in _LINK_TAG.findall(page_content, 0, head_end.start()):
+            href = _attribute(_HREF_ATTR, tag)
+            if href and _REL_NEXT.search(tag):
+                return urljoin(base_url, href)
+                
+    for tag in _ANCHOR_TAG.findall(page_content):
+        classes = _attribute(_CLASS_ATTR, tag)
+        if not classes or 'next' not in classes.split():
+            continue
+        href = _attribute(_HREF_ATTR, tag)
+        if href and not href.startswith(('#', 'javascript:')):
+            return urljoin(base_url, href)
+    return None
+
+def _init_worker(options: Dict[str, Any]):
+    global _worker
+    _worker = WooCommerceScraper(
+        options['base_url'],
+        use_proxy=False,
+        max_workers=1,
+        parser=options['parser'],
+        restrict_parse=options['restrict_parse'],
+        extraction_engine=options['extraction_engine'],
+        parse_processes=0
+    )
+    _worker.structured_data = options['structured_data']
+
+def _parse_listing(page_content: str) -> Tuple[List[tuple], Optional[str]]:
+    """Products of a listing page as plain field tuples, and its next page URL"""
+    soup = _worker._parse_listing_html(page_content)
+    products = _worker._extract_listing_products(soup)
+    rows = [tuple(getattr(product, name) for name in FIELD_NAMES) for product in products]
+    return rows, _worker._find_next_page_url(soup)
+
+def _parse_details(page_content: str, listing_fields: bool) -> Optional[Dict[str, str]]:
+    return _worker._parse_product_details(page_content, listing_fields=listing_fields)
+
+class ParsePool:
+    """Worker processes running the scraper's selector extraction on fetched HTML
+    
+    BeautifulSoup parsing holds the GIL, so with threads alone a crawl keeps
+    one core busy however many pages are downloaded at once. Each pool
+    process builds a parse-only scraper with the same parser, regions,
+    extraction engine and selectors (from config.json); pages go in as
+    text and come back as field tuples and detail dicts, which are cheap
+    to pickle. Selector learning happens per process.
+    """
+    
+    def __init__(self, scraper: WooCommerceScraper, processes: int):
+        self.base_url = scraper.base_url
+        options = {
+            'base_url': scraper.base_url,
+            'parser': scraper.parser,
+            'restrict_parse': scraper.restrict_parse,
+            'extraction_engine': scraper.extraction_engine,
+            'structured_data': scraper.structured_data
+        }
+        # Spawned rather than forked: the crawl already runs fetch threads
+        self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker, initargs=(options,))
+        logger.info(f"Parsing pages in {processes} worker processes")
+        
+    def submit_listing(self, page_content: str) -> Future:
+        """Start parsing a listing page; the future resolves to (rows, next page URL)"""
+        return self.executor.submit(_parse_listing, page_content)
+        
+    def parse_details(self, page_content: str, listing_fields: bool = False) -> Optional[Dict[str, str]]:
+        """Parse a product page in the pool, blocking the calling thread until it is done"""
+        return self.executor.submit(_parse_details, page_content, listing_fields).result()
+        
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+@dataclass
+class ListingPage:
+    """A fetched listing page whose parse is running in the pool"""
+    num: int
+    url: str
+    parsed: Future
+    next_url: Optional[str]
+    
+    def products(self) -> Tuple[List[Product], Optional[str]]:
+        """Wait for the parse; returns the page's products and the next page URL it links to"""
+        rows, next_url = self.parsed.result()
+        return [Product(*row) for row in rows], next_url
+
+def _no_products(page: Optional[ListingPage]) -> bool:
+    """Wait for the parse of page; True if it found no products"""
+    return page is not None and not page.parsed.result()[0]
+
+class ListingFetcher:
+    """Downloads listing pages ahead of the consumer on a background thread
+    
+    Each page is handed to the parse pool as soon as it arrives, and the
+    next download starts straight away from quick_next_page_url(); only
+    pages without a recognisable next link wait for their parse. Guesses
+    run at most one page ahead of the parses, though: a page is downloaded
+    only once the page two before it parsed with products, so pagination
+    that ends (or stops yielding products) costs at most one extra request.
+    At most queue_size parsed or parsing pages wait for the consumer,
+    which gives backpressure: a slow consumer (e.g. fetching product
+    pages) pauses the listing downloads instead of letting pages pile up
+    in memory.
+    """
+    
+    def __init__(self, scraper: WooCommerceScraper, pool: ParsePool, url: str, page_num: int, max_pages: int,
+                 visited: Set[str], queue_size: int):
+        self.scraper = scraper
+        self.pool = pool
+        self.max_pages = max_pages
+        self.visited = visited
+        self._pages: "queue.Queue[Optional[ListingPage]]" = queue.Queue(maxsize=max(1, queue_size))
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(url, page_num), daemon=True)
+        self._thread.start()
+        
+    def _put(self, page: Optional[ListingPage]) -> bool:
+        while not self._stopping.is_set():
+            try:
+                self._pages.put(page, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+        
+    def _run(self, url: Optional[str], page_num: int):
+        previous: Optional[ListingPage] = None
+        try:
+            while url and page_num <= self.max_pages and not self._stopping.is_set():
+                page_content = self.scraper._get_page_content(url)
+                if not page_content:
+                    break
+                self.visited.add(url)
+                parsed = self.pool.submit_listing(page_content)
+                next_url = quick_next_page_url(page_content, self.pool.base_url)
+                del page_content
+                if next_url is None:
+                    next_url = parsed.result()[1]
+                if next_url in self.visited:
+                    next_url = None
+                page = ListingPage(page_num, url, parsed, next_url)
+                if not self._put(page):
+                    return
+                # The consumer stops at the first page without products
+                if _no_products(previous) or (parsed.done() and _no_products(page)):
+                    break
+                previous = page
+                url = next_url
+                page_num += 1
+        except Exception as e:
+            logger.error(f"Listing downloads stopped at {url}: {e}")
+        finally:
+            self._put(None)
+            
+    def next_page(self) -> Optional[ListingPage]:
+        """The next listing page in order; None once pagination has ended"""
+        return self._pages.get()
+        
+    def stop(self):
+        """Stop downloading and wait for the thread to finish its current request"""
+        self._stopping.set()
+        self._thread.join()
+        while not self._pages.empty():
+            page = self._pages.get_nowait()
+            if page is not None:
+                page.parsed.cancel()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Columnar product storage
+Holds large numbers of products as per-field columns instead of one object per product
+"""
+
+from array import array
+from dataclasses import fields
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from scraper import Product
+
+FIELD_NAMES = [field.name for field in fields(Product)]
+
+# Columns stored as codes into a table of their distinct values
+CATEGORICAL_FIELDS = ('price', 'stock_status', 'category')
+
+class CategoricalColumn:
+    """Strings stored once each, with a 32-bit code per row; code 0 means None"""
+    
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.codes = array('I')
+        self._code_of: Dict[str, int] = {}
+        
+    def append(self, value: Optional[str]):
+        if value is None:
+            self.codes.append(0)
+            return
+        code = self._code_of.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._code_of[value] = code
+        self.codes.append(code)
+        
+    def __getitem__(self, index: int) -> Optional[str]:
+        return self.values[self.codes[index]]
+        
+    def __iter__(self) -> Iterator[Optional[str]]:
+        values = self.values
+        return (values[code] for code in self.codes)
+
+class TextColumn:
+    """Strings stored back to back as UTF-8 in one buffer, with the end offset of each row
+    
+    This saves the object header and pointer every separate str carries.
+    None is kept as a row in the missing set.
+    """
+    
+    def __init__(self):
+        self.data = bytearray()
+        self.ends = array('Q')
+        self.missing = set()
+        
+    def append(self, value: Optional[str]):
+        if value is None:
+            self.missing.add(len(self.ends))
+        else:
+            self.data += value.encode('utf-8')
+        self.ends.append(len(self.data))
+        
+    def __getitem__(self, index: int) -> Optional[str]:
+        if index in self.missing:
+            return None
+        start = self.ends[index - 1] if index else 0
+        return self.data[start:self.ends[index]].decode('utf-8')
+        
+    def __iter__(self) -> Iterator[Optional[str]]:
+        return (self[index] for index in range(len(self.ends)))
+
+class FingerprintColumn:
+    """SHA-1 hex digests packed as 20 raw bytes per row
+    
+    Values that are not 40-character hex digests, including None, are kept
+    aside in a dict keyed by row.
+    """
+    
+    WIDTH = 20
+    
+    def __init__(self):
+        self.data = bytearray()
+        self.other: Dict[int, Optional[str]] = {}
+        self._length = 0
+        
+    def append(self, value: Optional[str]):
+        packed = None
+        if value and len(value) == 2 * self.WIDTH:
+            try:
+                packed = bytes.fromhex(value)
+            except ValueError:
+                pass
+        if packed is None:
+            self.other[self._length] = value
+            packed = bytes(self.WIDTH)
+        self.data += packed
+        self._length += 1
+        
+    def __getitem__(self, index: int) -> Optional[str]:
+        if index in self.other:
+            return self.other[index]
+        return self.data[index * self.WIDTH:(index + 1) * self.WIDTH].hex()
+        
+    def __iter__(self) -> Iterator[Optional[str]]:
+        return (self[index] for index in range(self._length))
+
+class ProductBatch:
+    """A list-like, column-backed collection of products
+    
+    Indexing and iteration build Product objects on demand, so asdict(),
+    the export methods, sinks and ProductTally accept a batch wherever they
+    take a list of products. Prices, stock statuses and categories are
+    stored once per distinct value, fingerprints as raw digests and the
+    remaining text as UTF-8 buffers; rows() yields plain dicts without
+    creating Product objects at all.
+    """
+    
+    def __init__(self, products: Iterable[Product] = ()):
+        self._columns: Dict[str, Any] = {}
+        for name in FIELD_NAMES:
+            if name in CATEGORICAL_FIELDS:
+                self._columns[name] = CategoricalColumn()
+            elif name == 'fingerprint':
+                self._columns[name] = FingerprintColumn()
+            else:
+                self._columns[name] = TextColumn()
+        self._length = 0
+        self.extend(products)
+        
+    def append(self, product: Product):
+        for name, column in self._columns.items():
+            column.append(getattr(product, name))
+        self._length += 1
+        
+    def extend(self, products: Iterable[Product]):
+        for product in products:
+            self.append(product)
+            
+    def __len__(self) -> int:
+        return self._length
+        
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ProductBatch(self[i] for i in range(*index.indices(self._length)))
+        row = range(self._length)[index]
+        return Product(**{name: column[row] for name, column in self._columns.items()})
+        
+    def __iter__(self) -> Iterator[Product]:
+        for values in zip(*self._columns.values()):
+            yield Product(*values)
+            
+    def column(self, name: str) -> List[Any]:
+        """All values of one field, in row order"""
+        return list(self._columns[name])
+        
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """Each product as the dict asdict() would return"""
+        names = list(self._columns)
+        for values in zip(*self._columns.values()):
+            yield dict(zip(names, values))
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Crawl profiling
+Sampling or deterministic profiles of a crawl, written as collapsed stacks for flame graphs or as pstats,
+with a summary attributing time to fetching, parsing, extraction and export and ranking the selectors
+"""
+
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+import sinks
+from rate_limiter import RateController
+from scraper import WooCommerceScraper
+from selector_plan import FieldPlan
+from structured_data import structured_details
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('sample', 'deterministic')
+# Rows of the selector ranking in the summary
+TOP_SELECTORS = 15
+
+# (filename, first line, function name): identifies a function in stack samples and in pstats keys alike
+CodeKey = Tuple[str, int, str]
+
+def _key(function) -> CodeKey:
+    code = function.__code__
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+def summary_targets() -> Dict[CodeKey, str]:
+    """The functions the summary reports on, mapped to the label of their row"""
+    targets = {
+        _key(BeautifulSoup.__init__): 'BeautifulSoup parsing',
+        _key(structured_details): 'structured_details',
+        _key(RateController.acquire): 'rate limiter wait',
+        _key(RateController.acquire_async): 'rate limiter wait',
+        _key(FieldPlan.match): 'selector cascades',
+        _key(FieldPlan.choose): 'selector cascades'
+    }
+    for name, function in vars(WooCommerceScraper).items():
+        if name in ('_get_page_content', '_request') or name.startswith(('_extract_', 'export_to_')):
+            targets[_key(function)] = name
+    try:
+        from async_scraper import AsyncWooCommerceScraper
+        targets[_key(AsyncWooCommerceScraper._get_page_content_async)] = '_get_page_content'
+    except ImportError:
+        pass
+    # Streamed exports, by sink class
+    for value in vars(sinks).values():
+        if isinstance(value, type) and issubclass(value, sinks.ProductSink):
+            for function in vars(value).values():
+                if callable(function) and hasattr(function, '__code__'):
+                    targets[_key(function)] = value.__name__
+    return targets
+
+def selector_ranking(scraper: WooCommerceScraper, limit: int = TOP_SELECTORS) -> List[Dict[str, Any]]:
+    """Selectors that were tried most often without producing a value
+    
+    Each miss is a CSS query spent on nothing; a fallback selector with
+    many misses and no hits on a shop is a candidate for removal from its
+    list in config.json.
+    """
+    rows = []
+    for plan_name, plan in (('selectors', scraper.selector_plan), ('detail_selectors', scraper.detail_plan)):
+        for field, values in plan.stats().items():
+            for selector in values['selectors']:
+                if not selector['tries']:
+                    continue
+                rows.append({
+                    'plan': plan_name,
+                    'field': field,
+                    'selector': selector['selector'],
+                    'tries': selector['tries'],
+                    'hits': selector['hits'],
+                    'misses': selector['tries'] - selector['hits'],
+                    'hit_rate': round(selector['hits'] / selector['tries'], 3)
+                })
+    rows.sort(key=lambda row: (-row['misses'], -row['tries']))
+    return rows[:limit]
+
+def _frame_name(code) -> str:
+    name = getattr(code, 'co_qualname', code.co_name)
+    # Semicolons separate frames in the collapsed format
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+class CrawlProfiler:
+    """Profiles everything the process does between start() and stop()
+    
+    In sample mode a background thread records the stack of every thread
+    each interval seconds. That is cheap enough for real crawls, covers
+    the fetch pool threads and counts time spent waiting on the network
+    or the rate limiter. It writes <output>.folded, one collapsed stack per
+    line for flamegraph.pl, speedscope or inferno. In deterministic mode
+    cProfile traces every call of the threads started after start() and
+    of the calling thread, at a much higher overhead, and writes
+    <output>.prof for pstats, snakeviz or flameprof.
+    
+    Either way write() adds <output>_summary.json: the inclusive time of
+    the functions listed by summary_targets() and the selector ranking.
+    Inclusive time adds up over threads; sample mode also reports the
+    share of wall time during which any thread was in each function.
+    Coroutines waiting on the network are not on any stack, so with the
+    async engine only time on the CPU is attributed.
+    """
+    
+    def __init__(self, output: str = 'profile', mode: str = 'sample', interval: float = 0.005):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}'")
+        self.output = output
+        self.mode = mode
+        self.interval = max(0.001, interval)
+        self.samples = 0
+        self.elapsed = 0.0
+        self._started = 0.0
+        self._stacks: Counter = Counter()
+        # Samples in which any thread was in a summary function, by label
+        self._wall: Counter = Counter()
+        self._targets: Dict[CodeKey, str] = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._profiles: List[cProfile.Profile] = []
+        self._profiles_lock = threading.Lock()
+    
+    def __enter__(self) -> "CrawlProfiler":
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+    
+    def start(self):
+        self._started = time.perf_counter()
+        if self.mode == 'sample':
+            self._targets = summary_targets()
+            self._thread = threading.Thread(target=self._sample, name='profiler', daemon=True)
+            self._thread.start()
+        else:
+            threading.setprofile(self._profile_thread)
+            self._profile_thread()
+        logger.info(f"Profiling the crawl ({self.mode} mode)")
+    
+    def stop(self):
+        if self._started and not self.elapsed:
+            self.elapsed = time.perf_counter() - self._started
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+        elif self.mode == 'deterministic':
+            threading.setprofile(None)
+            # Threads still running keep their profilers; their stats are read as they stand
+            with self._profiles_lock:
+                if self._profiles:
+                    self._profiles[0].disable()
+    
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            # Workers of one pool share a root in the flame graph
+            names = {thread.ident: re.sub(r'_\d+$', '', thread.name) for thread in threading.enumerate()}
+            labels = set()
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                codes = []
+                while frame is not None:
+                    code = frame.f_code
+                    codes.append(code)
+                    labels.add(self._targets.get((code.co_filename, code.co_firstlineno, code.co_name)))
+                    frame = frame.f_back
+                codes.reverse()
+                self._stacks[(names.get(ident, str(ident)), tuple(codes))] += 1
+            labels.discard(None)
+            self._wall.update(labels)
+            self.samples += 1
+    
+    def _profile_thread(self, *args):
+        """Enable a cProfile profiler in the calling thread; installed by threading.setprofile for new threads"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active cProfile per process; later threads go unprofiled
+            sys.setprofile(None)
+            return
+        with self._profiles_lock:
+            self._profiles.append(profile)
+    
+    def _sample_seconds(self) -> float:
+        """Wall time one sample stands for"""
+        return self.elapsed / self.samples if self.samples else self.interval
+    
+    def _write_folded(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for (thread, codes), count in self._stacks.most_common():
+                frames = [thread.replace(';', ':')] + [_frame_name(code) for code in codes]
+                f.write(f"{';'.join(frames)} {count}\n")
+    
+    def _sampled_times(self, targets: Dict[CodeKey, str]) -> Dict[str, float]:
+        """Inclusive seconds per label: each sample counts once per label on its stack"""
+        per_sample = self._sample_seconds()
+        times: Counter = Counter()
+        for (_, codes), count in self._stacks.items():
+            labels = {targets.get((code.co_filename, code.co_firstlineno, code.co_name)) for code in codes}
+            labels.discard(None)
+            for label in labels:
+                times[label] += count * per_sample
+        return times
+    
+    def _profiled_times(self, stats: pstats.Stats, targets: Dict[CodeKey, str]) -> Dict[str, float]:
+        """Cumulative seconds per label; a label covering several functions (sync and async) adds them"""
+        times: Counter = Counter()
+        for key, (_, _, _, cumulative, _) in stats.stats.items():
+            label = targets.get(key)
+            if label:
+                times[label] += cumulative
+        return times
+    
+    def write(self, scraper: Optional[WooCommerceScraper] = None) -> Dict[str, Any]:
+        """Write the profile and its summary next to output; returns the summary"""
+        self.stop()
+        directory = os.path.dirname(self.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        targets = summary_targets()
+        
+        if self.mode == 'sample':
+            profile_path = f"{self.output}.folded"
+            self._write_folded(profile_path)
+            times = self._sampled_times(targets)
+        else:
+            profile_path = f"{self.output}.prof"
+            with self._profiles_lock:
+                profiles = list(self._profiles)
+            stats = pstats.Stats(*profiles)
+            stats.dump_stats(profile_path)
+            times = self._profiled_times(stats, targets)
+        
+        summary = {
+            'mode': self.mode,
+            'elapsed': round(self.elapsed, 3),
+            'profile': profile_path,
+            'functions': [
+                {'name': name, 'seconds': round(seconds, 3),
+                 'percent': round(100 * seconds / self.elapsed, 1) if self.elapsed else None}
+                for name, seconds in sorted(times.items(), key=lambda item: -item[1])
+            ]
+        }
+        if self.mode == 'sample':
+            summary['samples'] = self.samples
+            for row in summary['functions']:
+                row['wall_percent'] = round(100 * self._wall[row['name']] / self.samples, 1) if self.samples else None
+        if scraper is not None:
+            summary['selectors'] = selector_ranking(scraper)
+        
+        with open(f"{self.output}_summary.json", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        logger.info(f"Profile written to {profile_path} and {self.output}_summary.json")
+        return summary
+
+def format_summary(summary: Dict[str, Any]) -> List[str]:
+    """Human-readable lines of a profile summary"""
+    lines = [f"Inclusive time by function ({summary['mode']} profile, {summary['elapsed']:.1f}s wall; "
+             "summed over threads, so shares can add up to more than 100%):"]
+    if summary['mode'] == 'sample':
+        lines.append(f"  {'':<32} {'':>10} {'':>7}  wall (any thread in it)")
+    for row in summary['functions']:
+        share = f"{row['percent']:6.1f}%" if row['percent'] is not None else ''
+        wall = f"  {row['wall_percent']:6.1f}%" if row.get('wall_percent') is not None else ''
+        lines.append(f"  {row['name']:<32} {row['seconds']:9.3f}s {share}{wall}")
+    if summary.get('selectors'):
+        lines.append("Selectors tried most without matching (removal candidates):")
+        for row in summary['selectors']:
+            lines.append(f"  {row['plan']}.{row['field']:<20} {row['selector']:<48} "
+                         f"tries {row['tries']:>6}  hits {row['hits']:>6}  ({row['hit_rate']:.0%})")
+    return lines
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Adaptive per-host rate limiting
+Token buckets that space requests per host and adjust their rate to server health
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean the server wants us to slow down
+THROTTLE_STATUS_CODES = (429, 503)
+
+DEFAULT_RATE_LIMIT = {
+    "adaptive": True,
+    "min_rate": 0.2,
+    "max_rate": 10.0,
+    "increase": 0.1,
+    "decrease": 0.5,
+    "latency_target": 2.0,
+    "max_error_rate": 0.1,
+    "burst": 1,
+    "max_retry_after": 300
+}
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+class TokenBucket:
+    """Token bucket for a single host with additive-increase/multiplicative-decrease rate control"""
+    
+    def __init__(self, rate: float, settings: Dict[str, Any]):
+        self.settings = settings
+        self.rate = min(max(rate, settings['min_rate']), settings['max_rate'])
+        self.burst = max(1, settings['burst'])
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        
+        # Recent outcomes (True = error) used to gate rate increases
+        self.outcomes = deque(maxlen=20)
+        self.latency = None
+        self.last_decrease = 0.0
+        
+        # Counters exposed through stats()
+        self.requests = 0
+        self.errors = 0
+        self.throttle_events = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        # Summed over requests, so concurrent waits count several times
+        self.time_waited = 0.0
+        # Wall-clock time during which at least one request was waiting
+        self.time_throttled = 0.0
+        self.queued_since = 0.0
+        
+    def reserve(self) -> float:
+        """Take a token and return how long the caller must wait before sending
+        
+        Tokens may go negative: each reservation queues behind the previous
+        ones, so concurrent callers end up evenly spaced at the current rate.
+        """
+        with self.lock:
+            now = time.monotonic()
+            # updated may lie in the future while a Retry-After block is active
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            self.requests += 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+            
+    def enter_queue(self, wait: float):
+        with self.lock:
+            if not self.queue_depth:
+                self.queued_since = time.monotonic()
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            self.time_waited += wait
+            
+    def leave_queue(self):
+        with self.lock:
+            self.queue_depth -= 1
+            if not self.queue_depth:
+                self.time_throttled += time.monotonic() - self.queued_since
+            
+    def record_response(self, status_code: int, latency: float, retry_after: Optional[str] = None):
+        """Adapt the rate to a response's status code and latency"""
+        with self.lock:
+            if status_code in THROTTLE_STATUS_CODES:
+                self.throttle_events += 1
+                self.outcomes.append(True)
+                self._decrease()
+                delay = parse_retry_after(retry_after)
+                if delay is not None:
+                    self._block(min(delay, self.settings['max_retry_after']))
+                return
+                
+            error = status_code >= 500
+            self.outcomes.append(error)
+            if error:
+                self.errors += 1
+                self._decrease()
+                return
+                
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            if not self.settings['adaptive']:
+                return
+            if self.latency > 2 * self.settings['latency_target']:
+                self.rate = max(self.settings['min_rate'], self.rate * 0.9)
+            elif self.latency <= self.settings['latency_target'] and self._error_rate() <= self.settings['max_error_rate']:
+                self.rate = min(self.settings['max_rate'], self.rate + self.settings['increase'])
+                
+    def record_error(self):
+        """Back off after a connection error or timeout"""
+        with self.lock:
+            self.errors += 1
+            self.outcomes.append(True)
+            self._decrease()
+            
+    def _error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+        
+    def _decrease(self):
+        now = time.monotonic()
+        # Failures of requests already in flight belong to the same congestion event
+        if self.settings['adaptive'] and now - self.last_decrease >= 1.0 / self.rate:
+            self.rate = max(self.settings['min_rate'], self.rate * self.settings['decrease'])
+            self.last_decrease = now
+        # Drop saved-up tokens so the next request waits at the new rate
+        self.tokens = min(self.tokens, 0.0)
+        
+    def _block(self, seconds: float):
+        """Hold all requests to this host for the given number of seconds"""
+        now = time.monotonic()
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = max(self.updated, now + seconds)
+        
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            time_throttled = self.time_throttled
+            if self.queue_depth:
+                time_throttled += time.monotonic() - self.queued_since
+            return {
+                "rate": round(self.rate, 3),
+                "requests": self.requests,
+                "errors": self.errors,
+                "throttle_events": self.throttle_events,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "time_waited": round(self.time_waited, 3),
+                "time_throttled": round(time_throttled, 3),
+                "latency": round(self.latency, 3) if self.latency is not None else None
+            }
+
+class RateController:
+    """Per-host token buckets shared by all workers of a scraper"""
+    
+    def __init__(self, delay: float = 1.0, settings: Optional[Dict[str, Any]] = None):
+        self.settings = dict(DEFAULT_RATE_LIMIT)
+        self.settings.update(settings or {})
+        self.initial_rate = 1.0 / delay if delay > 0 else self.settings['max_rate']
+        if self.initial_rate > self.settings['max_rate']:
+            # An explicit delay asks for this rate; the cap would otherwise silently override it
+            logger.info(f"Raising rate_limit.max_rate from {self.settings['max_rate']:g} to "
+                        f"{self.initial_rate:g} req/s to honour a {delay:g}s delay")
+            self.settings['max_rate'] = self.initial_rate
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        
+    def bucket(self, url: str) -> TokenBucket:
+        """Get the token bucket for the host of url"""
+        host = urlparse(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.initial_rate, self.settings)
+                self._buckets[host] = bucket
+            return bucket
+            
+    def acquire(self, url: str) -> float:
+        """Block until a request to url may be sent; returns the time waited"""
+        bucket = self.bucket(url)
+        wait = bucket.reserve()
+        if wait > 0:
+            bucket.enter_queue(wait)
+            try:
+                time.sleep(wait)
+            finally:
+                bucket.leave_queue()
+        return wait
+        
+    async def acquire_async(self, url: str) -> float:
+        """Asyncio counterpart of acquire()"""
+        bucket = self.bucket(url)
+        wait = bucket.reserve()
+        if wait > 0:
+            bucket.enter_queue(wait)
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                bucket.leave_queue()
+        return wait
+        
+    def record_response(self, url: str, status_code: int, latency: float, retry_after: Optional[str] = None):
+        self.bucket(url).record_response(status_code, latency, retry_after)
+        
+    def record_error(self, url: str):
+        self.bucket(url).record_error()
+        
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-host rate, queue depth and throttle statistics"""
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {host: bucket.stats() for host, bucket in buckets.items()}
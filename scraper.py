@@ -5,17 +5,37 @@ Improved version with better error handling, configuration, and export options
 """
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
 import json
 import csv
+import gzip
+import hashlib
+import os
 import random
 import time
 import logging
 from urllib.parse import urljoin, urlparse
 from dataclasses import dataclass, asdict
-from typing import List, Optional, Dict, Any
+from contextlib import contextmanager
+from typing import List, Optional, Dict, Any, Iterator, Iterable, Sequence, Set, Tuple
 import argparse
+import asyncio
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from http_cache import HttpCache
+from metrics import CrawlMetrics, MetricsReporter, MetricsServer
+from rate_limiter import RateController, THROTTLE_STATUS_CODES
+from selector_plan import SelectorPlan, DEFAULT_SELECTORS, DEFAULT_DETAIL_SELECTORS
+from single_pass import SinglePassExtractor, CARD_FIELDS
+from store_api import store_api_endpoints, product_fields, FILTERED_LISTING
+from sitemap import SitemapDiscovery
+from structured_data import structured_details
+from checkpoint import CrawlCheckpoint
+from sinks import JsonLinesSink, ParquetSink, SqliteSink, PARQUET_COMPRESSION, open_sink
+from warc import WarcWriter, WarcReplay
 
 # Configure logging
 logging.basicConfig(
@@ -28,7 +48,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Slotted dataclasses (Python 3.10+) have no per-instance __dict__
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+def intern_value(value: Optional[str]) -> Optional[str]:
+    """Share one copy of a string that repeats across products, like a stock status or category"""
+    return sys.intern(value) if type(value) is str else value
+
+@dataclass(**_DATACLASS_SLOTS)
 class Product:
     """Product data structure"""
     title: str
@@ -39,47 +66,275 @@ class Product:
     sku: Optional[str] = None
     stock_status: Optional[str] = None
     category: Optional[str] = None
+    fingerprint: Optional[str] = None
+    
+    def __post_init__(self):
+        self.stock_status = intern_value(self.stock_status)
+        self.category = intern_value(self.category)
+    
+class ProductTally:
+    """Running count of products and of the optional fields they carry"""
+    
+    FIELDS = ('description', 'sku', 'stock_status', 'category')
+    
+    def __init__(self):
+        self.total = 0
+        self.with_price = 0
+        self.with_image = 0
+        self.with_field = dict.fromkeys(self.FIELDS, 0)
+        
+    @classmethod
+    def of(cls, products: List[Product]) -> "ProductTally":
+        tally = cls()
+        for product in products:
+            tally.add(product)
+        return tally
+        
+    def add(self, product: Product):
+        self.total += 1
+        if product.price != "N/A":
+            self.with_price += 1
+        if product.image_url != "N/A":
+            self.with_image += 1
+        for field in self.FIELDS:
+            if getattr(product, field):
+                self.with_field[field] += 1
+                
+def listing_fingerprint(title: str, price: str, image_url: str, stock_status: Optional[str]) -> str:
+    """Fingerprint of the listing card fields used to detect changed products"""
+    key = "\x1f".join([title or "", price or "", image_url or "", stock_status or ""])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
 
+def _element_text(elem) -> str:
+    return elem.get_text(strip=True)
+    
+def _element_href(elem) -> Optional[str]:
+    return elem.get('href') or None
+    
+def _parse_description(elem) -> Optional[str]:
+    text = elem.get_text(strip=True)
+    # Only return meaningful descriptions, limited in length
+    return text[:500] if text and len(text) > 10 else None
+    
+def _parse_sku_text(elem) -> Optional[str]:
+    sku_text = elem.get_text(strip=True)
+    return sku_text if sku_text and sku_text.lower() not in ['sku', 'sku:', 'n/a', ''] else None
+    
+def _parse_sku(elem) -> Optional[str]:
+    # Try text content first, then the data attribute
+    return _parse_sku_text(elem) or elem.get('data-sku') or None
+    
+def normalize_stock_text(stock_text: str) -> Optional[str]:
+    """Map stock text to In Stock / Out of Stock / On Backorder, or None if unknown"""
+    stock_text = stock_text.lower()
+    if any(word in stock_text for word in ['in stock', 'available', 'có sẵn']):
+        return 'In Stock'
+    elif any(word in stock_text for word in ['out of stock', 'sold out', 'hết hàng']):
+        return 'Out of Stock'
+    elif any(word in stock_text for word in ['backorder', 'pre-order', 'đặt trước']):
+        return 'On Backorder'
+    return None
+    
+def _parse_stock(elem) -> Optional[str]:
+    stock_text = elem.get_text(strip=True)
+    if not stock_text:
+        return None
+    return normalize_stock_text(stock_text) or stock_text.lower().title()
+    
+def _parse_known_stock(elem) -> Optional[str]:
+    return normalize_stock_text(elem.get_text(strip=True))
+    
+def _parse_category(elem) -> Optional[str]:
+    cat_text = elem.get_text(strip=True)
+    return cat_text if cat_text and cat_text.lower() not in ['category', 'categories', 'cat', ''] else None
+    
+def _parse_breadcrumb_category(elems) -> Optional[str]:
+    cat_text = elems[-1].get_text(strip=True)
+    return cat_text if cat_text and cat_text.lower() not in ['home', 'shop', 'trang chủ'] else None
+    
+# Class names of the page regions kept when restricted parsing is enabled
+DEFAULT_LISTING_REGIONS = [
+    'products',
+    'wc-block-grid__products',
+    'woocommerce-pagination',
+    'pagination',
+    'nav-links'
+]
+DEFAULT_DETAIL_REGIONS = [
+    'summary',
+    'entry-summary',
+    'woocommerce-product-gallery',
+    'product_meta',
+    'woocommerce-breadcrumb',
+    'breadcrumb',
+    'woocommerce-tabs',
+    'entry-content',
+    'stock',
+    # Block themes lay the product page out in separate blocks
+    'wp-block-woocommerce-product-meta',
+    'wc-block-components-product-sku',
+    'wc-block-components-product-stock-indicator',
+    'wp-block-woocommerce-product-stock-indicator',
+    'wp-block-post-excerpt',
+    'wp-block-woocommerce-breadcrumbs'
+]
+
+# Class-name stock indicators checked when no stock selector gives a status
+STOCK_CLASS_SELECTORS = ['.in-stock', '.out-of-stock']
+
+EXTRACTION_ENGINES = ('cascade', 'single_pass')
+
+def region_strainer(regions: List[str]) -> SoupStrainer:
+    """SoupStrainer keeping elements that carry any of the given class names"""
+    wanted = set(regions)
+    # Attribute values arrive unsplit while the document is being parsed
+    return SoupStrainer(class_=lambda value: bool(value) and not wanted.isdisjoint(value.split()))
+    
+def resolve_parser(name: Optional[str]) -> str:
+    """Return the BeautifulSoup parser to use, falling back to html.parser if name is not installed"""
+    if not name:
+        return 'html.parser'
+    if builder_registry.lookup(name) is None:
+        logger.warning(f"HTML parser '{name}' is not available, falling back to html.parser")
+        return 'html.parser'
+    return name
+    
+def load_config(path: str = 'config.json') -> Dict[str, Any]:
+    """Read the JSON configuration file; {} if it is missing or invalid"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        logger.warning(f"Invalid {path}: {e}")
+        return {}
+        
+def create_session(config: Dict[str, Any], pool_maxsize: int = 10, pool_connections: int = 10) -> requests.Session:
+    """requests session with the configured headers and a connection pool sized for the workers
+    
+    pool_connections is the number of hosts whose connections are kept.
+    """
+    session = requests.Session()
+    # Size the connection pool so parallel workers can reuse connections
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    
+    # Setup headers
+    headers = config.get('headers', {})
+    if not headers:
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.5",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+            "Upgrade-Insecure-Requests": "1"
+        }
+    session.headers.update(headers)
+    return session
+    
 class WooCommerceScraper:
     """Enhanced WooCommerce product scraper"""
     
-    def __init__(self, base_url: str, use_proxy: bool = True, delay: float = 1.0):
+    def __init__(self, base_url: str, use_proxy: bool = True, delay: float = 1.0,
+                 max_workers: Optional[int] = None, per_host_limit: Optional[int] = None,
+                 cache_dir: Optional[str] = None, parser: Optional[str] = None,
+                 restrict_parse: Optional[bool] = None, extraction_engine: Optional[str] = None,
+                 parse_processes: Optional[int] = None, config: Optional[Dict[str, Any]] = None,
+                 session: Optional[requests.Session] = None):
         self.base_url = base_url.rstrip('/')
         self.use_proxy = use_proxy
         self.delay = delay
-        self.session = requests.Session()
-        self.products: List[Product] = []
-        
-        # Load configuration if exists
-        self.config = self._load_config()
-        
-        # Setup headers
-        headers = self.config.get('headers', {})
-        if not headers:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                "Accept-Language": "en-US,en;q=0.5",
-                "Accept-Encoding": "gzip, deflate",
-                "Connection": "keep-alive",
-                "Upgrade-Insecure-Requests": "1"
-            }
-        self.session.headers.update(headers)
-        
-        # Setup proxy if enabled
-        if self.use_proxy:
-            self._setup_proxy()
+        # Products of a finished crawl, kept column by column in a ProductBatch; reading one builds a new
+        # Product, so changes to it are not stored back
+        self.products: Sequence[Product] = []
+        # Counts for streamed crawls, which do not keep self.products
+        self.tally = ProductTally()
+        
+        # Load configuration if exists; a batch passes the configuration it read once
+        self.config = config if config is not None else self._load_config()
+        
+        # Concurrency settings for detail page fetching
+        settings = self.config.get('default_settings', {})
+        self.max_workers = max(1, max_workers or settings.get('max_workers', 4))
+        self.per_host_limit = max(1, per_host_limit or settings.get('per_host_limit', 2))
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_semaphores_lock = threading.Lock()
+        
+        # Selector cascades compiled once; winning selectors get promoted per site
+        learn_samples = self.config.get('selector_learning', {}).get('samples', 5)
+        self.selector_plan = SelectorPlan.from_config(DEFAULT_SELECTORS, self.config.get('selectors'), learn_samples)
+        self.detail_plan = SelectorPlan.from_config(DEFAULT_DETAIL_SELECTORS, self.config.get('detail_selectors'),
+                                                    learn_samples)
+        
+        # Product cards are read either one selector cascade at a time or in a single pass
+        self.extraction_engine = extraction_engine or self.config.get('extraction_engine', 'cascade')
+        if self.extraction_engine not in EXTRACTION_ENGINES:
+            logger.warning(f"Unknown extraction engine '{self.extraction_engine}', using cascade")
+            self.extraction_engine = 'cascade'
+        self.single_pass: Optional[SinglePassExtractor] = None
+        if self.extraction_engine == 'single_pass':
+            self.single_pass = SinglePassExtractor(self.selector_plan, CARD_FIELDS, STOCK_CLASS_SELECTORS)
+            
+        # Product pages are read from JSON-LD/microdata first unless disabled
+        self.structured_data = self.config.get('structured_data', {}).get('enabled', True)
+        
+        # Parser backend and the regions kept when parsing is restricted
+        parsing = self.config.get('parsing', {})
+        self.parser = resolve_parser(parser or parsing.get('parser'))
+        self.restrict_parse = parsing.get('restrict', False) if restrict_parse is None else restrict_parse
+        self.listing_regions = parsing.get('listing_regions', DEFAULT_LISTING_REGIONS)
+        self.detail_regions = parsing.get('detail_regions', DEFAULT_DETAIL_REGIONS)
+        self._region_misses_logged = False
+        
+        # Worker processes for parsing (0 parses in this process) and listing pages allowed ahead of extraction
+        self.parse_processes = max(0, parsing.get('processes', 0) if parse_processes is None else parse_processes)
+        self.parse_queue_size = parsing.get('queue_size') or 2 * max(1, self.parse_processes)
+        self.parse_pool = None
+        
+        # Previous run's products, keyed by link, for incremental mode
+        self.previous_products: Dict[str, Product] = {}
+        self.previous_export: Optional[str] = None
+        self.previous_run_time: Optional[float] = None
+        self.details_reused = 0
+        
+        # Progress of paginated crawls, saved after every listing page when enabled
+        self.checkpoint: Optional[CrawlCheckpoint] = None
+        
+        # Request slots shared with other scrapers of a batch; replaces the per-host semaphores when set
+        self.scheduler = None
+        
+        # Per-host token buckets replace the fixed sleep between requests
+        self.rate_limiter = RateController(delay, self.config.get('rate_limit'))
+        
+        # Optional on-disk response cache; an explicit cache_dir enables it
+        cache_settings = self.config.get('cache', {})
+        self.cache: Optional[HttpCache] = None
+        if cache_dir is not None or cache_settings.get('enabled'):
+            self.cache = HttpCache.from_config(cache_settings, directory=cache_dir or None)
+            
+        # Raw responses archived to a WARC file, or served back from one instead of the network
+        self.archive: Optional[WarcWriter] = None
+        self.replay: Optional[WarcReplay] = None
+        
+        # Fetch latencies, bytes, retries and time per stage, for runtime_metrics()
+        self.metrics = CrawlMetrics()
+            
+        # A shared session comes with its adapters, headers and proxies already set up
+        if session is not None:
+            self.session = session
+        else:
+            self.session = create_session(self.config, pool_maxsize=max(10, self.max_workers + 1))
+            
+            # Setup proxy if enabled
+            if self.use_proxy:
+                self._setup_proxy()
     
     def _load_config(self) -> Dict[str, Any]:
         """Load configuration from config.json if exists"""
-        try:
-            with open('config.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
-        except json.JSONDecodeError as e:
-            logger.warning(f"Invalid config.json: {e}")
-            return {}
+        return load_config()
             
     def _setup_proxy(self):
         """Setup proxy configuration"""
@@ -91,119 +346,143 @@ class WooCommerceScraper:
         self.session.proxies = proxy_config
         logger.info(f"Proxy configured with session ID: {session_id}")
         
+    def _request_slot(self, url: str):
+        """Context holding one of the concurrent request slots for the host of url"""
+        if self.scheduler is not None:
+            return self.scheduler.slot(url)
+        return self._host_semaphore(url)
+        
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        """Get the semaphore bounding concurrent requests to the host of url"""
+        host = urlparse(url).netloc
+        with self._host_semaphores_lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+            
     def _get_page_content(self, url: str, timeout: int = 30, max_retries: int = 3) -> Optional[str]:
-        """Get page content with error handling and retries"""
+        """Get page content with error handling and retries
+        
+        Requests are spaced by the per-host token bucket instead of a fixed
+        sleep; throttling responses and errors slow the bucket down, so
+        retries back off without a separate sleep. With a cache configured,
+        requests are conditional and 304 responses are served from disk.
+        """
+        cached = self.cache.get(url) if self.cache else None
+        if cached and self.cache.is_fresh(cached):
+            logger.info(f"Serving from cache: {url}")
+            self.cache.mark_hit(url, revalidated=False)
+            return cached.body
+        request_headers = self.cache.conditional_headers(cached) if cached else None
+        
+        response = self._request(url, timeout=timeout, max_retries=max_retries, headers=request_headers)
+        if response is None:
+            return None
+            
+        if cached and response.status_code == 304:
+            logger.info(f"Not modified, serving from cache: {url}")
+            self.cache.mark_hit(url, revalidated=True)
+            return cached.body
+            
+        if self.cache:
+            self.cache.store(url, response.text, response.headers.get('ETag'),
+                             response.headers.get('Last-Modified'))
+        return response.text
+        
+    def _request(self, url: str, timeout: int = 30, max_retries: int = 3,
+                 headers: Optional[Dict[str, str]] = None,
+                 params: Optional[Dict[str, Any]] = None) -> Optional[requests.Response]:
+        """GET url through the host semaphore and token bucket, retrying failures
+        
+        Returns the successful (or 304) response, or None. Client errors
+        other than throttling are not retried since they would not change.
+        When replaying a WARC archive the response comes from the archive.
+        """
+        if self.replay:
+            return self._replayed_response(url, params)
+            
         for attempt in range(max_retries):
-            try:
-                logger.info(f"Fetching: {url} (attempt {attempt + 1})")
-                response = self.session.get(url, timeout=timeout)
-                response.raise_for_status()
-                
-                # Add delay between requests
-                time.sleep(self.delay)
-                return response.text
-                
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"Attempt {attempt + 1} failed for {url}: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                else:
-                    logger.error(f"All attempts failed for {url}")
+            if attempt:
+                self.metrics.record_retry(url)
+            # The token is taken before the request slot: a slot held while sleeping
+            # on one host's bucket (or its Retry-After block) would hold back other hosts
+            self.rate_limiter.acquire(url)
+            with self._request_slot(url):
+                try:
+                    logger.info(f"Fetching: {url} (attempt {attempt + 1})")
+                    started = time.monotonic()
+                    response = self.session.get(url, timeout=timeout, headers=headers, params=params)
+                    latency = time.monotonic() - started
+                    self.metrics.observe_fetch(url, latency, response.status_code, len(response.content))
+                    if self.archive:
+                        self.archive.record(response)
+                    self.rate_limiter.record_response(url, response.status_code, latency,
+                                                      response.headers.get('Retry-After'))
+                    if response.status_code == 304:
+                        return response
+                        
+                    response.raise_for_status()
+                    return response
+                    
+                except requests.exceptions.RequestException as e:
+                    if not isinstance(e, requests.exceptions.HTTPError):
+                        self.rate_limiter.record_error(url)
+                        self.metrics.record_failure(url)
+                    logger.warning(f"Attempt {attempt + 1} failed for {url}: {e}")
+                    status = e.response.status_code if e.response is not None else None
+                    if status and 400 <= status < 500 and status not in THROTTLE_STATUS_CODES:
+                        logger.warning(f"Not retrying {url}: HTTP {status}")
+                        break
+                    if attempt == max_retries - 1:
+                        logger.error(f"All attempts failed for {url}")
         return None
-            
-    def _extract_product_details(self, product_element, fetch_detailed=False) -> Optional[Product]:
-        """Extract product details from HTML element"""
+        
+    def _replayed_response(self, url: str, params: Optional[Dict[str, Any]] = None):
+        """The archived response for url, or None if it was never recorded or was an error"""
+        if params:
+            url = requests.Request('GET', url, params=params).prepare().url
+        response = self.replay.get(url)
+        if response is None:
+            logger.warning(f"Not in the WARC archive: {url}")
+            return None
+        if not response.ok:
+            logger.warning(f"Archived HTTP {response.status_code} for {url}")
+            return None
+        logger.info(f"Replaying: {url}")
+        return response
+        
+    def _extract_product_details(self, product_element) -> Optional[Product]:
+        """Extract a product from its listing card; product pages are fetched by _fetch_details_concurrently"""
         try:
-            # Get selectors from config
-            selectors = self.config.get('selectors', {})
+            card = self._bind_card(product_element)
             
             # Extract title - try multiple selectors
-            title_selectors = selectors.get('title', [
-                'h2.woocommerce-loop-product__title',
-                'h3.woocommerce-loop-product__title',
-                '.product-title',
-                '.wc-block-grid__product-title',
-                '.product-item-title',
-                'a'
-            ])
-            
-            title_elem = None
-            for selector in title_selectors:
-                title_elem = product_element.select_one(selector)
-                if title_elem:
-                    break
-            title = title_elem.get_text(strip=True) if title_elem else "N/A"
-            
+            title = card.extract('title', _element_text)
+            if title is None:
+                title = "N/A"
+                
             # Extract price - try multiple selectors
-            price_selectors = selectors.get('price', [
-                'span.woocommerce-Price-amount',
-                '.woocommerce-Price-amount bdi',
-                '.price .amount',
-                '.price bdi',
-                '.price',
-                '.wc-block-grid__product-price',
-                '.product-price'
-            ])
-            
-            price_elem = None
-            for selector in price_selectors:
-                price_elem = product_element.select_one(selector)
-                if price_elem:
-                    break
-            price = price_elem.get_text(strip=True) if price_elem else "N/A"
-            
+            price = card.extract('price', _element_text)
+            if price is None:
+                price = "N/A"
+                
             # Extract link
-            link_selectors = selectors.get('link', [
-                'a.woocommerce-LoopProduct-link',
-                'a.wc-block-grid__product-link',
-                '.product-item-link',
-                'h2 a',
-                'h3 a',
-                'a'
-            ])
-            
-            link_elem = None
-            for selector in link_selectors:
-                link_elem = product_element.select_one(selector)
-                if link_elem and link_elem.get('href'):
-                    break
-            link = urljoin(self.base_url, link_elem['href']) if link_elem and link_elem.get('href') else "N/A"
+            href = card.extract('link', _element_href)
+            link = urljoin(self.base_url, href) if href else "N/A"
             
             # Extract image
-            image_selectors = selectors.get('image', [
-                'img.attachment-woocommerce_thumbnail',
-                'img.wp-post-image',
-                '.wc-block-grid__product-image img',
-                '.product-image img',
-                'img'
-            ])
-            
-            img_elem = None
-            for selector in image_selectors:
-                img_elem = product_element.select_one(selector)
-                if img_elem:
-                    break
+            img_elem = card.extract('image')
+            
+            image_url = self._image_url(img_elem)
             
-            image_url = "N/A"
-            if img_elem:
-                image_url = img_elem.get('src', img_elem.get('data-src', img_elem.get('data-lazy-src', '')))
-                if image_url and not image_url.startswith('http'):
-                    image_url = urljoin(self.base_url, image_url)
-                
             # Extract additional details from current element
-            description = self._extract_description(product_element)
-            sku = self._extract_sku(product_element)
-            stock_status = self._extract_stock_status(product_element)
-            category = self._extract_category(product_element)
-            
-            # If we have a valid link and want detailed info, fetch from product page
-            if fetch_detailed and link != "N/A" and not description:
-                detailed_info = self._fetch_product_details(link)
-                if detailed_info:
-                    description = detailed_info.get('description', description)
-                    sku = detailed_info.get('sku', sku)
-                    stock_status = detailed_info.get('stock_status', stock_status)
-                    category = detailed_info.get('category', category)
+            description = self._extract_description(card)
+            sku = self._extract_sku(card)
+            stock_status = self._extract_stock_status(card)
+            category = self._extract_category(card)
+            fingerprint = listing_fingerprint(title, price, image_url, stock_status)
             
             return Product(
                 title=title,
@@ -213,13 +492,168 @@ class WooCommerceScraper:
                 description=description,
                 sku=sku,
                 stock_status=stock_status,
-                category=category
+                category=category,
+                fingerprint=fingerprint
             )
             
         except Exception as e:
             logger.error(f"Error extracting product details: {e}")
             return None
     
+    def _image_url(self, img_elem) -> str:
+        """Absolute image URL of an <img>, including lazy-loaded sources"""
+        image_url = "N/A"
+        if img_elem:
+            image_url = img_elem.get('src', img_elem.get('data-src', img_elem.get('data-lazy-src', '')))
+            if image_url and not image_url.startswith('http'):
+                image_url = urljoin(self.base_url, image_url)
+        return image_url
+        
+    def _fetch_details_concurrently(self, products: List[Product]):
+        """Fetch detail pages for products in parallel and merge them in place
+        
+        Requests run on a worker pool of max_workers threads; the per-host
+        semaphore in _get_page_content keeps at most per_host_limit of them
+        talking to the same host at once.
+        """
+        targets = self._detail_targets(products)
+        if not targets:
+            return
+            
+        workers = min(self.max_workers, len(targets))
+        logger.info(f"Fetching detailed info for {len(targets)} products "
+                    f"({workers} workers, {self.per_host_limit} per host)...")
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() yields results in submission order, so products keep their order
+            results = executor.map(self._fetch_product_details, [p.link for p in targets])
+            for product, detailed_info in zip(targets, results):
+                if detailed_info:
+                    self._merge_details(product, detailed_info)
+                    if self.checkpoint:
+                        self.checkpoint.record_details(product.link, detailed_info)
+                    
+    def _detail_targets(self, products: List[Product]) -> List[Product]:
+        """Select the products whose detail page must be fetched
+        
+        In incremental mode, products whose listing fingerprint matches the
+        previous run get description/SKU/category copied forward instead.
+        """
+        targets = []
+        reused = 0
+        resumed = 0
+        for product in products:
+            if product.link == "N/A" or product.description:
+                continue
+            fetched = self.checkpoint.details.get(product.link) if self.checkpoint else None
+            if fetched:
+                self._merge_details(product, fetched)
+                resumed += 1
+                continue
+            previous = self.previous_products.get(product.link)
+            if (previous and previous.fingerprint == product.fingerprint
+                    and (previous.description or previous.sku or previous.category)):
+                product.description = previous.description
+                product.sku = previous.sku
+                product.category = previous.category
+                if not product.stock_status:
+                    product.stock_status = previous.stock_status
+                reused += 1
+            else:
+                targets.append(product)
+                
+        if reused:
+            self.details_reused += reused
+            logger.info(f"Reused details of {reused} unchanged products from the previous run")
+        if resumed:
+            logger.info(f"Reused details of {resumed} products fetched before the checkpoint")
+        return targets
+        
+    def use_checkpoint(self, directory: str, resume: bool = False):
+        """Save paginated crawl progress to directory after every listing page
+        
+        With resume, a crawl of the same start URL continues after the last
+        completed page, replays the products saved so far and skips product
+        pages whose details were already fetched. Otherwise any previous
+        checkpoint in directory is discarded.
+        """
+        self.checkpoint = CrawlCheckpoint(directory)
+        if resume and self.checkpoint.load():
+            state = self.checkpoint.state
+            logger.info(f"Loaded checkpoint from {directory}: {len(state.get('pages_completed', []))} pages, "
+                        f"{state.get('product_count', 0)} products, {len(self.checkpoint.details)} product details")
+        else:
+            self.checkpoint.reset()
+            
+    def record_warc(self, path: str):
+        """Archive every request and response of the crawl to a WARC file (gzipped if path ends in .gz)
+        
+        The HTTP cache is bypassed while recording, so that every page is
+        archived with its full body rather than as a 304 or not at all.
+        """
+        if self.cache:
+            logger.info("Recording a WARC archive; bypassing the HTTP cache")
+            self.cache = None
+        self.archive = WarcWriter(path)
+        
+    def replay_warc(self, path: str):
+        """Serve every request from a WARC file recorded earlier, with no network access
+        
+        URLs missing from the archive, or archived with an error status,
+        fail the way an unreachable page would.
+        """
+        self.cache = None
+        self.replay = WarcReplay(path)
+        
+    def close_archives(self):
+        """Close the WARC file being recorded or replayed"""
+        if self.archive:
+            self.archive.close()
+        if self.replay:
+            self.replay.close()
+            
+    def _resume_crawl(self, start_url: str) -> Tuple[Optional[str], int, Set[str], Iterable[Product]]:
+        """Where a paginated crawl starts: (page URL, page number, pages done, products already extracted)"""
+        state = self.checkpoint.resume_point(start_url) if self.checkpoint else None
+        if not state:
+            return start_url, 1, set(), []
+        logger.info(f"Resuming at page {state['next_page_num']}: {state['next_url'] or 'no pages left'}")
+        products = (Product(**row) for row in self.checkpoint.products())
+        return state['next_url'], state['next_page_num'], set(state['pages_completed']), products
+        
+    def load_previous_products(self, filename: str) -> int:
+        """Load a previous JSON or CSV export for incremental re-scraping"""
+        with open(filename, 'r', newline='', encoding='utf-8') as f:
+            if filename.lower().endswith('.csv'):
+                rows = list(csv.DictReader(f))
+            else:
+                rows = json.load(f)
+                
+        fields = Product.__dataclass_fields__
+        self.previous_products = {}
+        for row in rows:
+            data = {key: (value if value != "" else None) for key, value in row.items() if key in fields}
+            if not data.get('link') or data['link'] == "N/A":
+                continue
+            product = Product(**data)
+            if not product.fingerprint:
+                # Exports written before fingerprints existed
+                product.fingerprint = listing_fingerprint(product.title, product.price,
+                                                          product.image_url, product.stock_status)
+            self.previous_products[product.link] = product
+            
+        self.previous_export = filename
+        self.previous_run_time = os.path.getmtime(filename)
+        logger.info(f"Loaded {len(self.previous_products)} products from previous export {filename}")
+        return len(self.previous_products)
+        
+    def _merge_details(self, product: Product, detailed_info: Dict[str, str]):
+        """Merge fields fetched from a product page into a Product"""
+        product.description = detailed_info.get('description', product.description)
+        product.sku = detailed_info.get('sku', product.sku)
+        product.stock_status = intern_value(detailed_info.get('stock_status', product.stock_status))
+        product.category = intern_value(detailed_info.get('category', product.category))
+        
     def _fetch_product_details(self, product_url: str) -> Optional[Dict[str, str]]:
         """Fetch detailed product information from individual product page"""
         try:
@@ -228,331 +662,566 @@ class WooCommerceScraper:
             if not page_content:
                 return None
                 
-            soup = BeautifulSoup(page_content, 'html.parser')
+            return self._parse_fetched_details(page_content)
             
-            details = {}
-            
-            # Extract description from product page
-            desc_selectors = [
-                '.woocommerce-product-details__short-description',
-                '.product-short-description',
-                '.entry-summary .woocommerce-product-details__short-description',
-                '.summary .woocommerce-product-details__short-description',
-                '.entry-content p',
-                '.product-description',
-                '.short-description',
-                '.wc-tab-content p'
-            ]
-            
-            for selector in desc_selectors:
-                desc_elem = soup.select_one(selector)
-                if desc_elem:
-                    text = desc_elem.get_text(strip=True)
-                    if text and len(text) > 10:
-                        details['description'] = text[:500]
-                        break
-            
-            # Extract SKU from product page
-            sku_selectors = [
-                '.sku',
-                '.product_meta .sku',
-                '.woocommerce-product-sku',
-                '.product-sku',
-                '[itemprop="sku"]'
-            ]
-            
-            for selector in sku_selectors:
-                sku_elem = soup.select_one(selector)
-                if sku_elem:
-                    sku_text = sku_elem.get_text(strip=True)
-                    if sku_text and sku_text.lower() not in ['sku', 'sku:', 'n/a', '']:
-                        details['sku'] = sku_text
-                        break
-            
-            # Extract stock status from product page
-            stock_selectors = [
-                '.stock',
-                '.availability p',
-                '.woocommerce-stock-status',
-                '.in-stock',
-                '.out-of-stock',
-                '.stock-status'
-            ]
-            
-            for selector in stock_selectors:
-                stock_elem = soup.select_one(selector)
-                if stock_elem:
-                    stock_text = stock_elem.get_text(strip=True).lower()
-                    if stock_text:
-                        if any(word in stock_text for word in ['in stock', 'available', 'có sẵn']):
-                            details['stock_status'] = 'In Stock'
-                        elif any(word in stock_text for word in ['out of stock', 'sold out', 'hết hàng']):
-                            details['stock_status'] = 'Out of Stock'
-                        elif any(word in stock_text for word in ['backorder', 'pre-order']):
-                            details['stock_status'] = 'On Backorder'
-                        break
+        except Exception as e:
+            logger.error(f"Error fetching product details from {product_url}: {e}")
+            return None
             
-            # Extract category from breadcrumb or product meta
-            cat_selectors = [
-                '.woocommerce-breadcrumb a',
-                '.breadcrumb a',
-                '.product_meta .posted_in a',
-                '.product-category a',
-                '.entry-meta .category a'
-            ]
-            
-            for selector in cat_selectors:
-                cat_elems = soup.select(selector)
-                if cat_elems:
-                    # Get the last breadcrumb item (usually the direct category)
-                    cat_text = cat_elems[-1].get_text(strip=True)
-                    if cat_text and cat_text.lower() not in ['home', 'shop', 'trang chủ']:
-                        details['category'] = cat_text
-                        break
+    def _parse_fetched_details(self, page_content: str, listing_fields: bool = False) -> Optional[Dict[str, str]]:
+        """Parse a product page in the parse pool while one is running, else in this thread"""
+        if self.parse_pool is not None:
+            return self.parse_pool.parse_details(page_content, listing_fields)
+        return self._parse_product_details(page_content, listing_fields)
+        
+    @contextmanager
+    def _parsing_processes(self):
+        """Run page parsing in a ParsePool for the duration of a crawl when parse_processes is set"""
+        if self.parse_processes <= 0 or self.parse_pool is not None:
+            yield
+            return
+        from parse_pool import ParsePool
+        self.parse_pool = ParsePool(self, self.parse_processes)
+        try:
+            yield
+        finally:
+            self.parse_pool.close()
+            self.parse_pool = None
             
+    def _parse_product_details(self, page_content: str, listing_fields: bool = False) -> Optional[Dict[str, str]]:
+        """Parse detailed product information from a product page's HTML
+        
+        With listing_fields, title, price and image_url are read as well, for
+        products discovered without a listing page.
+        """
+        try:
+            # Exact values from JSON-LD/microdata first, found without building a DOM
+            details = {}
+            if self.structured_data:
+                with self.metrics.stage('structured_data'):
+                    details = structured_details(page_content)
+            if not listing_fields:
+                for field in ('title', 'price', 'image_url'):
+                    details.pop(field, None)
+                    
+            wanted = ['description', 'sku', 'stock_status', 'category']
+            if listing_fields:
+                wanted = ['title', 'price', 'image_url'] + wanted
+            missing = [field for field in wanted if field not in details]
+            if not missing:
+                return details
+                
+            # Fall back to the CSS selector cascades for the remaining fields
+            soup = self._parse_regions(page_content, self.detail_regions) if self.restrict_parse else None
+            if soup is not None:
+                with self.metrics.stage('extract'):
+                    self._extract_detail_fields(soup, details, missing)
+                missing = [field for field in missing if field not in details]
+                if missing:
+                    # The field may sit outside every region; it is cheaper to parse again than to lose it
+                    log = logger.debug if self._region_misses_logged else logger.warning
+                    log(f"No {', '.join(missing)} in the restricted product page tree, parsing the full document; "
+                        f"add the page's class names to parsing.detail_regions to avoid this")
+                    self._region_misses_logged = True
+                    soup = None
+            if soup is None and missing:
+                soup = self._parse_html(page_content)
+                with self.metrics.stage('extract'):
+                    self._extract_detail_fields(soup, details, missing)
             return details if details else None
             
         except Exception as e:
-            logger.error(f"Error fetching product details from {product_url}: {e}")
+            logger.error(f"Error parsing product details: {e}")
             return None
             
-    def _extract_description(self, element) -> Optional[str]:
+    def _extract_detail_fields(self, soup, details: Dict[str, str], missing: List[str]):
+        """Fill the missing fields of details from a parsed product page with the detail selector cascades"""
+        plan = self.detail_plan
+        if 'title' in missing:
+            title = plan['title'].extract(soup, _element_text)
+            if title:
+                details['title'] = title
+        if 'price' in missing:
+            price = plan['price'].extract(soup, _element_text)
+            if price:
+                details['price'] = price
+        if 'image_url' in missing:
+            image_url = self._image_url(plan['image'].extract(soup))
+            if image_url != "N/A":
+                details['image_url'] = image_url
+                
+        # Extract description from product page
+        if 'description' in missing:
+            description = plan['description'].extract(soup, _parse_description)
+            if description:
+                details['description'] = description
+                
+        # Extract SKU from product page
+        if 'sku' in missing:
+            sku = plan['sku'].extract(soup, _parse_sku_text)
+            if sku:
+                details['sku'] = sku
+                
+        # Extract stock status from product page
+        if 'stock_status' in missing:
+            stock_status = plan['stock'].extract(soup, _parse_known_stock)
+            if stock_status:
+                details['stock_status'] = stock_status
+                
+        # Extract category from breadcrumb or product meta; the last
+        # breadcrumb item is usually the direct category
+        if 'category' in missing:
+            category = plan['category'].extract(soup, _parse_breadcrumb_category, many=True)
+            if category:
+                details['category'] = category
+            
+    def _bind_card(self, product_element):
+        """Prepare a product card for field lookups with the configured extraction engine"""
+        if self.single_pass:
+            return self.single_pass.visit(product_element)
+        return self.selector_plan.bind(product_element)
+        
+    def _extract_description(self, card) -> Optional[str]:
         """Extract product description"""
-        # Try multiple selectors for description
-        desc_selectors = [
-            '.woocommerce-product-details__short-description',
-            '.product-short-description',
-            '.entry-summary p',
-            '.product-excerpt',
-            '.product-description',
-            '.wc-product-description',
-            'p.product-excerpt',
-            '.summary .description',
-            '.product-summary p',
-            '[class*="description"]',
-            'p'
-        ]
-        
-        for selector in desc_selectors:
-            desc_elem = element.select_one(selector)
-            if desc_elem:
-                text = desc_elem.get_text(strip=True)
-                if text and len(text) > 10:  # Only return meaningful descriptions
-                    return text[:500]  # Limit length
-        return None
+        return card.extract('description', _parse_description)
         
-    def _extract_sku(self, element) -> Optional[str]:
+    def _extract_sku(self, card) -> Optional[str]:
         """Extract product SKU"""
-        # Try multiple selectors for SKU
-        sku_selectors = [
-            '.sku',
-            '.product-sku',
-            '.woocommerce-product-sku',
-            '[class*="sku"]',
-            '.product-meta .sku',
-            '.product-code',
-            '[data-sku]'
-        ]
-        
-        for selector in sku_selectors:
-            sku_elem = element.select_one(selector)
-            if sku_elem:
-                # Try text content first
-                sku_text = sku_elem.get_text(strip=True)
-                if sku_text and not sku_text.lower() in ['sku', 'sku:', 'n/a', '']:
-                    return sku_text
-                # Try data attribute
-                sku_data = sku_elem.get('data-sku')
-                if sku_data:
-                    return sku_data
-        return None
+        return card.extract('sku', _parse_sku)
         
-    def _extract_stock_status(self, element) -> Optional[str]:
+    def _extract_stock_status(self, card) -> Optional[str]:
         """Extract stock status"""
-        # Try multiple selectors for stock status
-        stock_selectors = [
-            '.stock',
-            '.availability',
-            '.in-stock',
-            '.out-of-stock',
-            '.stock-status',
-            '.woocommerce-stock-status',
-            '[class*="stock"]',
-            '.product-stock',
-            '.inventory-status'
-        ]
-        
-        for selector in stock_selectors:
-            stock_elem = element.select_one(selector)
-            if stock_elem:
-                stock_text = stock_elem.get_text(strip=True).lower()
-                if stock_text:
-                    # Normalize stock status
-                    if any(word in stock_text for word in ['in stock', 'available', 'có sẵn']):
-                        return 'In Stock'
-                    elif any(word in stock_text for word in ['out of stock', 'sold out', 'hết hàng']):
-                        return 'Out of Stock'
-                    elif any(word in stock_text for word in ['backorder', 'pre-order', 'đặt trước']):
-                        return 'On Backorder'
-                    else:
-                        return stock_text.title()
-        
+        stock_status = card.extract('stock', _parse_stock)
+        if stock_status:
+            return stock_status
+            
         # Check for stock indicators in class names
-        if element.select_one('.in-stock'):
+        if card.select_one('.in-stock'):
             return 'In Stock'
-        elif element.select_one('.out-of-stock'):
+        elif card.select_one('.out-of-stock'):
             return 'Out of Stock'
         
         return None
         
-    def _extract_category(self, element) -> Optional[str]:
+    def _extract_category(self, card) -> Optional[str]:
         """Extract product category"""
-        # Try multiple selectors for category
-        cat_selectors = [
-            '.product-category',
-            '.category',
-            '.woocommerce-product-category',
-            '.product-cat',
-            '[class*="category"]',
-            '.breadcrumb a',
-            '.product-meta .category'
-        ]
-        
-        for selector in cat_selectors:
-            cat_elem = element.select_one(selector)
-            if cat_elem:
-                cat_text = cat_elem.get_text(strip=True)
-                if cat_text and cat_text.lower() not in ['category', 'categories', 'cat', '']:
-                    return cat_text
+        return card.extract('category', _parse_category)
+        
+    def _parse_html(self, page_content: str, regions: Optional[List[str]] = None) -> BeautifulSoup:
+        """Parse page content into a BeautifulSoup tree
+        
+        With restricted parsing enabled, only elements carrying one of the
+        regions' class names (and their descendants) are built. If none of
+        them is on the page the whole document is parsed instead.
+        """
+        if regions and self.restrict_parse:
+            soup = self._parse_regions(page_content, regions)
+            if soup is not None:
+                return soup
+        with self.metrics.stage('parse'):
+            return BeautifulSoup(page_content, self.parser)
+            
+    def _parse_regions(self, page_content: str, regions: List[str]) -> Optional[BeautifulSoup]:
+        """Parse only the elements carrying one of the regions' class names; None if the page has none"""
+        with self.metrics.stage('parse'):
+            soup = BeautifulSoup(page_content, self.parser, parse_only=region_strainer(regions))
+        if soup.find(True) is not None:
+            return soup
+        logger.debug("No known page regions found, parsing the full document")
         return None
         
+    def _parse_listing_html(self, page_content: str) -> BeautifulSoup:
+        """Parse a listing page, keeping only the product grid and pagination when restricted"""
+        with self.metrics.stage('parse'):
+            if self.restrict_parse:
+                soup = BeautifulSoup(page_content, self.parser, parse_only=region_strainer(self.listing_regions))
+                if self.selector_plan['product_containers'].matches(soup):
+                    return soup
+                logger.debug("No product containers in the restricted tree, parsing the full document")
+            return BeautifulSoup(page_content, self.parser)
+        
+    def _find_next_page_url(self, soup) -> Optional[str]:
+        """Find the next pagination link in an already parsed listing page"""
+        href = self.selector_plan['next_page'].extract(soup, _element_href)
+        return urljoin(self.base_url, href) if href else None
+        
     def scrape_page(self, url: str, fetch_detailed: bool = False) -> List[Product]:
         """Scrape products from a single page"""
         page_content = self._get_page_content(url)
         if not page_content:
             return []
             
-        soup = BeautifulSoup(page_content, 'html.parser')
+        soup = self._parse_listing_html(page_content)
+        return self._extract_products_from_soup(soup, url, fetch_detailed=fetch_detailed)
+        
+    def _extract_products_from_soup(self, soup, url: str, fetch_detailed: bool = False) -> List[Product]:
+        """Extract all products from a parsed listing page"""
+        products = self._extract_listing_products(soup)
+        
+        # Fetch product pages in parallel once the whole listing is extracted
+        if fetch_detailed:
+            self._fetch_details_concurrently(products)
+            
+        self._log_products_found(products)
+        logger.info(f"Successfully extracted {len(products)} products from {url}")
+        return products
         
+    def _extract_listing_products(self, soup) -> List[Product]:
+        """Extract products from a parsed listing page, timed as the extract stage"""
+        with self.metrics.stage('extract'):
+            return self._extract_cards(soup)
+            
+    def _extract_cards(self, soup) -> List[Product]:
+        """Extract products from the product containers of a listing page"""
         # Find product containers using multiple selectors
-        selectors = self.config.get('selectors', {})
-        product_selectors = selectors.get('product_containers', [
-            'li.product',
-            '.wc-block-grid__product',
-            '.product-item',
-            '.woocommerce-product',
-            '.type-product',
-            '[class*="product"]',
-            '.product',
-            '.products li'
-        ])
-        
-        elements = []
-        for selector in product_selectors:
-            elements = soup.select(selector)
-            if elements:
-                logger.info(f"Found {len(elements)} products using selector: {selector}")
-                break
-        else:
+        elements, selector = self.selector_plan['product_containers'].match(soup, many=True)
+        if not elements:
             logger.warning("No products found with any selector")
             return []
-            
+        logger.info(f"Found {len(elements)} products using selector: {selector}")
+        
         products = []
         for i, element in enumerate(elements):
             try:
-                # Show progress for detailed scraping
-                if fetch_detailed:
-                    logger.info(f"Processing product {i+1}/{len(elements)} with detailed info...")
-                
-                product = self._extract_product_details(element, fetch_detailed=fetch_detailed)
+                product = self._extract_product_details(element)
                 if product and product.title != "N/A":
                     products.append(product)
                     
-                    # Log what we found
-                    details_found = []
-                    if product.description:
-                        details_found.append("description")
-                    if product.sku:
-                        details_found.append("SKU")
-                    if product.stock_status:
-                        details_found.append("stock")
-                    if product.category:
-                        details_found.append("category")
-                    
-                    if details_found:
-                        logger.info(f"Product '{product.title[:30]}...' - Found: {', '.join(details_found)}")
-                    
             except Exception as e:
                 logger.error(f"Error processing product {i+1}: {e}")
                 continue
                 
-        logger.info(f"Successfully extracted {len(products)} products from {url}")
         return products
         
-    def scrape_all_pages(self, start_url: str, max_pages: int = 10, fetch_detailed: bool = False) -> List[Product]:
-        """Scrape products from multiple pages"""
-        all_products = []
-        current_url = start_url
-        page_num = 1
+    def _log_products_found(self, products: List[Product]):
+        """Log which optional fields were found for each product"""
+        for product in products:
+            details_found = []
+            if product.description:
+                details_found.append("description")
+            if product.sku:
+                details_found.append("SKU")
+            if product.stock_status:
+                details_found.append("stock")
+            if product.category:
+                details_found.append("category")
+            
+            if details_found:
+                logger.info(f"Product '{product.title[:30]}...' - Found: {', '.join(details_found)}")
+                
+    def scrape_all_pages(self, start_url: str, max_pages: int = 10,
+                         fetch_detailed: bool = False) -> Sequence[Product]:
+        """Scrape products from multiple pages into self.products"""
+        return self.keep_products(self.iter_products(start_url, max_pages=max_pages, fetch_detailed=fetch_detailed))
+        
+    def keep_products(self, products: Iterable[Product]) -> Sequence[Product]:
+        """Store products as self.products in a columnar ProductBatch, for the export methods; returns it"""
+        from product_batch import ProductBatch
+        self.products = ProductBatch(products)
+        return self.products
         
-        while current_url and page_num <= max_pages:
-            logger.info(f"Scraping page {page_num}/{max_pages}: {current_url}")
+    def iter_products(self, start_url: str, max_pages: int = 10, fetch_detailed: bool = False) -> Iterator[Product]:
+        """Yield products page by page as each listing page completes
+        
+        Each listing page is downloaded and parsed exactly once. The next page
+        link is read from the same tree and its download is started in the
+        background while the current page's products are being extracted.
+        Products are not kept, so memory does not grow with the catalog;
+        self.tally counts them for the statistics.
+        """
+        self.tally = ProductTally()
+        current_url, page_num, visited, restored = self._resume_crawl(start_url)
+        for product in restored:
+            self.tally.add(product)
+            yield product
             
-            page_products = self.scrape_page(current_url, fetch_detailed=fetch_detailed)
-            if not page_products:
-                logger.info("No products found, stopping pagination")
-                break
+        if self.parse_processes > 0:
+            yield from self._iter_products_pooled(start_url, current_url, page_num, max_pages, visited, fetch_detailed)
+            self._log_summary(self.tally, fetch_detailed)
+            return
+            
+        prefetcher = ThreadPoolExecutor(max_workers=1)
+        next_future = None
+        try:
+            page_content = self._get_page_content(current_url) if current_url else None
+            
+            while current_url and page_num <= max_pages:
+                logger.info(f"Scraping page {page_num}/{max_pages}: {current_url}")
+                visited.add(current_url)
                 
-            all_products.extend(page_products)
-            logger.info(f"Page {page_num} completed. Total products so far: {len(all_products)}")
-            
-            # Find next page URL
-            page_content = self._get_page_content(current_url)
-            if page_content:
-                soup = BeautifulSoup(page_content, 'html.parser')
-                # Try multiple selectors for next page link
-                next_selectors = [
-                    'a.next',
-                    '.next-page a',
-                    '.pagination .next',
-                    '.woocommerce-pagination .next',
-                    'a[aria-label="Next"]',
-                    '.page-numbers.next'
-                ]
+                if not page_content:
+                    break
+                    
+                soup = self._parse_listing_html(page_content)
                 
-                next_link = None
-                for selector in next_selectors:
-                    next_link = soup.select_one(selector)
-                    if next_link and next_link.get('href'):
-                        break
+                # Start fetching the next page before extracting this one
+                next_url = self._find_next_page_url(soup)
+                if next_url in visited:
+                    next_url = None
+                if next_url and page_num < max_pages:
+                    next_future = prefetcher.submit(self._get_page_content, next_url)
                 
-                if next_link and next_link.get('href'):
-                    current_url = urljoin(self.base_url, next_link['href'])
-                    page_num += 1
-                else:
+                page_products = self._extract_products_from_soup(soup, current_url, fetch_detailed=fetch_detailed)
+                del soup
+                if not page_products:
+                    logger.info("No products found, stopping pagination")
+                    break
+                    
+                if self.checkpoint:
+                    self.checkpoint.page_done(start_url, current_url, page_num, next_url, page_products)
+                for product in page_products:
+                    self.tally.add(product)
+                    yield product
+                logger.info(f"Page {page_num} completed. Total products so far: {self.tally.total}")
+                
+                if not next_url:
                     logger.info("No more pages found")
                     break
-            else:
+                if next_future is None:
+                    break
+                    
+                current_url = next_url
+                page_num += 1
+                page_content = next_future.result()
+                next_future = None
+        finally:
+            if next_future is not None:
+                next_future.cancel()
+            prefetcher.shutdown(wait=False)
+            if self.checkpoint:
+                self.checkpoint.close()
+            
+        self._log_summary(self.tally, fetch_detailed)
+        
+    def _iter_products_pooled(self, start_url: str, current_url: Optional[str], page_num: int, max_pages: int,
+                              visited: Set[str], fetch_detailed: bool) -> Iterator[Product]:
+        """iter_products with parsing in worker processes
+        
+        A ListingFetcher keeps downloading listing pages, up to
+        parse_queue_size ahead, while the pool parses them and this thread
+        fetches product pages (also parsed in the pool) and yields products
+        in page order. If a page turns out to link somewhere other than the
+        next page that was guessed and downloaded, the fetcher is restarted
+        from the real link.
+        """
+        from parse_pool import ListingFetcher
+        try:
+            with self._parsing_processes():
+                fetcher = ListingFetcher(self, self.parse_pool, current_url, page_num, max_pages, set(visited),
+                                         self.parse_queue_size)
+                try:
+                    while True:
+                        page = fetcher.next_page()
+                        if page is None:
+                            break
+                        logger.info(f"Scraping page {page.num}/{max_pages}: {page.url}")
+                        visited.add(page.url)
+                        
+                        page_products, next_url = page.products()
+                        if fetch_detailed:
+                            self._fetch_details_concurrently(page_products)
+                        self._log_products_found(page_products)
+                        logger.info(f"Successfully extracted {len(page_products)} products from {page.url}")
+                        if not page_products:
+                            logger.info("No products found, stopping pagination")
+                            break
+                            
+                        if next_url in visited:
+                            next_url = None
+                        if self.checkpoint:
+                            self.checkpoint.page_done(start_url, page.url, page.num, next_url, page_products)
+                        for product in page_products:
+                            self.tally.add(product)
+                            yield product
+                        logger.info(f"Page {page.num} completed. Total products so far: {self.tally.total}")
+                        
+                        if not next_url:
+                            logger.info("No more pages found")
+                            break
+                        if next_url != page.next_url and page.num < max_pages:
+                            logger.warning(f"Page {page.num} links to {next_url}, not the guessed {page.next_url}; "
+                                           f"continuing from there")
+                            fetcher.stop()
+                            fetcher = ListingFetcher(self, self.parse_pool, next_url, page.num + 1, max_pages,
+                                                     set(visited), self.parse_queue_size)
+                finally:
+                    # Before the pool shuts down, so no download is left waiting on it
+                    fetcher.stop()
+        finally:
+            if self.checkpoint:
+                self.checkpoint.close()
+                
+    def _fetch_sitemap(self, url: str) -> Optional[str]:
+        """Fetch a robots.txt or sitemap document, unpacking gzipped sitemaps"""
+        if not url.lower().endswith('.gz'):
+            return self._get_page_content(url, max_retries=2)
+        response = self._request(url, max_retries=2)
+        if response is None:
+            return None
+        try:
+            return gzip.decompress(response.content).decode('utf-8')
+        except OSError:
+            # Already decoded by the server's Content-Encoding
+            return response.text
+            
+    def _fetch_product_page(self, product_url: str) -> Optional[Product]:
+        """Build a Product from its product page alone"""
+        try:
+            logger.info(f"Fetching product page: {product_url}")
+            page_content = self._get_page_content(product_url)
+            if not page_content:
+                return None
+                
+            details = self._parse_fetched_details(page_content, listing_fields=True)
+            if not details or not details.get('title'):
+                logger.warning(f"No product found at {product_url}")
+                return None
+                
+            product = Product(
+                title=details['title'],
+                price=details.get('price', "N/A"),
+                link=product_url,
+                image_url=details.get('image_url', "N/A")
+            )
+            self._merge_details(product, details)
+            product.fingerprint = listing_fingerprint(product.title, product.price,
+                                                      product.image_url, product.stock_status)
+            return product
+            
+        except Exception as e:
+            logger.error(f"Error fetching product page {product_url}: {e}")
+            return None
+            
+    def scrape_sitemaps(self, start_url: str) -> Optional[Sequence[Product]]:
+        """Discover products through the shop's sitemaps instead of listing pages
+        
+        Product URLs are streamed from the product sitemaps (fetched in
+        parallel) straight into the detail-fetch pool. With a previous export
+        loaded, products whose <lastmod> predates it are copied forward
+        without being fetched. Returns None if no product sitemap is found,
+        so the caller can fall back to pagination.
+        """
+        if FILTERED_LISTING.search(start_url):
+            logger.info("Filtered listing URL, sitemaps would list the whole catalog; using pagination")
+            return None
+            
+        discovery = SitemapDiscovery(self._fetch_sitemap, self.max_workers)
+        slots = []
+        reused = 0
+        # Product sitemaps usually list the shop page itself as well
+        listing_paths = {urlparse(start_url).path.rstrip('/'), urlparse(self.base_url).path.rstrip('/')}
+        
+        with self._parsing_processes(), ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for entry in discovery.iter_product_urls(start_url):
+                if urlparse(entry.loc).path.rstrip('/') in listing_paths:
+                    continue
+                previous = self.previous_products.get(entry.loc)
+                if (previous and entry.lastmod and self.previous_run_time
+                        and entry.lastmod <= self.previous_run_time):
+                    slots.append(Product(**asdict(previous)))
+                    reused += 1
+                    continue
+                slots.append(executor.submit(self._fetch_product_page, entry.loc))
+                
+            if not slots:
+                logger.info("No product sitemap found")
+                return None
+                
+            logger.info(f"Sitemaps list {len(slots)} products ({reused} unchanged since the previous run)")
+            # Keep sitemap order; unchanged products are already resolved
+            all_products = []
+            for slot in slots:
+                product = slot.result() if not isinstance(slot, Product) else slot
+                if product:
+                    all_products.append(product)
+                    
+        self.details_reused += reused
+        self.tally = ProductTally.of(all_products)
+        self._log_summary(self.tally, fetch_detailed=True)
+        return self.keep_products(all_products)
+        
+    def detect_store_api(self) -> Optional[str]:
+        """Return the shop's Store API products endpoint, or None if it is not reachable"""
+        for endpoint in store_api_endpoints(self.base_url):
+            response = self._request(endpoint, max_retries=1, params={'per_page': 1})
+            if response is None:
+                continue
+            try:
+                if isinstance(response.json(), list):
+                    logger.info(f"Store API available at {endpoint}")
+                    return endpoint
+            except ValueError:
+                pass
+            logger.info(f"No Store API product list at {endpoint}")
+        return None
+        
+    def scrape_store_api(self, start_url: str, max_pages: int = 10) -> Optional[Sequence[Product]]:
+        """Scrape products from the WooCommerce Store API
+        
+        Pages through the public products endpoint, per_page products at a
+        time, instead of parsing listing and product pages. Returns None when
+        the endpoint is unavailable or cannot represent start_url (category,
+        tag and search listings), so the caller can fall back to HTML.
+        """
+        if FILTERED_LISTING.search(start_url):
+            logger.info("Filtered listing URL, the Store API would return the whole catalog; using HTML")
+            return None
+            
+        endpoint = self.detect_store_api()
+        if not endpoint:
+            logger.info("Store API not available, falling back to HTML scraping")
+            return None
+            
+        per_page = min(100, max(1, self.config.get('store_api', {}).get('per_page', 100)))
+        all_products = []
+        page_num = 1
+        
+        while page_num <= max_pages:
+            logger.info(f"Fetching Store API page {page_num}/{max_pages}")
+            response = self._request(endpoint, params={'per_page': per_page, 'page': page_num})
+            if response is None:
+                break
+            try:
+                items = response.json()
+            except ValueError as e:
+                logger.error(f"Invalid Store API response on page {page_num}: {e}")
+                break
+            if not isinstance(items, list) or not items:
                 break
                 
-        self.products = all_products
+            for item in items:
+                try:
+                    fields = product_fields(item)
+                    fields['fingerprint'] = listing_fingerprint(fields['title'], fields['price'],
+                                                                fields['image_url'], fields['stock_status'])
+                    all_products.append(Product(**fields))
+                except Exception as e:
+                    logger.error(f"Error processing Store API product {item.get('id')}: {e}")
+                    
+            logger.info(f"Store API page {page_num} completed. Total products so far: {len(all_products)}")
+            
+            total_pages = response.headers.get('X-WP-TotalPages')
+            if len(items) < per_page or (total_pages and total_pages.isdigit() and page_num >= int(total_pages)):
+                break
+            page_num += 1
+            
+        if not all_products and page_num == 1:
+            return None
+            
+        self.tally = ProductTally.of(all_products)
+        self._log_summary(self.tally, fetch_detailed=True)
+        return self.keep_products(all_products)
         
-        # Final summary
+    def _log_summary(self, tally: ProductTally, fetch_detailed: bool = False):
+        """Log the final summary of a multi-page scrape"""
         logger.info(f"=== SCRAPING COMPLETED ===")
-        logger.info(f"Total products scraped: {len(all_products)}")
+        logger.info(f"Total products scraped: {tally.total}")
         
         if fetch_detailed:
-            products_with_desc = sum(1 for p in all_products if p.description)
-            products_with_sku = sum(1 for p in all_products if p.sku)
-            products_with_stock = sum(1 for p in all_products if p.stock_status)
-            products_with_cat = sum(1 for p in all_products if p.category)
-            
-            logger.info(f"Products with description: {products_with_desc}")
-            logger.info(f"Products with SKU: {products_with_sku}")
-            logger.info(f"Products with stock status: {products_with_stock}")
-            logger.info(f"Products with category: {products_with_cat}")
-        
-        return all_products
+            logger.info(f"Products with description: {tally.with_field['description']}")
+            logger.info(f"Products with SKU: {tally.with_field['sku']}")
+            logger.info(f"Products with stock status: {tally.with_field['stock_status']}")
+            logger.info(f"Products with category: {tally.with_field['category']}")
         
     def export_to_json(self, filename: str = None):
         """Export products to JSON file"""
@@ -560,7 +1229,7 @@ class WooCommerceScraper:
             filename = self.config.get('export_options', {}).get('default_json_file', 'products.json')
         
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
+            with self.metrics.stage('export'), open(filename, 'w', encoding='utf-8') as f:
                 json.dump([asdict(product) for product in self.products], f, 
                          ensure_ascii=False, indent=2)
             logger.info(f"Products exported to {filename}")
@@ -573,7 +1242,7 @@ class WooCommerceScraper:
             filename = self.config.get('export_options', {}).get('default_csv_file', 'products.csv')
         
         try:
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
+            with self.metrics.stage('export'), open(filename, 'w', newline='', encoding='utf-8') as f:
                 if self.products:
                     fieldnames = asdict(self.products[0]).keys()
                     writer = csv.DictWriter(f, fieldnames=fieldnames)
@@ -584,22 +1253,113 @@ class WooCommerceScraper:
         except Exception as e:
             logger.error(f"Error exporting to CSV: {e}")
     
+    def export_to_jsonl(self, filename: str):
+        """Export products to a JSON Lines file"""
+        try:
+            with self.metrics.stage('export'), JsonLinesSink(filename) as sink:
+                sink.write_many(self.products)
+            logger.info(f"Products exported to {filename}")
+        except Exception as e:
+            logger.error(f"Error exporting to JSON Lines: {e}")
+            
+    def export_to_parquet(self, filename: str = None, compression: str = None):
+        """Export products to a Parquet file, one row group per row_group_size products"""
+        options = self.config.get('export_options', {})
+        if not filename:
+            filename = options.get('default_parquet_file', 'products.parquet')
+        parquet = options.get('parquet', {})
+        
+        try:
+            with self.metrics.stage('export'), ParquetSink(filename, parquet.get('row_group_size', 10000),
+                                                           compression or parquet.get('compression', 'zstd')) as sink:
+                sink.write_many(self.products)
+            logger.info(f"Products exported to {filename}")
+        except Exception as e:
+            logger.error(f"Error exporting to Parquet: {e}")
+            
+    def export_to_sqlite(self, filename: str = None):
+        """Upsert products into a SQLite database, recording this run's price and stock changes"""
+        options = self.config.get('export_options', {})
+        if not filename:
+            filename = options.get('default_sqlite_file', 'products.sqlite')
+            
+        try:
+            with self.metrics.stage('export'), SqliteSink(filename, options.get('sqlite', {}).get('batch_size', 1000),
+                                                          self.base_url) as sink:
+                sink.write_many(self.products)
+            logger.info(f"Products exported to {filename}")
+        except Exception as e:
+            logger.error(f"Error exporting to SQLite: {e}")
+            
     def get_statistics(self) -> Dict[str, Any]:
         """Get scraping statistics"""
-        if not self.products:
+        tally = ProductTally.of(self.products) if self.products else self.tally
+        if not tally.total:
             return {}
         
-        total_products = len(self.products)
-        products_with_price = sum(1 for p in self.products if p.price != "N/A")
-        products_with_image = sum(1 for p in self.products if p.image_url != "N/A")
+        total_products = tally.total
+        products_with_price = tally.with_price
+        products_with_image = tally.with_image
         
-        return {
+        stats = {
             "total_products": total_products,
             "products_with_price": products_with_price,
             "products_with_image": products_with_image,
             "price_coverage": f"{products_with_price/total_products*100:.1f}%",
             "image_coverage": f"{products_with_image/total_products*100:.1f}%"
         }
+        
+        # Request pacing across all hosts contacted
+        host_stats = self.rate_limiter.stats().values()
+        if host_stats:
+            stats["request_rate"] = f"{sum(h['rate'] for h in host_stats):.2f} req/s"
+            stats["max_queue_depth"] = max(h['max_queue_depth'] for h in host_stats)
+            stats["throttle_events"] = sum(h['throttle_events'] for h in host_stats)
+            stats["time_waited"] = f"{sum(h['time_waited'] for h in host_stats):.1f}s"
+            stats["time_throttled"] = f"{sum(h['time_throttled'] for h in host_stats):.1f}s"
+            
+        if self.previous_products:
+            stats["details_reused"] = self.details_reused
+            
+        if self.cache:
+            stats["cache_hits"] = self.cache.stats["fresh_hits"] + self.cache.stats["revalidated"]
+            stats["cache_misses"] = self.cache.stats["misses"]
+            
+        if self.archive:
+            stats["warc_records"] = self.archive.records
+        if self.replay:
+            stats["replayed_pages"] = self.replay.stats["hits"]
+            stats["missing_from_archive"] = self.replay.stats["misses"]
+            
+        # Where the time went: network, rate limiting or parsing and extraction
+        runtime = self.metrics.snapshot()
+        hosts = runtime["hosts"].values()
+        if hosts:
+            stats["bytes_downloaded"] = sum(h["bytes"] for h in hosts)
+            stats["retries"] = sum(h["retries"] for h in hosts)
+            stats["time_fetching"] = f"{sum(h['latency']['sum'] for h in hosts):.1f}s"
+        for stage, label in (('parse', 'time_parsing'), ('extract', 'time_extracting'),
+                             ('export', 'time_exporting')):
+            if stage in runtime["stages"]:
+                stats[label] = f"{runtime['stages'][stage]['seconds']:.1f}s"
+        return stats
+        
+    def runtime_metrics(self) -> Dict[str, Any]:
+        """Fetch latency histograms, bytes, retries and rate limiter waits per host, time per stage and
+        per-field selector counters of the crawl so far, as a JSON-ready dict
+        
+        Per host, time_waited adds up the waits of all requests, so with
+        concurrent requests it can exceed the uptime; time_throttled is the
+        wall-clock time during which at least one request was waiting.
+        """
+        snapshot = self.metrics.snapshot()
+        snapshot["products"] = max(self.tally.total, len(self.products))
+        for host, bucket in self.rate_limiter.stats().items():
+            host_metrics = snapshot["hosts"].setdefault(host, {})
+            host_metrics["time_waited"] = bucket["time_waited"]
+            host_metrics["time_throttled"] = bucket["time_throttled"]
+        snapshot["selectors"] = {"listing": self.selector_plan.stats(), "detail": self.detail_plan.stats()}
+        return snapshot
             
     def print_products(self):
         """Print products to console"""
@@ -626,6 +1386,59 @@ class WooCommerceScraper:
             for key, value in stats.items():
                 print(f"{key.replace('_', ' ').title()}: {value}")
 
+async def _scrape_async(scraper, url: str, max_pages: int, fetch_detailed: bool) -> List[Product]:
+    """Run the async engine's crawl and close its connection pool"""
+    async with scraper:
+        return await scraper.scrape_all_pages(url, max_pages=max_pages, fetch_detailed=fetch_detailed)
+        
+async def _stream_async(scraper, url: str, max_pages: int, fetch_detailed: bool, sinks: List) -> int:
+    """Run the async engine's crawl, writing products to sinks as pages complete"""
+    async with scraper:
+        async for product in scraper.aiter_products(url, max_pages=max_pages, fetch_detailed=fetch_detailed):
+            _write_product(scraper, sinks, product)
+    return scraper.tally.total
+    
+def _write_product(scraper, sinks: List, product: Product):
+    """Write one product to every sink, timed as the export stage"""
+    with scraper.metrics.stage('export'):
+        for sink in sinks:
+            sink.write(product)
+            
+
+def _stream_products(scraper, args, products: Optional[Iterable[Product]]) -> int:
+    """Write products to the export files while the crawl runs; returns the product count"""
+    options = dict(scraper.config.get('export_options', {}))
+    if args.parquet_compression:
+        options['parquet'] = dict(options.get('parquet', {}), compression=args.parquet_compression)
+    filenames = [args.export_csv, args.export_jsonl, args.export_parquet]
+    if args.export_json or not (args.export_csv or args.export_jsonl or args.export_parquet
+                                or args.export_sqlite or args.quiet):
+        filenames.append(args.export_json or options.get('default_json_file', 'products.json'))
+        
+    sinks = []
+    try:
+        for filename in filenames:
+            if filename:
+                sinks.append(open_sink(filename, options))
+        if args.export_sqlite:
+            # Whatever the extension, --export-sqlite always means a database
+            sinks.append(SqliteSink(args.export_sqlite, options.get('sqlite', {}).get('batch_size', 1000),
+                                    scraper.base_url))
+        if products is not None:
+            for product in products:
+                _write_product(scraper, sinks, product)
+            return scraper.tally.total
+        if args.engine == 'async':
+            return asyncio.run(_stream_async(scraper, args.url, args.max_pages, args.detailed, sinks))
+        for product in scraper.iter_products(args.url, max_pages=args.max_pages, fetch_detailed=args.detailed):
+            _write_product(scraper, sinks, product)
+        return scraper.tally.total
+    finally:
+        # Closing keeps the files valid even if the crawl was interrupted
+        with scraper.metrics.stage('export'):
+            for sink in sinks:
+                sink.close()
+
 def main():
     """Main function with command line interface"""
     parser = argparse.ArgumentParser(description='Enhanced WooCommerce Product Scraper')
@@ -641,15 +1454,104 @@ def main():
                        help='Export to JSON file (default: products.json)')
     parser.add_argument('--export-csv', 
                        help='Export to CSV file (default: products.csv)')
+    parser.add_argument('--export-jsonl',
+                       help='Export to JSON Lines file (one product per line)')
+    parser.add_argument('--export-parquet',
+                       help='Export to Parquet file (requires pyarrow)')
+    parser.add_argument('--parquet-compression', choices=PARQUET_COMPRESSION,
+                       help='Parquet compression codec (default: from config.json)')
+    parser.add_argument('--export-sqlite',
+                       help='Upsert products into a SQLite database keyed by link, keeping price/stock history')
+    parser.add_argument('--stream', action='store_true',
+                       help='Write exports progressively while scraping instead of keeping all products in memory')
     parser.add_argument('--quiet', action='store_true', 
                        help='Suppress console output')
     parser.add_argument('--stats-only', action='store_true',
                        help='Only show statistics, don\'t print products')
     parser.add_argument('--detailed', action='store_true',
                        help='Fetch detailed product info (slower but more complete)')
-    
+    parser.add_argument('--workers', type=int,
+                       help='Worker threads for detail page fetching (default: 4)')
+    parser.add_argument('--per-host', type=int,
+                       help='Maximum concurrent requests per host (default: 2)')
+    parser.add_argument('--engine', choices=['sync', 'async'], default='sync',
+                       help='Scraping engine: threaded requests or asyncio/aiohttp (default: sync)')
+    parser.add_argument('--incremental', metavar='PREVIOUS_EXPORT',
+                       help='Fetch detail pages only for products that are new or changed since '
+                            'this previous JSON/CSV export (implies --detailed)')
+    parser.add_argument('--cache', nargs='?', const='', metavar='DIR',
+                       help='Cache responses on disk and revalidate them with ETag/Last-Modified '
+                            '(default dir from config.json, else .http_cache)')
+    parser.add_argument('--parser', metavar='NAME',
+                       help='BeautifulSoup parser backend, e.g. lxml or html.parser (default from config.json)')
+    parser.add_argument('--restrict-parse', action='store_true', default=None,
+                       help='Parse only the product grid, pagination and product summary regions')
+    parser.add_argument('--discovery', choices=['pagination', 'sitemap'], default='pagination',
+                       help='Find products by following listing pages or by reading product sitemaps '
+                            '(sitemap implies full product pages; default: pagination)')
+    parser.add_argument('--store-api', action='store_true',
+                       help='Read products from the WooCommerce Store API when the shop exposes it, '
+                            'falling back to HTML scraping')
+    parser.add_argument('--no-structured-data', action='store_true',
+                       help='Read product pages with CSS selectors only, ignoring JSON-LD and microdata')
+    parser.add_argument('--extractor', choices=EXTRACTION_ENGINES,
+                       help='Product card extraction: per-field selector cascades or one pass over each card '
+                            '(default from config.json, else cascade)')
+    parser.add_argument('--checkpoint', nargs='?', const='', metavar='DIR',
+                       help='Save crawl progress after every listing page '
+                            '(default dir from config.json, else .checkpoint)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue an interrupted crawl from its checkpoint (implies --checkpoint)')
+    parser.add_argument('--processes', type=int, default=1,
+                       help='Worker processes sharing the crawl through a work queue (default: 1)')
+    parser.add_argument('--queue-db', metavar='FILE',
+                       help='Work queue database for --processes (default from config.json, else crawl_queue.sqlite)')
+    parser.add_argument('--batch', metavar='FILE',
+                       help='Scrape every shop listed in FILE (one URL per line, optionally followed by '
+                            'key=value overrides); the other options apply to every shop')
+    parser.add_argument('--batch-dir', metavar='DIR',
+                       help='Output directory for --batch (default from config.json, else batch_output)')
+    parser.add_argument('--batch-format', choices=['jsonl', 'json', 'csv', 'parquet', 'sqlite'],
+                       help='Output format of each shop in a batch (default from config.json, else jsonl)')
+    parser.add_argument('--max-concurrent', type=int, metavar='N',
+                       help='Concurrent requests across all shops of a batch (default from config.json, else 32)')
+    parser.add_argument('--parallel-shops', type=int, metavar='N',
+                       help='Shops of a batch crawled at the same time (default from config.json, else 16)')
+    parser.add_argument('--parse-processes', type=int, metavar='N',
+                       help='Parse pages in N worker processes while downloads continue '
+                            '(default from config.json, else 0: parse in the main process)')
+    parser.add_argument('--record-warc', metavar='FILE',
+                       help='Archive every request and response to a WARC file (gzipped if FILE ends in .gz)')
+    parser.add_argument('--replay-warc', metavar='FILE',
+                       help='Serve the whole crawl from a WARC file recorded with --record-warc, '
+                            'without network access')
+    parser.add_argument('--metrics-interval', type=float, metavar='SECONDS',
+                       help='Log runtime metrics as a JSON line every SECONDS '
+                            '(default from config.json, else 0: only at the end of the crawl)')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                       help='Serve runtime metrics in Prometheus text format at http://127.0.0.1:PORT/metrics '
+                            'while the crawl runs')
+    parser.add_argument('--profile', nargs='?', const='', metavar='PREFIX',
+                       help='Profile the crawl, writing PREFIX.folded (flame graph) or PREFIX.prof and a '
+                            'PREFIX_summary.json of time per function and selector misses '
+                            '(default prefix from config.json, else profile)')
+    parser.add_argument('--profile-mode', choices=['sample', 'deterministic'],
+                       help='Sample all thread stacks periodically or trace every call with cProfile '
+                            '(default from config.json, else sample)')
+                            
     args = parser.parse_args()
     
+    if args.record_warc and args.replay_warc:
+        logger.error("--record-warc and --replay-warc cannot be combined")
+        sys.exit(1)
+        
+    if args.batch:
+        if args.record_warc or args.replay_warc:
+            logger.warning("WARC recording and replay apply to single-shop crawls; ignoring them for --batch")
+        from batch import run_batch
+        summary = run_batch(args)
+        sys.exit(0 if summary and summary['failed'] < summary['shops'] else 1)
+        
     # Validate URL
     parsed_url = urlparse(args.url)
     if not parsed_url.scheme or not parsed_url.netloc:
@@ -657,30 +1559,137 @@ def main():
         sys.exit(1)
         
     # Initialize scraper
-    scraper = WooCommerceScraper(
-        base_url=args.url,
-        use_proxy=not args.no_proxy,
-        delay=args.delay
-    )
+    scraper_class = WooCommerceScraper
+    if args.engine == 'async':
+        from async_scraper import AsyncWooCommerceScraper
+        scraper_class = AsyncWooCommerceScraper
+        
+    try:
+        scraper = scraper_class(
+            base_url=args.url,
+            use_proxy=not args.no_proxy,
+            delay=args.delay,
+            max_workers=args.workers,
+            per_host_limit=args.per_host,
+            cache_dir=args.cache,
+            parser=args.parser,
+            restrict_parse=args.restrict_parse,
+            extraction_engine=args.extractor,
+            parse_processes=args.parse_processes
+        )
+    except ImportError as e:
+        logger.error(f"Scraping engine unavailable: {e}")
+        sys.exit(1)
     
+    if args.no_structured_data:
+        scraper.structured_data = False
+        
+    if args.incremental:
+        args.detailed = True
+        try:
+            scraper.load_previous_products(args.incremental)
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Cannot load previous export {args.incremental}: {e}")
+            sys.exit(1)
+            
+    if args.processes > 1 and args.engine == 'async':
+        logger.warning("--processes runs the threaded engine in every worker; ignoring --engine async")
+    if args.parse_processes and args.engine == 'async':
+        logger.warning("--parse-processes applies to the sync engine; the async engine parses in threads")
+        
+    try:
+        if args.replay_warc:
+            scraper.replay_warc(args.replay_warc)
+        elif args.record_warc and args.processes > 1:
+            logger.warning("--record-warc needs a single process; not recording")
+        elif args.record_warc:
+            scraper.record_warc(args.record_warc)
+    except (OSError, ValueError) as e:
+        logger.error(f"Cannot open WARC file: {e}")
+        sys.exit(1)
+        
+    # Runtime metrics as periodic JSON log lines and on a local endpoint
+    metrics_settings = scraper.config.get('metrics', {})
+    interval = args.metrics_interval if args.metrics_interval is not None else metrics_settings.get('log_interval', 0)
+    port = args.metrics_port if args.metrics_port is not None else metrics_settings.get('port')
+    reporter = MetricsReporter(scraper.runtime_metrics, interval) if interval and interval > 0 else None
+    metrics_server = None
+    if port is not None:
+        try:
+            metrics_server = MetricsServer(scraper.runtime_metrics, port, metrics_settings.get('host', '127.0.0.1'))
+        except OSError as e:
+            logger.error(f"Cannot serve metrics on port {port}: {e}")
+            
+    profiler = None
+    if args.profile is not None:
+        from profiling import CrawlProfiler, format_summary
+        profiling = scraper.config.get('profiling', {})
+        profiler = CrawlProfiler(args.profile or profiling.get('output', 'profile'),
+                                 args.profile_mode or profiling.get('mode', 'sample'),
+                                 profiling.get('interval_ms', 5) / 1000)
+        profiler.start()
+        
+    if (args.checkpoint is not None or args.resume) and args.processes <= 1:
+        checkpoint_dir = args.checkpoint or scraper.config.get('checkpoint', {}).get('directory', '.checkpoint')
+        scraper.use_checkpoint(checkpoint_dir, resume=args.resume)
+        
     try:
         # Scrape products
         logger.info(f"Starting scrape of {args.url}")
         if args.detailed:
             logger.info("Detailed scraping enabled - this will be slower but more comprehensive")
-        products = scraper.scrape_all_pages(args.url, max_pages=args.max_pages, fetch_detailed=args.detailed)
+        products = None
+        if args.store_api or scraper.config.get('store_api', {}).get('enabled'):
+            products = scraper.scrape_store_api(args.url, max_pages=args.max_pages)
+        if products is None and args.discovery == 'sitemap':
+            products = scraper.scrape_sitemaps(args.url)
+        if products is None and args.processes > 1:
+            from sharded_crawl import ShardedCrawl
+            crawl = ShardedCrawl(scraper, processes=args.processes, queue_path=args.queue_db)
+            products = crawl.iter_products(args.url, max_pages=args.max_pages, fetch_detailed=args.detailed,
+                                           resume=args.resume)
+            if not args.stream:
+                products = scraper.keep_products(products)
+                
+        if args.stream:
+            total = _stream_products(scraper, args, products)
+            if not total:
+                logger.warning("No products found")
+                return
+            if not args.quiet:
+                stats = scraper.get_statistics()
+                print("\n--- Scraping Statistics ---")
+                for key, value in stats.items():
+                    print(f"{key.replace('_', ' ').title()}: {value}")
+            logger.info(f"Scraping completed successfully. Found {total} products.")
+            return
+            
+        if products is None and args.engine == 'async':
+            products = asyncio.run(_scrape_async(scraper, args.url, args.max_pages, args.detailed))
+        elif products is None:
+            products = scraper.scrape_all_pages(args.url, max_pages=args.max_pages, fetch_detailed=args.detailed)
         
         if not products:
             logger.warning("No products found")
             return
             
         # Export data
-        if args.export_json or (not args.export_csv and not args.quiet):
+        if args.export_json or not (args.export_csv or args.export_jsonl or args.export_parquet
+                                    or args.export_sqlite or args.quiet):
             scraper.export_to_json(args.export_json)
             
         if args.export_csv:
             scraper.export_to_csv(args.export_csv)
             
+        if args.export_jsonl:
+            scraper.export_to_jsonl(args.export_jsonl)
+            
+        if args.export_parquet:
+            scraper.export_to_parquet(args.export_parquet, args.parquet_compression)
+            
+        if args.export_sqlite:
+            scraper.export_to_sqlite(args.export_sqlite)
+            
         # Print to console if not quiet
         if not args.quiet:
             if args.stats_only:
@@ -698,6 +1707,18 @@ def main():
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
         sys.exit(1)
+    finally:
+        if profiler:
+            try:
+                for line in format_summary(profiler.write(scraper)):
+                    logger.info(line)
+            except OSError as e:
+                logger.error(f"Cannot write profile: {e}")
+        scraper.close_archives()
+        if reporter:
+            reporter.stop()
+        if metrics_server:
+            metrics_server.close()
 
 # Simple usage example for backward compatibility
 def simple_scrape(url: str = "https://roostick.com/shop", detailed: bool = False):
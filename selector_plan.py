@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Compiled selector plans
+CSS selector cascades compiled once per scraper, with per-site promotion of the selector that matches
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import soupsieve as sv
+
+# Default selector cascades for product cards on listing pages
+DEFAULT_SELECTORS: Dict[str, List[str]] = {
+    'product_containers': [
+        'li.product',
+        '.wc-block-grid__product',
+        '.product-item',
+        '.woocommerce-product',
+        '.type-product',
+        '[class*="product"]',
+        '.product',
+        '.products li'
+    ],
+    'title': [
+        'h2.woocommerce-loop-product__title',
+        'h3.woocommerce-loop-product__title',
+        '.product-title',
+        '.wc-block-grid__product-title',
+        '.product-item-title',
+        'a'
+    ],
+    'price': [
+        'span.woocommerce-Price-amount',
+        '.woocommerce-Price-amount bdi',
+        '.price .amount',
+        '.price bdi',
+        '.price',
+        '.wc-block-grid__product-price',
+        '.product-price'
+    ],
+    'link': [
+        'a.woocommerce-LoopProduct-link',
+        'a.wc-block-grid__product-link',
+        '.product-item-link',
+        'h2 a',
+        'h3 a',
+        'a'
+    ],
+    'image': [
+        'img.attachment-woocommerce_thumbnail',
+        'img.wp-post-image',
+        '.wc-block-grid__product-image img',
+        '.product-image img',
+        'img'
+    ],
+    'description': [
+        '.woocommerce-product-details__short-description',
+        '.product-short-description',
+        '.entry-summary p',
+        '.product-excerpt',
+        '.product-description',
+        '.wc-product-description',
+        'p.product-excerpt',
+        '.summary .description',
+        '.product-summary p',
+        '[class*="description"]',
+        'p'
+    ],
+    'sku': [
+        '.sku',
+        '.product-sku',
+        '.woocommerce-product-sku',
+        '[class*="sku"]',
+        '.product-meta .sku',
+        '.product-code',
+        '[data-sku]'
+    ],
+    'stock': [
+        '.stock',
+        '.availability',
+        '.in-stock',
+        '.out-of-stock',
+        '.stock-status',
+        '.woocommerce-stock-status',
+        '[class*="stock"]',
+        '.product-stock',
+        '.inventory-status'
+    ],
+    'category': [
+        '.product-category',
+        '.category',
+        '.woocommerce-product-category',
+        '.product-cat',
+        '[class*="category"]',
+        '.breadcrumb a',
+        '.product-meta .category'
+    ],
+    'next_page': [
+        'a.next',
+        '.next-page a',
+        '.pagination .next',
+        '.woocommerce-pagination .next',
+        'a[aria-label="Next"]',
+        '.page-numbers.next'
+    ]
+}
+
+# Default selector cascades for individual product pages
+DEFAULT_DETAIL_SELECTORS: Dict[str, List[str]] = {
+    'title': [
+        'h1.product_title',
+        '.product_title',
+        '.entry-summary h1',
+        '.summary h1',
+        'h1'
+    ],
+    'price': [
+        '.summary .price .woocommerce-Price-amount',
+        '.entry-summary .price .woocommerce-Price-amount',
+        '.summary .price',
+        'p.price',
+        '.product-price'
+    ],
+    'image': [
+        '.woocommerce-product-gallery__image img',
+        '.woocommerce-product-gallery img',
+        'img.wp-post-image',
+        '.product-images img'
+    ],
+    'description': [
+        '.woocommerce-product-details__short-description',
+        '.product-short-description',
+        '.entry-summary .woocommerce-product-details__short-description',
+        '.summary .woocommerce-product-details__short-description',
+        '.entry-content p',
+        '.product-description',
+        '.short-description',
+        '.wc-tab-content p'
+    ],
+    'sku': [
+        '.sku',
+        '.product_meta .sku',
+        '.woocommerce-product-sku',
+        '.product-sku',
+        '[itemprop="sku"]'
+    ],
+    'stock': [
+        '.stock',
+        '.availability p',
+        '.woocommerce-stock-status',
+        '.in-stock',
+        '.out-of-stock',
+        '.stock-status'
+    ],
+    'category': [
+        '.woocommerce-breadcrumb a',
+        '.breadcrumb a',
+        '.product_meta .posted_in a',
+        '.product-category a',
+        '.entry-meta .category a'
+    ]
+}
+
+class FieldPlan:
+    """Compiled selector cascade for one field
+    
+    Selectors are tried in configured order until the first learn_samples
+    matches have been seen. The selector that won most of them is then
+    moved to the front, so later products try the known-good selector
+    first and only walk the rest of the cascade on a miss.
+    """
+    
+    def __init__(self, name: str, selectors: List[str], learn_samples: int = 5):
+        self.name = name
+        self.selectors = list(selectors)
+        self.compiled = [sv.compile(selector) for selector in self.selectors]
+        self.order = list(range(len(self.selectors)))
+        self.learn_samples = learn_samples
+        self.learned = learn_samples <= 0
+        
+        # Per-selector counters: how often each was evaluated and accepted
+        self.tries = [0] * len(self.selectors)
+        self.hits = [0] * len(self.selectors)
+        self.misses = 0
+        # Time spent walking the cascade, parse callbacks included
+        self.seconds = 0.0
+        self._wins = [0] * len(self.selectors)
+        self._samples = 0
+        self._lock = threading.Lock()
+        
+    def match(self, element, parse: Optional[Callable[[Any], Any]] = None,
+              many: bool = False) -> Tuple[Any, Optional[str]]:
+        """Return the first accepted value and the selector that produced it
+        
+        parse turns the matched element (or list of elements when many is
+        set) into a value; returning None rejects the match and moves on to
+        the next selector.
+        """
+        started = time.perf_counter()
+        for index in self.order:
+            self.tries[index] += 1
+            pattern = self.compiled[index]
+            found = pattern.select(element) if many else pattern.select_one(element)
+            value = self._accept(index, found, parse)
+            if value is not None:
+                self.seconds += time.perf_counter() - started
+                return value, self.selectors[index]
+                
+        self.misses += 1
+        self.seconds += time.perf_counter() - started
+        return None, None
+        
+    def choose(self, first_matches: Dict[int, Any], parse: Optional[Callable[[Any], Any]] = None) -> Any:
+        """Same as extract(), given each selector's first match collected in advance
+        
+        first_matches maps selector index to the first matching element; the
+        selectors are still consulted in priority order and learning applies.
+        """
+        started = time.perf_counter()
+        for index in self.order:
+            self.tries[index] += 1
+            value = self._accept(index, first_matches.get(index), parse)
+            if value is not None:
+                self.seconds += time.perf_counter() - started
+                return value
+                
+        self.misses += 1
+        self.seconds += time.perf_counter() - started
+        return None
+        
+    def extract(self, element, parse: Optional[Callable[[Any], Any]] = None, many: bool = False) -> Any:
+        """Return the first accepted value, or None when every selector misses"""
+        return self.match(element, parse, many)[0]
+        
+    def _accept(self, index: int, found, parse: Optional[Callable[[Any], Any]]) -> Any:
+        if not found:
+            return None
+        value = parse(found) if parse else found
+        if value is None:
+            return None
+        self.hits[index] += 1
+        if not self.learned:
+            self._record_win(index)
+        return value
+        
+    def matches(self, element) -> bool:
+        """Whether any selector matches, without touching the counters"""
+        return any(pattern.select_one(element) is not None for pattern in self.compiled)
+        
+    def _record_win(self, index: int):
+        with self._lock:
+            if self.learned:
+                return
+            self._wins[index] += 1
+            self._samples += 1
+            if self._samples >= self.learn_samples:
+                # Ties go to the selector configured first
+                winner = max(range(len(self._wins)), key=lambda i: (self._wins[i], -i))
+                self.order = [winner] + [i for i in range(len(self.selectors)) if i != winner]
+                self.learned = True
+                
+    @property
+    def preferred(self) -> Optional[str]:
+        """The selector tried first once learning has finished"""
+        return self.selectors[self.order[0]] if self.learned and self.order else None
+        
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {"selector": selector, "tries": self.tries[i], "hits": self.hits[i]}
+            for i, selector in enumerate(self.selectors)
+        ]
+
+class BoundPlan:
+    """A selector plan applied to one element, queried field by field"""
+    
+    def __init__(self, plan: "SelectorPlan", element):
+        self.plan = plan
+        self.element = element
+        
+    def extract(self, name: str, parse: Optional[Callable[[Any], Any]] = None, many: bool = False) -> Any:
+        return self.plan[name].extract(self.element, parse, many)
+        
+    def select_one(self, selector: str):
+        return self.element.select_one(selector)
+        
+class SelectorPlan:
+    """Compiled selector plans for every field of one page type"""
+    
+    def __init__(self, selectors: Dict[str, List[str]], learn_samples: int = 5):
+        self.fields = {name: FieldPlan(name, field_selectors, learn_samples)
+                       for name, field_selectors in selectors.items()}
+                       
+    @classmethod
+    def from_config(cls, defaults: Dict[str, List[str]], overrides: Optional[Dict[str, List[str]]],
+                    learn_samples: int = 5) -> "SelectorPlan":
+        """Compile the default cascades with any lists given in config.json"""
+        selectors = dict(defaults)
+        selectors.update(overrides or {})
+        return cls(selectors, learn_samples)
+        
+    def __getitem__(self, name: str) -> FieldPlan:
+        return self.fields[name]
+        
+    def bind(self, element) -> BoundPlan:
+        """Query fields of element one selector cascade at a time"""
+        return BoundPlan(self, element)
+        
+    def stats(self) -> Dict[str, Any]:
+        """Per-field selector try/hit counters, cascade time and the promoted selector"""
+        return {
+            name: {"preferred": field.preferred, "misses": field.misses, "seconds": round(field.seconds, 6),
+                   "selectors": field.stats()}
+            for name, field in self.fields.items()
+        }
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Sharded crawls
+A coordinator and worker processes sharing listing and product pages through a SQLite work queue
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from dataclasses import asdict
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from scraper import WooCommerceScraper, Product, ProductTally
+from work_queue import WorkQueue, SharedRateController, Task
+
+logger = logging.getLogger(__name__)
+
+def _open_queue(path: str, settings: Dict[str, Any]) -> WorkQueue:
+    return WorkQueue(path, lease_seconds=settings.get('lease_seconds', 120),
+                     max_attempts=settings.get('max_attempts', 3), wal=settings.get('wal', True))
+
+class ShardedCrawl:
+    """Runs a paginated crawl on several worker processes
+    
+    The coordinator seeds the queue with the start page and the scraper's
+    options, then collects products as workers store them; it is the only
+    writer of exports. Workers claim listing pages (which enqueue the next
+    page and, for detailed crawls, one task per product page) and product
+    pages, so parsing runs in parallel across processes while the shared
+    rate controller keeps each host's request rate global. Products arrive
+    in completion order rather than page order.
+    """
+    
+    def __init__(self, scraper: WooCommerceScraper, processes: int = 2, queue_path: Optional[str] = None):
+        self.scraper = scraper
+        self.processes = max(1, processes)
+        self.settings = scraper.config.get('sharding', {})
+        self.queue_path = queue_path or self.settings.get('queue_db', 'crawl_queue.sqlite')
+        
+    def _options(self, start_url: str, max_pages: int, fetch_detailed: bool) -> Dict[str, Any]:
+        """Everything a worker needs to rebuild an equivalent scraper"""
+        scraper = self.scraper
+        return {
+            'start_url': start_url,
+            'base_url': scraper.base_url,
+            'max_pages': max_pages,
+            'fetch_detailed': fetch_detailed,
+            'use_proxy': scraper.use_proxy,
+            'delay': scraper.delay,
+            'parser': scraper.parser,
+            'restrict_parse': scraper.restrict_parse,
+            'extraction_engine': scraper.extraction_engine,
+            'structured_data': scraper.structured_data,
+            'cache_dir': scraper.cache.directory if scraper.cache else None,
+            'previous_export': scraper.previous_export,
+            'replay_warc': scraper.replay.path if scraper.replay else None
+        }
+        
+    def iter_products(self, start_url: str, max_pages: int = 10, fetch_detailed: bool = False,
+                      resume: bool = False) -> Iterator[Product]:
+        """Yield products as the workers produce them
+        
+        With resume, an unfinished queue for the same start URL is picked up
+        where it stopped: stored products are replayed and only the
+        remaining tasks are run.
+        """
+        queue = _open_queue(self.queue_path, self.settings)
+        previous = queue.get_meta('options') if resume else None
+        if previous and previous.get('start_url') == start_url:
+            # Tasks of the interrupted run's workers would otherwise wait for their leases to expire
+            queue.release_running()
+            logger.info(f"Resuming sharded crawl from {self.queue_path}: {queue.counts()}")
+        else:
+            queue.reset()
+            queue.set_meta('options', self._options(start_url, max_pages, fetch_detailed))
+            queue.set_meta('settings', self.settings)
+            queue.put('listing', start_url, {'page_num': 1})
+            
+        context = multiprocessing.get_context('spawn')
+        workers = [
+            context.Process(target=run_worker, args=(self.queue_path, f"{socket.gethostname()}-{os.getpid()}-{i + 1}"),
+                            daemon=True)
+            for i in range(self.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        logger.info(f"Started {len(workers)} worker processes on queue {self.queue_path}")
+        
+        self.scraper.tally = ProductTally()
+        poll_interval = self.settings.get('poll_interval', 0.2)
+        last_id = 0
+        try:
+            while True:
+                # Checked before draining so nothing stored before completion is missed
+                finished = queue.finished()
+                batch = queue.results_after(last_id)
+                for last_id, row in batch:
+                    product = Product(**row)
+                    self.scraper.tally.add(product)
+                    yield product
+                if batch:
+                    continue
+                if finished:
+                    break
+                if not any(worker.is_alive() for worker in workers):
+                    logger.error(f"All workers exited with work left: {queue.counts()}")
+                    break
+                time.sleep(poll_interval)
+        finally:
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+            counts = queue.counts()
+            if counts['failed']:
+                logger.warning(f"{counts['failed']} tasks failed after {queue.max_attempts} attempts")
+            queue.close()
+            
+        self.scraper._log_summary(self.scraper.tally, fetch_detailed)
+        
+    def scrape_all_pages(self, start_url: str, max_pages: int = 10, fetch_detailed: bool = False,
+                         resume: bool = False) -> Sequence[Product]:
+        """Run the sharded crawl into scraper.products"""
+        return self.scraper.keep_products(self.iter_products(start_url, max_pages, fetch_detailed, resume))
+
+def _build_worker_scraper(queue: WorkQueue, options: Dict[str, Any]) -> WooCommerceScraper:
+    scraper = WooCommerceScraper(
+        options['base_url'],
+        use_proxy=options['use_proxy'],
+        delay=options['delay'],
+        max_workers=1,
+        cache_dir=options['cache_dir'],
+        parser=options['parser'],
+        restrict_parse=options['restrict_parse'],
+        extraction_engine=options['extraction_engine']
+    )
+    scraper.structured_data = options['structured_data']
+    if options.get('previous_export'):
+        scraper.load_previous_products(options['previous_export'])
+    if options.get('replay_warc'):
+        scraper.replay_warc(options['replay_warc'])
+    scraper.rate_limiter = SharedRateController(queue, options['delay'], scraper.config.get('rate_limit'))
+    return scraper
+
+def _run_listing(scraper: WooCommerceScraper, queue: WorkQueue, task: Task, options: Dict[str, Any]):
+    page_content = scraper._get_page_content(task.url)
+    if not page_content:
+        queue.fail(task, "Listing page could not be fetched")
+        return
+        
+    soup = scraper._parse_listing_html(page_content)
+    page_num = task.payload.get('page_num', 1)
+    products = scraper._extract_listing_products(soup)
+    new_tasks = []
+    next_url = scraper._find_next_page_url(soup)
+    if products and next_url and page_num < options['max_pages']:
+        new_tasks.append(('listing', next_url, {'page_num': page_num + 1}))
+    logger.info(f"Page {page_num}: {len(products)} products from {task.url}")
+    
+    if options['fetch_detailed']:
+        # Products needing their product page go back into the queue as separate tasks
+        targets = {id(product) for product in scraper._detail_targets(products)}
+        new_tasks.extend(('detail', product.link, asdict(product)) for product in products if id(product) in targets)
+        products = [product for product in products if id(product) not in targets]
+    queue.complete(task, [asdict(product) for product in products], new_tasks)
+
+def _run_detail(scraper: WooCommerceScraper, queue: WorkQueue, task: Task):
+    product = Product(**task.payload)
+    logger.info(f"Fetching detailed info from: {task.url}")
+    page_content = scraper._get_page_content(task.url)
+    if not page_content and task.attempts < queue.max_attempts:
+        queue.fail(task, "Product page could not be fetched")
+        return
+    # Only failed downloads are retried: a page without detail fields would parse the same way again.
+    # After the last attempt the product is kept with its listing fields only
+    detailed_info = scraper._parse_fetched_details(page_content) if page_content else None
+    if detailed_info:
+        scraper._merge_details(product, detailed_info)
+    queue.complete(task, [asdict(product)])
+
+def run_worker(queue_path: str, worker_id: Optional[str] = None):
+    """Claim and run tasks from the queue at queue_path until no work is left"""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    # The journal mode is kept in the database file, so the coordinator's choice applies here too
+    queue = WorkQueue(queue_path, wal=False)
+    options = queue.get_meta('options')
+    if not options:
+        logger.error(f"Queue {queue_path} has no crawl to work on")
+        return
+    settings = queue.get_meta('settings', {})
+    queue.lease_seconds = settings.get('lease_seconds', queue.lease_seconds)
+    queue.max_attempts = settings.get('max_attempts', queue.max_attempts)
+    
+    scraper = _build_worker_scraper(queue, options)
+    poll_interval = settings.get('poll_interval', 0.2)
+    completed = 0
+    try:
+        while True:
+            task = queue.claim(worker_id)
+            if task is None:
+                if queue.finished():
+                    break
+                time.sleep(poll_interval)
+                continue
+                
+            try:
+                if task.kind == 'listing':
+                    _run_listing(scraper, queue, task, options)
+                else:
+                    _run_detail(scraper, queue, task)
+                completed += 1
+            except Exception as e:
+                logger.error(f"Worker {worker_id} failed on {task.url}: {e}")
+                queue.fail(task, str(e))
+    finally:
+        queue.close()
+    logger.info(f"Worker {worker_id} finished after {completed} tasks")
+
+def main():
+    """Join a sharded crawl as an extra worker, e.g. from another node sharing the queue file"""
+    parser = argparse.ArgumentParser(description='Run a worker for a sharded crawl')
+    parser.add_argument('queue_db', help='Work queue database of the crawl')
+    parser.add_argument('--worker-id', help='Name recorded on claimed tasks (default: host-pid)')
+    args = parser.parse_args()
+    run_worker(args.queue_db, args.worker_id)
+
+if __name__ == "__main__":
+    main()
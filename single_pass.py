@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Single-pass product card extraction
+Collects the first match of every card selector in one walk over a product card's subtree
+"""
+
+import argparse
+import re
+import sys
+import time
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import soupsieve as sv
+from bs4 import Tag
+
+from selector_plan import SelectorPlan
+
+# Fields read from a product card; product_containers and next_page apply to whole pages
+CARD_FIELDS = ['title', 'price', 'link', 'image', 'description', 'sku', 'stock', 'category']
+
+_ATTRIBUTE = re.compile(r'\[\s*([^\s~|^$*!=\]]+)[^\]]*\]')
+_ATTRIBUTE_NAME = re.compile(r'\[([^\]]+)\]')
+_COMBINATOR = re.compile(r'\s*[>+~]\s*|\s+')
+_TAG = re.compile(r'^[a-zA-Z][\w-]*')
+_CLASS = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+_SIMPLE = re.compile(r'^(?:\.-?[_a-zA-Z][\w-]*|[a-zA-Z][\w-]*)$')
+
+def index_key(selector: str) -> Tuple[str, Optional[str]]:
+    """Return a ("class" | "tag" | "attr", value) key every element matching selector must have
+    
+    Only the rightmost compound selector is looked at. Selectors that are
+    too complex to index safely get ("any", None) and are tried on every
+    element.
+    """
+    if ',' in selector or '(' in selector or '\\' in selector:
+        return 'any', None
+    # Reduce attribute conditions to [name] so quoted spaces cannot split the selector
+    masked = _ATTRIBUTE.sub(lambda m: f'[{m.group(1)}]', selector.strip())
+    compound = _COMBINATOR.split(masked)[-1]
+    plain = _ATTRIBUTE_NAME.sub('', compound)
+    
+    classes = _CLASS.findall(plain)
+    if classes:
+        return 'class', classes[-1].lower()
+    tag = _TAG.match(plain)
+    if tag:
+        return 'tag', tag.group(0).lower()
+    attributes = _ATTRIBUTE_NAME.findall(compound)
+    if attributes:
+        return 'attr', attributes[0].lower()
+    return 'any', None
+    
+class VisitedCard:
+    """First matches collected from one product card, queried field by field"""
+    
+    def __init__(self, plan: SelectorPlan, first_matches: Dict[str, Dict[int, Tag]], extras: Dict[str, Tag]):
+        self.plan = plan
+        self.first_matches = first_matches
+        self.extras = extras
+        
+    def extract(self, name: str, parse: Optional[Callable[[Any], Any]] = None) -> Any:
+        return self.plan[name].choose(self.first_matches.get(name, {}), parse)
+        
+    def select_one(self, selector: str) -> Optional[Tag]:
+        return self.extras.get(selector)
+
+class SinglePassExtractor:
+    """Fills every card field from a single traversal of the card's subtree
+    
+    Each selector of each field is indexed by a class name, tag name or
+    attribute its matches must carry. Walking the card in document order,
+    an element is only tested against the selectors indexed under its own
+    tag, classes and attributes, and a selector stops being tested once it
+    has matched. Selectors that are a bare class or tag name match on the
+    index hit alone. The recorded first matches are exactly what
+    select_one() would return, so resolving them in the plan's priority
+    order gives the same result as the selector cascade.
+    """
+    
+    def __init__(self, plan: SelectorPlan, fields: Sequence[str] = CARD_FIELDS,
+                 extra_selectors: Sequence[str] = ()):
+        self.plan = plan
+        self._by_class: Dict[str, List[Tuple[Any, Any, Optional[str]]]] = {}
+        self._by_tag: Dict[str, List[Tuple[Any, Any, Optional[str]]]] = {}
+        self._by_attr: Dict[str, List[Tuple[Any, Any, Optional[str]]]] = {}
+        self._any: List[Tuple[Any, Any, Optional[str]]] = []
+        
+        entries = []
+        for name in fields:
+            field = plan[name]
+            for index, selector in enumerate(field.selectors):
+                entries.append(((name, index), selector, field.compiled[index]))
+        for selector in extra_selectors:
+            entries.append((selector, selector, sv.compile(selector)))
+            
+        for slot, selector, pattern in entries:
+            kind, value = index_key(selector)
+            # The exact name a bare class or tag selector needs, checked without soupsieve
+            literal = selector.lstrip('.') if _SIMPLE.match(selector) else None
+            entry = (slot, pattern, literal)
+            if kind == 'class':
+                self._by_class.setdefault(value, []).append(entry)
+            elif kind == 'tag':
+                self._by_tag.setdefault(value, []).append(entry)
+            elif kind == 'attr':
+                self._by_attr.setdefault(value, []).append(entry)
+            else:
+                self._any.append(entry)
+        self._slot_count = len(entries)
+        
+    def _candidates(self, node: Tag) -> List[Tuple[Any, Any]]:
+        """Selectors node could match, as (slot, pattern); pattern is None for a certain match"""
+        candidates = [(slot, pattern) for slot, pattern, _ in self._any]
+        for slot, pattern, literal in self._by_tag.get(node.name.lower(), ()):
+            candidates.append((slot, None if literal == node.name else pattern))
+        for attribute in node.attrs:
+            candidates.extend((slot, pattern) for slot, pattern, _ in self._by_attr.get(attribute.lower(), ()))
+        classes = node.get('class')
+        if classes:
+            if isinstance(classes, str):
+                classes = classes.split()
+            for class_name in classes:
+                for slot, pattern, literal in self._by_class.get(class_name.lower(), ()):
+                    candidates.append((slot, None if literal == class_name else pattern))
+        return candidates
+        
+    def visit(self, element) -> VisitedCard:
+        """Walk element's descendants once and record each selector's first match"""
+        found: Dict[Any, Tag] = {}
+        for node in element.descendants:
+            if not isinstance(node, Tag):
+                continue
+            for slot, pattern in self._candidates(node):
+                if slot not in found and (pattern is None or pattern.match(node)):
+                    found[slot] = node
+            if len(found) == self._slot_count:
+                break
+                
+        first_matches: Dict[str, Dict[int, Tag]] = {}
+        extras: Dict[str, Tag] = {}
+        for slot, node in found.items():
+            if isinstance(slot, tuple):
+                first_matches.setdefault(slot[0], {})[slot[1]] = node
+            else:
+                extras[slot] = node
+        return VisitedCard(self.plan, first_matches, extras)
+
+def main():
+    """Differential check: both extraction engines must agree on saved listing pages"""
+    parser = argparse.ArgumentParser(description='Compare cascade and single-pass extraction on saved listing pages')
+    parser.add_argument('pages', nargs='+', help='Saved listing page HTML files')
+    parser.add_argument('--base-url', default='https://example.com',
+                       help='Base URL used to resolve relative links (default: https://example.com)')
+    args = parser.parse_args()
+    
+    from scraper import WooCommerceScraper
+    cascade = WooCommerceScraper(args.base_url, use_proxy=False, extraction_engine='cascade')
+    single_pass = WooCommerceScraper(args.base_url, use_proxy=False, extraction_engine='single_pass')
+    
+    mismatches = 0
+    for path in args.pages:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            page_content = f.read()
+            
+        timings = []
+        results = []
+        for scraper in (cascade, single_pass):
+            soup = scraper._parse_listing_html(page_content)
+            started = time.perf_counter()
+            results.append([asdict(p) for p in scraper._extract_listing_products(soup)])
+            timings.append(time.perf_counter() - started)
+            
+        expected, actual = results
+        if expected == actual:
+            print(f"OK   {path}: {len(expected)} products, cascade {timings[0] * 1000:.1f} ms, "
+                  f"single-pass {timings[1] * 1000:.1f} ms")
+            continue
+            
+        mismatches += 1
+        print(f"DIFF {path}: cascade found {len(expected)} products, single-pass {len(actual)}")
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            for key in a:
+                if a[key] != b[key]:
+                    print(f"  product {i + 1} {key}: {a[key]!r} != {b[key]!r}")
+                    
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
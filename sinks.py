@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Streaming export sinks
+Write products to JSON Lines, CSV, a JSON array, Parquet or SQLite while the crawl is still running
+"""
+
+import csv
+import json
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import asdict
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# Columns with few distinct values, stored as dictionary indices in Parquet
+DICTIONARY_COLUMNS = ('stock_status', 'category')
+
+# Codecs accepted by ParquetSink; 'none' writes uncompressed pages
+PARQUET_COMPRESSION = ('zstd', 'snappy', 'gzip', 'brotli', 'lz4', 'none')
+
+class ProductSink:
+    """Buffers products and appends them to a file every batch_size products
+    
+    Memory use is bounded by the batch size, and everything written before
+    a crash is already on disk. Use as a context manager or call close().
+    """
+    
+    def __init__(self, filename: str, batch_size: int = 100):
+        self.filename = filename
+        self.batch_size = max(1, batch_size)
+        self.count = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._closed = False
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = self._open()
+        self._start()
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        
+    def write(self, product):
+        self._buffer.append(asdict(product))
+        self.count += 1
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+            
+    def write_many(self, products: Iterable):
+        for product in products:
+            self.write(product)
+            
+    def flush(self):
+        """Write buffered products and push them to the OS"""
+        if self._buffer:
+            self._write_rows(self._buffer)
+            self._buffer = []
+        if self._file:
+            self._file.flush()
+            
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        self._finish()
+        if self._file:
+            self._file.close()
+        logger.info(f"Streamed {self.count} products to {self.filename}")
+        
+    def _open(self):
+        return open(self.filename, 'w', newline='', encoding='utf-8')
+        
+    def _start(self):
+        pass
+        
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        raise NotImplementedError
+        
+    def _finish(self):
+        pass
+
+class JsonLinesSink(ProductSink):
+    """One JSON object per line"""
+    
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        self._file.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+
+class CsvSink(ProductSink):
+    """CSV with a header taken from the first product"""
+    
+    def _start(self):
+        self._writer: Optional[csv.DictWriter] = None
+        
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._file, fieldnames=rows[0].keys())
+            self._writer.writeheader()
+        self._writer.writerows(rows)
+
+class JsonArraySink(ProductSink):
+    """A JSON array in the export_to_json layout, kept valid once the sink is closed"""
+    
+    def _start(self):
+        self._file.write('[')
+        self._first = True
+        
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        parts = []
+        for row in rows:
+            item = json.dumps(row, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+            parts.append(('\n  ' if self._first else ',\n  ') + item)
+            self._first = False
+        self._file.write(''.join(parts))
+        
+    def _finish(self):
+        self._file.write('\n]' if not self._first else ']')
+
+class ParquetSink(ProductSink):
+    """Parquet file written one row group per batch
+    
+    Every column is a nullable string; DICTIONARY_COLUMNS are stored as
+    dictionary-encoded columns so repeated stock statuses and category
+    names take a few bits per row and load back as categoricals. The file
+    is only readable once the sink is closed and the footer is written.
+    """
+    
+    def __init__(self, filename: str, batch_size: int = 10000, compression: str = 'zstd'):
+        if pa is None:
+            raise ImportError("Parquet export requires pyarrow: pip install pyarrow")
+        if compression not in PARQUET_COMPRESSION:
+            raise ValueError(f"Unknown Parquet compression '{compression}', expected one of {', '.join(PARQUET_COMPRESSION)}")
+        self.compression = compression
+        super().__init__(filename, batch_size)
+        
+    def _open(self):
+        return None
+        
+    def _start(self):
+        self._writer: Optional["pq.ParquetWriter"] = None
+        self._schema: Optional["pa.Schema"] = None
+        
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        if self._writer is None:
+            self._schema = pa.schema([
+                (name, pa.dictionary(pa.int32(), pa.string()) if name in DICTIONARY_COLUMNS else pa.string())
+                for name in rows[0]
+            ])
+            self._writer = pq.ParquetWriter(
+                self.filename, self._schema,
+                compression=self.compression,
+                use_dictionary=[name for name in rows[0] if name in DICTIONARY_COLUMNS]
+            )
+        columns = {name: [row[name] for row in rows] for name in self._schema.names}
+        self._writer.write_table(pa.Table.from_pydict(columns, schema=self._schema))
+        
+    def _finish(self):
+        if self._writer is None:
+            # No products: still leave a valid, empty file behind
+            self._schema = pa.schema([])
+            self._writer = pq.ParquetWriter(self.filename, self._schema, compression=self.compression)
+        self._writer.close()
+        
+class SqliteSink(ProductSink):
+    """SQLite product store updated in place, one transaction per batch
+    
+    products holds the latest row per link; first_seen is kept across runs,
+    and a listing-only crawl does not erase the description, SKU or
+    category an earlier detailed crawl stored.
+    Every crawl adds a row to runs, and product_history gets a row whenever
+    a product is new or its price or stock status differs from the stored
+    one, so price and stock changes can be queried per run. Products
+    without a link cannot be keyed and are skipped.
+    """
+    
+    def __init__(self, filename: str, batch_size: int = 1000, source: Optional[str] = None):
+        self.source = source
+        self.skipped = 0
+        super().__init__(filename, batch_size)
+        
+    def _open(self):
+        return None
+        
+    def _start(self):
+        self._db = sqlite3.connect(self.filename)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT,
+                    started_at REAL NOT NULL,
+                    finished_at REAL,
+                    products INTEGER
+                )
+            """)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS products (
+                    link TEXT PRIMARY KEY,
+                    title TEXT,
+                    price TEXT,
+                    image_url TEXT,
+                    description TEXT,
+                    sku TEXT,
+                    stock_status TEXT,
+                    category TEXT,
+                    fingerprint TEXT,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    last_run INTEGER REFERENCES runs (id)
+                )
+            """)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS product_history (
+                    link TEXT NOT NULL,
+                    run_id INTEGER NOT NULL REFERENCES runs (id),
+                    observed_at REAL NOT NULL,
+                    price TEXT,
+                    stock_status TEXT
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_products_sku ON products (sku)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products (category)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_history_link ON product_history (link, observed_at)")
+            self.run_id = self._db.execute(
+                "INSERT INTO runs (source, started_at) VALUES (?, ?)", (self.source, time.time())
+            ).lastrowid
+            
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        now = time.time()
+        keyed = [row for row in rows if row.get('link') and row['link'] != 'N/A']
+        self.skipped += len(rows) - len(keyed)
+        
+        with self._db:
+            # History first: the comparison needs the values from before the upsert
+            self._db.executemany("""
+                INSERT INTO product_history (link, run_id, observed_at, price, stock_status)
+                SELECT ?, ?, ?, ?, ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM products WHERE link = ? AND price IS ? AND stock_status IS ?
+                )
+            """, [(row['link'], self.run_id, now, row.get('price'), row.get('stock_status'),
+                   row['link'], row.get('price'), row.get('stock_status')) for row in keyed])
+            self._db.executemany("""
+                INSERT INTO products (link, title, price, image_url, description, sku, stock_status,
+                                      category, fingerprint, first_seen, last_seen, last_run)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (link) DO UPDATE SET
+                    title = excluded.title, price = excluded.price, image_url = excluded.image_url,
+                    description = COALESCE(excluded.description, products.description),
+                    sku = COALESCE(excluded.sku, products.sku),
+                    stock_status = excluded.stock_status,
+                    category = COALESCE(excluded.category, products.category),
+                    fingerprint = excluded.fingerprint, last_seen = excluded.last_seen,
+                    last_run = excluded.last_run
+            """, [(row['link'], row.get('title'), row.get('price'), row.get('image_url'),
+                   row.get('description'), row.get('sku'), row.get('stock_status'), row.get('category'),
+                   row.get('fingerprint'), now, now, self.run_id) for row in keyed])
+            
+    def _finish(self):
+        with self._db:
+            self._db.execute("UPDATE runs SET finished_at = ?, products = ? WHERE id = ?",
+                             (time.time(), self.count - self.skipped, self.run_id))
+        self._db.close()
+        if self.skipped:
+            logger.warning(f"Skipped {self.skipped} products without a link in {self.filename}")
+            
+def open_sink(filename: str, options: Optional[Dict[str, Any]] = None, source: Optional[str] = None) -> ProductSink:
+    """Pick a sink by file extension: .jsonl/.ndjson, .csv, .parquet, .sqlite/.db, otherwise a JSON array
+    
+    options is the export_options section of config.json.
+    """
+    options = options or {}
+    batch_size = options.get('batch_size', 100)
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return JsonLinesSink(filename, batch_size)
+    if extension == '.csv':
+        return CsvSink(filename, batch_size)
+    if extension == '.parquet':
+        parquet = options.get('parquet', {})
+        return ParquetSink(filename, parquet.get('row_group_size', 10000), parquet.get('compression', 'zstd'))
+    if extension in ('.sqlite', '.sqlite3', '.db'):
+        return SqliteSink(filename, options.get('sqlite', {}).get('batch_size', 1000), source)
+    return JsonArraySink(filename, batch_size)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Sitemap-driven product discovery
+Finds product URLs through robots.txt, sitemap indexes and the product sitemaps WordPress SEO plugins generate
+"""
+
+import logging
+import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlparse, urljoin
+
+logger = logging.getLogger(__name__)
+
+# Sitemap locations tried when robots.txt does not list any
+DEFAULT_SITEMAP_PATHS = ['/sitemap_index.xml', '/wp-sitemap.xml', '/sitemap.xml']
+
+# Yoast and RankMath: product-sitemap.xml, product-sitemap2.xml; WordPress core: wp-sitemap-posts-product-1.xml
+PRODUCT_SITEMAP = re.compile(r'(^|/)(product-sitemap\d*|wp-sitemap-posts-product-\d+)\.xml(\.gz)?$', re.IGNORECASE)
+
+@dataclass
+class SitemapEntry:
+    """A <sitemap> or <url> entry with its optional last modification time"""
+    loc: str
+    lastmod: Optional[float] = None
+
+def parse_lastmod(value: Optional[str]) -> Optional[float]:
+    """Parse a W3C datetime (2024-05-01, 2024-05-01T10:00:00+00:00, ...Z) into a timestamp"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def robots_sitemaps(robots_text: str) -> List[str]:
+    """Sitemap URLs declared in a robots.txt"""
+    sitemaps = []
+    for line in robots_text.splitlines():
+        key, _, value = line.partition(':')
+        if key.strip().lower() == 'sitemap' and value.strip():
+            sitemaps.append(value.strip())
+    return sitemaps
+
+def parse_sitemap(xml_text: str) -> Tuple[List[SitemapEntry], List[SitemapEntry]]:
+    """Split a sitemap document into (child sitemaps, page URLs)"""
+    try:
+        root = ET.fromstring(xml_text.strip())
+    except ET.ParseError as e:
+        logger.warning(f"Invalid sitemap XML: {e}")
+        return [], []
+        
+    sitemaps, urls = [], []
+    for element in root:
+        kind = element.tag.rsplit('}', 1)[-1]
+        if kind not in ('sitemap', 'url'):
+            continue
+        loc = lastmod = None
+        for child in element:
+            name = child.tag.rsplit('}', 1)[-1]
+            if name == 'loc':
+                loc = (child.text or '').strip()
+            elif name == 'lastmod':
+                lastmod = parse_lastmod(child.text)
+        if loc:
+            (sitemaps if kind == 'sitemap' else urls).append(SitemapEntry(loc, lastmod))
+    return sitemaps, urls
+
+def is_product_sitemap(url: str) -> bool:
+    return bool(PRODUCT_SITEMAP.search(urlparse(url).path))
+
+class SitemapDiscovery:
+    """Streams product URLs from a shop's product sitemaps
+    
+    fetch(url) returns a document's text or None. Child sitemaps are
+    fetched on a pool of max_workers threads and their URLs are yielded as
+    soon as each one arrives, so detail fetching can start before the last
+    sitemap is read.
+    """
+    
+    def __init__(self, fetch: Callable[[str], Optional[str]], max_workers: int = 4):
+        self.fetch = fetch
+        self.max_workers = max(1, max_workers)
+        self.sitemaps_fetched = 0
+        
+    def sitemap_roots(self, base_url: str) -> List[str]:
+        """Sitemaps declared in robots.txt, or the usual WordPress locations"""
+        parsed = urlparse(base_url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        robots = self.fetch(origin + '/robots.txt')
+        roots = robots_sitemaps(robots) if robots else []
+        if roots:
+            logger.info(f"robots.txt lists {len(roots)} sitemap(s)")
+            return roots
+        return [origin + path for path in DEFAULT_SITEMAP_PATHS]
+        
+    def _read(self, url: str) -> Tuple[str, List[SitemapEntry], List[SitemapEntry]]:
+        text = self.fetch(url)
+        self.sitemaps_fetched += 1
+        if not text:
+            return url, [], []
+        sitemaps, urls = parse_sitemap(text)
+        # Relative locations are not allowed by the protocol but do occur
+        for entry in sitemaps + urls:
+            entry.loc = urljoin(url, entry.loc)
+        return url, sitemaps, urls
+        
+    def iter_product_urls(self, base_url: str) -> Iterator[SitemapEntry]:
+        """Yield each product URL once, in the order product sitemaps arrive"""
+        seen_maps: Set[str] = set()
+        seen_urls: Set[str] = set()
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = set()
+            for root in self.sitemap_roots(base_url):
+                if root not in seen_maps:
+                    seen_maps.add(root)
+                    pending.add(executor.submit(self._read, root))
+                    
+            while pending:
+                future = next(as_completed(pending))
+                pending.discard(future)
+                url, sitemaps, urls = future.result()
+                
+                for child in sitemaps:
+                    # Follow product sitemaps and nested indexes only
+                    if child.loc in seen_maps:
+                        continue
+                    if is_product_sitemap(child.loc) or 'index' in urlparse(child.loc).path.lower():
+                        seen_maps.add(child.loc)
+                        pending.add(executor.submit(self._read, child.loc))
+                        
+                if not is_product_sitemap(url):
+                    continue
+                logger.info(f"Product sitemap {url}: {len(urls)} URLs")
+                for entry in urls:
+                    if entry.loc not in seen_urls:
+                        seen_urls.add(entry.loc)
+                        yield entry
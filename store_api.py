@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+WooCommerce Store API support
+Maps the public /wp-json/wc/store/v1/products endpoint onto Product records
+"""
+
+import html
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+STORE_API_PATH = '/wp-json/wc/store/v1/products'
+
+# Listing URLs the unfiltered product endpoint cannot reproduce
+FILTERED_LISTING = re.compile(r'/(product-category|product-tag|product-brand)/|[?&](s|product_cat|product_tag)=')
+
+_TAGS = re.compile(r'<[^>]+>')
+_SPACES = re.compile(r'\s+')
+
+def store_api_endpoints(base_url: str) -> List[str]:
+    """Candidate product endpoints: pretty permalinks first, then the rest_route form"""
+    parsed = urlparse(base_url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+    return [origin + STORE_API_PATH, f"{origin}/?rest_route=/wc/store/v1/products"]
+
+def format_price(prices: Dict[str, Any]) -> str:
+    """Format a Store API price given in minor units the way the shop displays it"""
+    amount = prices.get('price')
+    if amount in (None, ''):
+        return "N/A"
+    minor_unit = int(prices.get('currency_minor_unit', 2))
+    value = int(amount) / (10 ** minor_unit)
+    
+    number = f"{value:,.{minor_unit}f}"
+    thousand = prices.get('currency_thousand_separator', ',')
+    decimal = prices.get('currency_decimal_separator', '.')
+    number = number.replace(',', '\x00').replace('.', decimal).replace('\x00', thousand)
+    
+    prefix = prices.get('currency_prefix', prices.get('currency_symbol', ''))
+    suffix = prices.get('currency_suffix', '')
+    return html.unescape(f"{prefix}{number}{suffix}")
+
+def _plain_text(markup: Optional[str]) -> str:
+    return _SPACES.sub(' ', html.unescape(_TAGS.sub(' ', markup or ''))).strip()
+
+def stock_status(item: Dict[str, Any]) -> Optional[str]:
+    if item.get('is_on_backorder'):
+        return 'On Backorder'
+    if 'is_in_stock' in item:
+        return 'In Stock' if item['is_in_stock'] else 'Out of Stock'
+    return None
+
+def product_fields(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Product field values from one Store API product object"""
+    images = item.get('images') or []
+    categories = item.get('categories') or []
+    
+    description = _plain_text(item.get('short_description')) or _plain_text(item.get('description'))
+    category = html.unescape(categories[0].get('name') or '') if categories else ''
+    
+    return {
+        'title': html.unescape(item.get('name') or '') or "N/A",
+        'price': format_price(item.get('prices') or {}),
+        'link': item.get('permalink') or "N/A",
+        'image_url': (images[0].get('thumbnail') or images[0].get('src') or "N/A") if images else "N/A",
+        'description': description[:500] if len(description) > 10 else None,
+        'sku': item.get('sku') or None,
+        'stock_status': stock_status(item),
+        'category': category or None
+    }
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Structured product data
+Reads JSON-LD and microdata from product pages with regular expressions, without building a DOM
+"""
+
+import html
+import json
+import logging
+import re
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_JSON_LD = re.compile(
+    r'<script\b[^>]*\btype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL
+)
+_ITEMPROP_TAG = re.compile(r'<(?:meta|link)\b[^>]*\bitemprop\s*=[^>]*>', re.IGNORECASE)
+_ATTRIBUTE = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+_TAGS = re.compile(r'<[^>]+>')
+_SPACES = re.compile(r'\s+')
+
+# schema.org ItemAvailability values mapped onto the scraper's stock statuses
+AVAILABILITY = {
+    'instock': 'In Stock',
+    'limitedavailability': 'In Stock',
+    'instoreonly': 'In Stock',
+    'onlineonly': 'In Stock',
+    'outofstock': 'Out of Stock',
+    'soldout': 'Out of Stock',
+    'discontinued': 'Out of Stock',
+    'backorder': 'On Backorder',
+    'preorder': 'On Backorder',
+    'presale': 'On Backorder'
+}
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ''
+    return _SPACES.sub(' ', html.unescape(_TAGS.sub(' ', str(value)))).strip()
+
+def _types(node: Dict[str, Any]) -> List[str]:
+    types = node.get('@type', [])
+    return [types] if isinstance(types, str) else list(types)
+
+def iter_json_ld(page_content: str) -> Iterator[Dict[str, Any]]:
+    """Yield every JSON-LD object on the page, flattening lists and @graph"""
+    for match in _JSON_LD.finditer(page_content):
+        raw = match.group(1).strip()
+        if raw.startswith('<!--'):
+            raw = raw[4:].rsplit('-->', 1)[0]
+        try:
+            data = json.loads(raw, strict=False)
+        except ValueError as e:
+            logger.debug(f"Skipping invalid JSON-LD block: {e}")
+            continue
+            
+        stack = [data]
+        while stack:
+            item = stack.pop(0)
+            if isinstance(item, list):
+                stack[:0] = item
+            elif isinstance(item, dict):
+                graph = item.get('@graph')
+                if isinstance(graph, list):
+                    stack[:0] = graph
+                yield item
+
+def availability_status(value: Any) -> Optional[str]:
+    """Map a schema.org availability URL or name onto In Stock / Out of Stock / On Backorder"""
+    if not value:
+        return None
+    name = str(value).rstrip('/').rsplit('/', 1)[-1].lower()
+    return AVAILABILITY.get(name)
+
+def _first_offer(offers: Any) -> Dict[str, Any]:
+    if isinstance(offers, list):
+        offers = offers[0] if offers else {}
+    return offers if isinstance(offers, dict) else {}
+
+def _offer_price(offer: Dict[str, Any]) -> Optional[str]:
+    price = offer.get('price', offer.get('lowPrice'))
+    currency = offer.get('priceCurrency')
+    specification = offer.get('priceSpecification')
+    if price in (None, '') and specification:
+        specification = _first_offer(specification)
+        price = specification.get('price')
+        currency = currency or specification.get('priceCurrency')
+    if price in (None, ''):
+        return None
+    return f"{price} {currency}" if currency else str(price)
+
+def _image(value: Any) -> Optional[str]:
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get('url') or value.get('contentUrl')
+    return value or None
+
+def _breadcrumb_category(node: Dict[str, Any], product_url: Optional[str]) -> Optional[str]:
+    """Name of the deepest linked breadcrumb, i.e. the product's direct category"""
+    items = [item for item in node.get('itemListElement') or [] if isinstance(item, dict)]
+    items.sort(key=lambda item: item.get('position') or 0)
+    
+    category = None
+    for item in items:
+        target = item.get('item')
+        url = target.get('@id') if isinstance(target, dict) else target
+        name = item.get('name') or (target.get('name') if isinstance(target, dict) else None)
+        if not url or not name or url == product_url:
+            continue
+        name = _text(name)
+        if name.lower() not in ['home', 'shop', 'trang chủ']:
+            category = name
+    return category
+
+def json_ld_details(page_content: str) -> Dict[str, str]:
+    """Product fields found in the page's JSON-LD Product, Offer and BreadcrumbList data"""
+    product = None
+    breadcrumb = None
+    for node in iter_json_ld(page_content):
+        types = _types(node)
+        if product is None and ('Product' in types or 'ProductGroup' in types):
+            product = node
+        elif breadcrumb is None and 'BreadcrumbList' in types:
+            breadcrumb = node
+            
+    details = {}
+    if product:
+        title = _text(product.get('name'))
+        if title:
+            details['title'] = title
+            
+        offer = _first_offer(product.get('offers'))
+        price = _offer_price(offer)
+        if price:
+            details['price'] = price
+        stock_status = availability_status(offer.get('availability'))
+        if stock_status:
+            details['stock_status'] = stock_status
+            
+        image_url = _image(product.get('image'))
+        if image_url:
+            details['image_url'] = image_url
+            
+        description = _text(product.get('description'))
+        if len(description) > 10:
+            details['description'] = description[:500]
+            
+        sku = _text(product.get('sku'))
+        if sku:
+            details['sku'] = sku
+            
+    if breadcrumb:
+        product_url = (product or {}).get('url') or (product or {}).get('@id')
+        category = _breadcrumb_category(breadcrumb, product_url)
+        if category:
+            details['category'] = category
+    return details
+
+def microdata_details(page_content: str) -> Dict[str, str]:
+    """Product fields carried by <meta>/<link> itemprop tags (schema.org microdata)"""
+    props: Dict[str, str] = {}
+    for tag in _ITEMPROP_TAG.finditer(page_content):
+        attributes = {}
+        for name, double_quoted, single_quoted, bare in _ATTRIBUTE.findall(tag.group(0)):
+            attributes[name.lower()] = double_quoted or single_quoted or bare
+        prop = attributes.get('itemprop')
+        value = attributes.get('content') or attributes.get('href')
+        if prop and value and prop not in props:
+            props[prop] = html.unescape(value.strip())
+            
+    details = {}
+    if props.get('sku'):
+        details['sku'] = props['sku']
+    price = props.get('price') or props.get('lowPrice')
+    if price:
+        details['price'] = f"{price} {props['priceCurrency']}" if props.get('priceCurrency') else price
+    stock_status = availability_status(props.get('availability'))
+    if stock_status:
+        details['stock_status'] = stock_status
+    if props.get('image'):
+        details['image_url'] = props['image']
+    return details
+
+def structured_details(page_content: str) -> Dict[str, str]:
+    """Product fields from JSON-LD, completed by microdata for anything JSON-LD lacks"""
+    details = json_ld_details(page_content)
+    if not all(field in details for field in ('price', 'sku', 'stock_status', 'image_url')):
+        for field, value in microdata_details(page_content).items():
+            details.setdefault(field, value)
+    return details
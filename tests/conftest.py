@@ -0,0 +1,8 @@
+"""Make the scraper modules and the stand-in shop in benchmarks/ importable from the tests"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+sys.path.insert(0, ROOT)
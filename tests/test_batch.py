@@ -0,0 +1,22 @@
+"""Tests of batch crawls under the FairScheduler"""
+
+from batch import BatchRunner, Shop
+from scraper import load_config
+from shop_server import StandInShop
+
+def test_throttled_shop_does_not_hold_back_the_others(tmp_path):
+    # Every request to the throttled shop gets 429 with Retry-After: 1
+    throttled = StandInShop(pages=1, products_per_page=4, padding_kb=0, throttle_rate=1.0, retry_after=1)
+    healthy = StandInShop(pages=6, products_per_page=4, padding_kb=0)
+    with throttled, healthy:
+        runner = BatchRunner(output_dir=str(tmp_path), max_concurrent=1, per_host=1, parallel_shops=2,
+                             defaults={'max_pages': 6, 'delay': 0.01}, use_proxy=False, config=load_config())
+        summary = runner.run([Shop(throttled.base_url + '/shop/'), Shop(healthy.base_url + '/shop/')])
+    
+    throttled_result, healthy_result = summary['results']
+    assert throttled_result['status'] == 'empty'
+    assert healthy_result['status'] == 'ok'
+    assert healthy_result['products'] == 24
+    # The single request slot is not held while the throttled shop sleeps out its Retry-After blocks
+    assert throttled_result['seconds'] >= 2
+    assert healthy_result['seconds'] < 1.5
@@ -0,0 +1,45 @@
+"""Differential test: the cascade and single-pass engines must extract identical products"""
+
+import glob
+import os
+from dataclasses import asdict
+
+import pytest
+
+from scraper import WooCommerceScraper, load_config
+from themes import THEMES, build_site
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE_URL = 'https://shop.example.com'
+
+def _saved_pages(theme):
+    """Listing pages of a theme saved under fixtures/, in page order"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, f'listing_{theme}_*.html'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+def _generated_pages(theme):
+    listing, _, _ = build_site(theme, 3, 10, base_url=BASE_URL, padding_kb=1)
+    return list(listing.values())
+
+def _extract(engine, learn_samples, pages):
+    """Products of every page, extracted by one scraper so selector learning carries across pages"""
+    config = dict(load_config(os.path.join(ROOT, 'config.json')), selector_learning={'samples': learn_samples})
+    scraper = WooCommerceScraper(BASE_URL, use_proxy=False, extraction_engine=engine, config=config)
+    return [[asdict(product) for product in scraper._extract_listing_products(scraper._parse_listing_html(page))]
+            for page in pages]
+
+@pytest.mark.parametrize('source', [_saved_pages, _generated_pages], ids=['saved', 'generated'])
+@pytest.mark.parametrize('learn_samples', [5, 0], ids=['learning', 'no-learning'])
+@pytest.mark.parametrize('theme', THEMES)
+def test_single_pass_matches_cascade(theme, learn_samples, source):
+    pages = source(theme)
+    assert pages
+    
+    cascade = _extract('cascade', learn_samples, pages)
+    single_pass = _extract('single_pass', learn_samples, pages)
+    assert all(cascade), "every page should yield products"
+    assert single_pass == cascade
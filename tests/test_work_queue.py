@@ -0,0 +1,44 @@
+"""Tests of the SQLite work queue behind sharded crawls"""
+
+import time
+
+from work_queue import WorkQueue
+
+def _expire_lease(queue: WorkQueue):
+    """Let the lease of every running task run out, as if its worker had died"""
+    with queue._write() as db:
+        db.execute("UPDATE tasks SET leased_until = ? WHERE status = 'running'", (time.time() - 1,))
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'), max_attempts=3)
+    queue.put('detail', 'https://shop.example/product/a')
+    
+    first = queue.claim('worker-1')
+    assert queue.claim('worker-2') is None
+    _expire_lease(queue)
+    second = queue.claim('worker-2')
+    assert second.id == first.id
+    assert second.attempts == 2
+    queue.close()
+
+def test_task_fails_after_max_attempts_expired_leases(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'), max_attempts=3)
+    queue.put('detail', 'https://shop.example/product/hangs')
+    queue.put('detail', 'https://shop.example/product/ok')
+    
+    claimed = []
+    for _ in range(10):
+        task = queue.claim('worker')
+        if task is None:
+            break
+        if task.url.endswith('/ok'):
+            queue.complete(task)
+            continue
+        # The worker hangs or crashes on this page every time
+        claimed.append(task.attempts)
+        _expire_lease(queue)
+    
+    assert claimed == [1, 2, 3]
+    assert queue.counts() == {'pending': 0, 'running': 0, 'done': 1, 'failed': 1}
+    assert queue.finished()
+    queue.close()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+WARC record and replay
+Archives every HTTP exchange of a crawl to a (gzipped) WARC file and serves a crawl back from one
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from requests.structures import CaseInsensitiveDict
+
+from http_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+WARC_VERSION = b'WARC/1.0'
+# Bodies are stored decoded, so these no longer describe them
+DROPPED_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+MAX_REDIRECTS = 10
+REDIRECT_STATUS_CODES = (301, 302, 303, 307, 308)
+# Bytes read at a time while indexing a compressed archive
+SCAN_CHUNK = 1 << 20
+
+def _warc_date() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _record_id() -> str:
+    return f"<urn:uuid:{uuid.uuid4()}>"
+
+def _digest(data: bytes) -> str:
+    return 'sha1:' + base64.b32encode(hashlib.sha1(data).digest()).decode('ascii')
+
+def _header_block(headers: List[Tuple[str, str]]) -> bytes:
+    return ''.join(f"{name}: {value}\r\n" for name, value in headers).encode('utf-8', 'replace')
+
+def _header_items(headers: Any) -> List[Tuple[str, str]]:
+    """(name, value) pairs of a requests, aiohttp or plain mapping of headers, repeated names kept"""
+    if hasattr(headers, 'items'):
+        return [(str(name), str(value)) for name, value in headers.items()]
+    return [(str(name), str(value)) for name, value in headers or ()]
+
+@dataclass
+class ArchivedResponse:
+    """A response read back from the archive, answering like a requests.Response"""
+    url: str
+    status_code: int
+    reason: str
+    headers: CaseInsensitiveDict
+    content: bytes
+    
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+    
+    @property
+    def encoding(self) -> str:
+        content_type = self.headers.get('Content-Type', '')
+        for part in content_type.split(';')[1:]:
+            name, _, value = part.partition('=')
+            if name.strip().lower() == 'charset' and value.strip():
+                return value.strip().strip('"\'')
+        return 'utf-8'
+    
+    @property
+    def text(self) -> str:
+        try:
+            return self.content.decode(self.encoding, errors='replace')
+        except LookupError:
+            return self.content.decode('utf-8', errors='replace')
+    
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+class WarcWriter:
+    """Appends request and response records to a WARC file, one gzip member per record
+    
+    Per-record compression is what WARC readers expect of .warc.gz files and
+    lets the replay index seek straight to a record. A path not ending in
+    .gz is written uncompressed. Records are flushed as they are written,
+    so an interrupted crawl leaves a readable archive. Response bodies are
+    stored decoded (after Content-Encoding), with their length headers
+    rewritten to match.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.compress = path.endswith('.gz')
+        self.records = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab')
+        info = _header_block([('software', 'woocommerce-scraper'), ('format', 'WARC File Format 1.0')])
+        self._write([('WARC-Type', 'warcinfo'), ('WARC-Filename', os.path.basename(path)),
+                     ('Content-Type', 'application/warc-fields')], info)
+        logger.info(f"Recording responses to {path}")
+    
+    def _write(self, headers: List[Tuple[str, str]], block: bytes, record_id: Optional[str] = None):
+        headers = [('WARC-Record-ID', record_id or _record_id()), ('WARC-Date', _warc_date())] + headers
+        headers.append(('Content-Length', str(len(block))))
+        record = WARC_VERSION + b'\r\n' + _header_block(headers) + b'\r\n' + block + b'\r\n\r\n'
+        if self.compress:
+            record = gzip.compress(record, compresslevel=6)
+        with self._lock:
+            self._file.write(record)
+            self._file.flush()
+            self.records += 1
+    
+    def write_exchange(self, url: str, status: int, reason: str, headers: Any, body: bytes,
+                       request_headers: Any = None, method: str = 'GET'):
+        """Write the response record for url and the request record that produced it"""
+        response_headers = [(name, value) for name, value in _header_items(headers)
+                            if name.lower() not in DROPPED_HEADERS]
+        response_headers.append(('Content-Length', str(len(body))))
+        http_response = (f"HTTP/1.1 {status} {reason or ''}".rstrip().encode('ascii') + b'\r\n' +
+                         _header_block(response_headers) + b'\r\n' + body)
+        response_id = _record_id()
+        self._write([('WARC-Type', 'response'), ('WARC-Target-URI', url),
+                     ('WARC-Payload-Digest', _digest(body)),
+                     ('Content-Type', 'application/http; msgtype=response')], http_response, response_id)
+        
+        target = url.split('://', 1)[-1]
+        path = '/' + target.split('/', 1)[1] if '/' in target else '/'
+        http_request = (f"{method} {path} HTTP/1.1".encode('utf-8') + b'\r\n' +
+                        _header_block(_header_items(request_headers)) + b'\r\n')
+        self._write([('WARC-Type', 'request'), ('WARC-Concurrent-To', response_id),
+                     ('WARC-Target-URI', url), ('Content-Type', 'application/http; msgtype=request')],
+                    http_request)
+    
+    def record(self, response):
+        """Archive a requests.Response, including the redirects that led to it"""
+        for hop in list(response.history) + [response]:
+            request_headers = hop.request.headers if hop.request is not None else None
+            self.write_exchange(hop.url, hop.status_code, hop.reason, hop.headers, hop.content, request_headers)
+    
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+        logger.info(f"Recorded {self.records} WARC records to {self.path}")
+
+def _parse_record(data: bytes) -> Tuple[Dict[str, str], bytes]:
+    """WARC headers (lower-case names) and content block of one record"""
+    head, _, rest = data.partition(b'\r\n\r\n')
+    lines = head.decode('utf-8', 'replace').split('\r\n')
+    if not lines[0].startswith('WARC/'):
+        raise ValueError(f"Not a WARC record: {lines[0][:40]!r}")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', len(rest)))
+    return headers, rest[:length]
+
+def _parse_http_response(url: str, block: bytes) -> ArchivedResponse:
+    head, _, body = block.partition(b'\r\n\r\n')
+    lines = head.decode('iso-8859-1').split('\r\n')
+    status_line = lines[0].split(' ', 2)
+    headers = CaseInsensitiveDict()
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        name = name.strip()
+        # Repeated headers are folded the way requests does
+        headers[name] = f"{headers[name]}, {value.strip()}" if name in headers else value.strip()
+    return ArchivedResponse(url=url, status_code=int(status_line[1]),
+                            reason=status_line[2] if len(status_line) > 2 else '', headers=headers, content=body)
+
+def _status_rank(status: int) -> int:
+    """Preference of an archived status when a URL was fetched more than once: full responses first"""
+    if 200 <= status < 300:
+        return 0
+    return 1 if status < 400 else 2
+
+class WarcReplay:
+    """Serves responses from a WARC file by URL, with no network access
+    
+    Opening the archive reads it once to index the response records by
+    normalized URL, keeping file offsets rather than bodies; each lookup
+    then reads just its record. When a URL was archived several times the
+    latest response wins, except that a redirect, 304 or error never
+    hides an earlier full response. Redirects are followed within the archive.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'rb')
+        self.compressed = self._file.read(2) == b'\x1f\x8b'
+        self._file.seek(0)
+        # normalized URL -> (offset, length, status)
+        self._index: Dict[str, Tuple[int, int, int]] = {}
+        self.stats = {'hits': 0, 'misses': 0}
+        records = 0
+        for offset, length, data in self._scan():
+            records += 1
+            headers, block = _parse_record(data)
+            if headers.get('warc-type') != 'response' or 'warc-target-uri' not in headers:
+                continue
+            status = int(block.split(b' ', 2)[1]) if block.startswith(b'HTTP/') else 0
+            key = normalize_url(headers['warc-target-uri'])
+            previous = self._index.get(key)
+            if previous is None or _status_rank(status) <= _status_rank(previous[2]):
+                self._index[key] = (offset, length, status)
+        logger.info(f"Replaying {len(self._index)} URLs from {path} ({records} records)")
+    
+    def _scan(self) -> Iterator[Tuple[int, int, bytes]]:
+        """(offset, stored length, record bytes) of every record in the file, one record in memory at a time"""
+        self._file.seek(0)
+        if not self.compressed:
+            position = 0
+            while True:
+                head = line = self._file.readline()
+                if not line:
+                    return
+                while line not in (b'\r\n', b''):
+                    line = self._file.readline()
+                    head += line
+                headers, _ = _parse_record(head)
+                length = len(head) + int(headers.get('content-length', 0)) + 4
+                self._file.seek(position)
+                yield position, length, self._file.read(length)
+                position += length
+        
+        position = 0
+        pending = b''
+        while True:
+            decompressor = zlib.decompressobj(wbits=31)
+            parts = []
+            consumed = 0
+            data = pending
+            while not decompressor.eof:
+                if not data:
+                    data = self._file.read(SCAN_CHUNK)
+                    if not data:
+                        if consumed:
+                            logger.warning(f"Truncated record at offset {position} in {self.path}")
+                        return
+                parts.append(decompressor.decompress(data))
+                consumed += len(data) - len(decompressor.unused_data)
+                data = decompressor.unused_data
+            pending = data
+            yield position, consumed, b''.join(parts)
+            position += consumed
+    
+    def __len__(self) -> int:
+        return len(self._index)
+    
+    def __contains__(self, url: str) -> bool:
+        return normalize_url(url) in self._index
+    
+    def urls(self) -> List[str]:
+        return list(self._index)
+    
+    def _read(self, url: str) -> Optional[ArchivedResponse]:
+        entry = self._index.get(normalize_url(url))
+        if entry is None:
+            return None
+        offset, length, _ = entry
+        with self._lock:
+            self._file.seek(offset)
+            data = self._file.read(length)
+        if self.compressed:
+            data = gzip.decompress(data)
+        headers, block = _parse_record(data)
+        return _parse_http_response(headers['warc-target-uri'], block)
+    
+    def get(self, url: str) -> Optional[ArchivedResponse]:
+        """The archived response for url after following archived redirects; None if it was never fetched"""
+        response = self._read(url)
+        for _ in range(MAX_REDIRECTS):
+            if response is None or response.status_code not in REDIRECT_STATUS_CODES:
+                break
+            location = response.headers.get('Location')
+            if not location:
+                break
+            response = self._read(urljoin(response.url, location))
+        with self._lock:
+            self.stats['misses' if response is None else 'hits'] += 1
+        return response
+    
+    def close(self):
+        with self._lock:
+            self._file.close()
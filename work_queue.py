@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+SQLite work queue for sharded crawls
+Listing and product page tasks, their results and per-host request pacing shared by every worker process
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from rate_limiter import RateController, THROTTLE_STATUS_CODES, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Task:
+    """A claimed unit of work: one listing page or one product page"""
+    id: int
+    kind: str
+    url: str
+    payload: Dict[str, Any]
+    attempts: int
+
+class WorkQueue:
+    """Tasks, results and host pacing in one SQLite database
+    
+    Any number of processes may open the same file. A task is claimed under
+    a lease; if its worker dies, the task becomes claimable again once the
+    lease runs out, up to max_attempts claims in all. Completing a task
+    stores its products and enqueues the tasks it discovered in the same
+    transaction, so work is neither lost nor duplicated. WAL mode needs all
+    processes on one machine; for workers on several nodes sharing a
+    network filesystem, open the queue with wal=False.
+    """
+    
+    def __init__(self, path: str, lease_seconds: float = 120, max_attempts: int = 3, wal: bool = True):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            
+        self._lock = threading.Lock()
+        # Transactions are managed explicitly so claims can take the write lock up front
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        if wal:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                leased_until REAL,
+                error TEXT,
+                UNIQUE (kind, url)
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, kind, id);
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id INTEGER NOT NULL,
+                product TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS hosts (
+                host TEXT PRIMARY KEY,
+                next_at REAL NOT NULL,
+                rate REAL
+            );
+        """)
+        
+    def _write(self):
+        """Context for a write transaction that takes the database lock immediately"""
+        return _Transaction(self._db, self._lock)
+        
+    def reset(self):
+        """Remove every task, result and host record"""
+        with self._write() as db:
+            for table in ('meta', 'tasks', 'results', 'hosts'):
+                db.execute(f"DELETE FROM {table}")
+                
+    def set_meta(self, key: str, value: Any):
+        with self._write() as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            
+    def get_meta(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+        
+    def put(self, kind: str, url: str, payload: Optional[Dict[str, Any]] = None) -> bool:
+        """Enqueue a task; False if a task of this kind for url already exists"""
+        with self._write() as db:
+            return _insert_task(db, kind, url, payload) > 0
+            
+    def claim(self, worker: str) -> Optional[Task]:
+        """Lease the next task, listing pages first; None if nothing is claimable right now"""
+        now = time.time()
+        with self._write() as db:
+            # A task whose every lease ran out keeps crashing or hanging its worker
+            db.execute("UPDATE tasks SET status = 'failed', leased_until = NULL, error = 'Lease expired' "
+                       "WHERE status = 'running' AND leased_until < ? AND attempts >= ?", (now, self.max_attempts))
+            row = db.execute("""
+                SELECT id, kind, url, payload, attempts FROM tasks
+                WHERE status = 'pending' OR (status = 'running' AND leased_until < ?)
+                ORDER BY kind = 'listing' DESC, id
+                LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE tasks SET status = 'running', worker = ?, leased_until = ?, attempts = attempts + 1 "
+                       "WHERE id = ?", (worker, now + self.lease_seconds, row[0]))
+        return Task(id=row[0], kind=row[1], url=row[2], payload=json.loads(row[3]), attempts=row[4] + 1)
+        
+    def complete(self, task: Task, products: Iterable[Dict[str, Any]] = (),
+                 new_tasks: Iterable[Tuple[str, str, Dict[str, Any]]] = ()):
+        """Store a task's products and follow-up tasks, and mark it done, atomically"""
+        with self._write() as db:
+            db.executemany("INSERT INTO results (task_id, product) VALUES (?, ?)",
+                           [(task.id, json.dumps(product, ensure_ascii=False)) for product in products])
+            for kind, url, payload in new_tasks:
+                _insert_task(db, kind, url, payload)
+            db.execute("UPDATE tasks SET status = 'done', leased_until = NULL, error = NULL WHERE id = ?", (task.id,))
+            
+    def release_running(self) -> int:
+        """Make every running task claimable again, for restarting after all workers were stopped"""
+        with self._write() as db:
+            return db.execute("UPDATE tasks SET status = 'pending', leased_until = NULL "
+                              "WHERE status = 'running'").rowcount
+                              
+    def fail(self, task: Task, error: str):
+        """Give a task back for another attempt, or mark it failed after max_attempts"""
+        status = 'failed' if task.attempts >= self.max_attempts else 'pending'
+        with self._write() as db:
+            db.execute("UPDATE tasks SET status = ?, leased_until = NULL, error = ? WHERE id = ?",
+                       (status, error[:500], task.id))
+                       
+    def results_after(self, last_id: int, limit: int = 1000) -> List[Tuple[int, Dict[str, Any]]]:
+        """Results stored after result id last_id, oldest first"""
+        with self._lock:
+            rows = self._db.execute("SELECT id, product FROM results WHERE id > ? ORDER BY id LIMIT ?",
+                                    (last_id, limit)).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+        
+    def counts(self) -> Dict[str, int]:
+        """Number of tasks by status"""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        counts = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+        
+    def finished(self) -> bool:
+        """True once no task is pending or running"""
+        counts = self.counts()
+        return counts['pending'] == 0 and counts['running'] == 0
+        
+    def reserve_host(self, host: str, interval: float) -> float:
+        """Book the next request slot for host across all processes; returns the seconds to wait for it"""
+        now = time.time()
+        with self._write() as db:
+            row = db.execute("SELECT next_at FROM hosts WHERE host = ?", (host,)).fetchone()
+            slot = max(now, row[0]) if row else now
+            db.execute("INSERT INTO hosts (host, next_at) VALUES (?, ?) "
+                       "ON CONFLICT (host) DO UPDATE SET next_at = excluded.next_at", (host, slot + interval))
+        return slot - now
+        
+    def block_host(self, host: str, seconds: float):
+        """Hold every worker's requests to host for the given number of seconds"""
+        until = time.time() + seconds
+        with self._write() as db:
+            db.execute("INSERT INTO hosts (host, next_at) VALUES (?, ?) "
+                       "ON CONFLICT (host) DO UPDATE SET next_at = MAX(next_at, excluded.next_at)", (host, until))
+                       
+    def host_rate(self, host: str) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute("SELECT rate FROM hosts WHERE host = ?", (host,)).fetchone()
+        return row[0] if row else None
+        
+    def set_host_rate(self, host: str, rate: float):
+        with self._write() as db:
+            db.execute("INSERT INTO hosts (host, next_at, rate) VALUES (?, 0, ?) "
+                       "ON CONFLICT (host) DO UPDATE SET rate = excluded.rate", (host, rate))
+                       
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on error"""
+    
+    def __init__(self, db: sqlite3.Connection, lock: threading.Lock):
+        self.db = db
+        self.lock = lock
+        
+    def __enter__(self) -> sqlite3.Connection:
+        self.lock.acquire()
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.lock.release()
+            raise
+        return self.db
+        
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+
+def _insert_task(db: sqlite3.Connection, kind: str, url: str, payload: Optional[Dict[str, Any]]) -> int:
+    cursor = db.execute("INSERT OR IGNORE INTO tasks (kind, url, payload) VALUES (?, ?, ?)",
+                        (kind, url, json.dumps(payload or {}, ensure_ascii=False)))
+    return cursor.rowcount
+
+class SharedRateController(RateController):
+    """RateController whose per-host spacing holds across every process using the queue
+    
+    Each process keeps its own adaptive token buckets for rate control and
+    statistics, but request slots are booked in the queue's hosts table,
+    so N workers together send no faster than one scraper would. Rate
+    changes and Retry-After blocks are published there for all workers.
+    """
+    
+    def __init__(self, queue: WorkQueue, delay: float = 1.0, settings: Optional[Dict[str, Any]] = None):
+        super().__init__(delay, settings)
+        self.queue = queue
+        
+    def acquire(self, url: str) -> float:
+        host = urlparse(url).netloc
+        bucket = self.bucket(url)
+        rate = self.queue.host_rate(host) or bucket.rate
+        wait = self.queue.reserve_host(host, 1.0 / rate)
+        with bucket.lock:
+            bucket.requests += 1
+        if wait > 0:
+            bucket.enter_queue(wait)
+            try:
+                time.sleep(wait)
+            finally:
+                bucket.leave_queue()
+        return wait
+        
+    async def acquire_async(self, url: str) -> float:
+        raise NotImplementedError("Sharded crawls run the threaded engine in each worker")
+        
+    def record_response(self, url: str, status_code: int, latency: float, retry_after: Optional[str] = None):
+        bucket = self.bucket(url)
+        before = bucket.rate
+        bucket.record_response(status_code, latency, retry_after)
+        host = urlparse(url).netloc
+        if status_code in THROTTLE_STATUS_CODES:
+            delay = parse_retry_after(retry_after)
+            if delay is not None:
+                self.queue.block_host(host, min(delay, self.settings['max_retry_after']))
+        if bucket.rate != before:
+            self.queue.set_host_rate(host, bucket.rate)
+            
+    def record_error(self, url: str):
+        bucket = self.bucket(url)
+        before = bucket.rate
+        bucket.record_error()
+        if bucket.rate != before:
+            self.queue.set_host_rate(urlparse(url).netloc, bucket.rate)